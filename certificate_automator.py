@@ -5,32 +5,96 @@ Main file that runs the certificate automator terminal program.
 __version__ = "0.1.0"
 
 import argparse
+import os
 import sys
 from typing import Dict
 
 from src.cli import cli
+from src.batch.sharding import parse_shard
+from src.mailchimp.mailchimp_manager import MEMBER_STATUSES
 
 def main():
+    if sys.argv[1:2] == ["merge"]:
+        cli.run_merge_cli(process_merge_args())
+        return
+
     argv = process_cmd_line_args()
-    cli.run_cli(argv)
+    if argv["estimate"]:
+        cli.run_estimate_cli(argv)
+    elif argv["proof"]:
+        cli.run_proof_cli(argv)
+    elif any(argv[arg] is not None for arg in ("manifest", "shard", "smtp_host")):
+        # Sharded and SMTP runs of a single event are batches of one event
+        cli.run_batch_cli(argv)
+    else:
+        cli.run_cli(argv)
 
 def process_cmd_line_args() -> Dict[str, str]:
     """
     Process command line arguments.
 
-    Will terminate program if required arguments are not found.
+    Will terminate program if required arguments are not found. The attendee
+    record and template are only required when not running from a manifest,
+    and the Mailchimp keys are only required when not emailing through SMTP,
+    estimating the run, or rendering proofs.
+    The SMTP password is read from the ``SMTP_PASSWORD`` environment variable.
 
     Returns:
         Dict[str, str]: The processed and validated arguments.
     """
     parser = argparse.ArgumentParser("Certificate Automater")
-    parser.add_argument("--attendees", required=True, help="The path to the attendee record as a CSV file")
-    parser.add_argument("--server-key", required=True, help="The Mailchimp server key")
-    parser.add_argument("--api-key", required=True, help="The Mailchimp API key")
-    parser.add_argument("--template", required=True, help="The path to the template certificate as a .docx file")
+    parser.add_argument("--attendees", help="The path to the attendee record as a CSV file")
+    parser.add_argument("--server-key", help="The Mailchimp server key")
+    parser.add_argument("--api-key", help="The Mailchimp API key")
+    parser.add_argument("--list-id", help="The ID of the Mailchimp audience to update")
+    parser.add_argument("--new-member-status", choices=MEMBER_STATUSES, help="Add attendees who aren't in the audience with this status, instead of skipping them")
+    parser.add_argument("--smtp-host", help="Email certificates through this SMTP server instead of Mailchimp")
+    parser.add_argument("--smtp-port", type=int, default=587, help="The SMTP server's port")
+    parser.add_argument("--smtp-user", help="The username to log in to the SMTP server with")
+    parser.add_argument("--smtp-no-tls", action="store_true", help="Don't use STARTTLS, e.g. for a local test server")
+    parser.add_argument("--sender", help="The From address of certificate emails")
+    parser.add_argument("--template", help="The path to the template certificate as a .docx file")
     parser.add_argument("--event", help="The name of the event")
+    parser.add_argument("--manifest", help="The path to a CSV file listing many events to process in one run")
+    parser.add_argument("--workers", type=int, help="The number of render workers shared by all events")
+    parser.add_argument("--processes", action="store_true", help="Render in worker processes instead of threads, for CPU-bound templates")
+    parser.add_argument("--proof", action="store_true", help="Only render a contact sheet of sample certificates for checking the template")
+    parser.add_argument("--naming", help="Format string of attendee record columns to name certificates with, e.g. \"{fname} {lname}\"")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse attendee records instead of using the record cache")
+    parser.add_argument("--estimate", action="store_true", help="Only predict the run's time, upload size, and Mailchimp API usage")
+    parser.add_argument("--shard", type=parse_shard, help="Only process shard i of N, given as i/N, saving results to partial files")
     parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
-    return vars(parser.parse_args(sys.argv[1:]))
+    argv = vars(parser.parse_args(sys.argv[1:]))
+
+    if argv["manifest"] is None:
+        for arg in ("attendees", "template"):
+            if argv[arg] is None:
+                parser.error(f"--{arg} is required unless --manifest is given")
+
+    if argv["smtp_host"] is None and not (argv["estimate"] or argv["proof"]):
+        for arg in ("server_key", "api_key", "list_id"):
+            if argv[arg] is None:
+                parser.error(f"--{arg.replace('_', '-')} is required unless --smtp-host is given")
+    elif argv["smtp_host"] is not None and argv["sender"] is None:
+        parser.error("--sender is required with --smtp-host")
+
+    argv["smtp_password"] = os.environ.get("SMTP_PASSWORD")
+
+    return argv
+
+def process_merge_args() -> Dict[str, str]:
+    """
+    Process command line arguments of the ``merge`` subcommand.
+
+    Will terminate program if required arguments are not found.
+
+    Returns:
+        Dict[str, str]: The processed and validated arguments.
+    """
+    parser = argparse.ArgumentParser("Certificate Automater merge")
+    parser.add_argument("--attendees", required=True, help="The path to the attendee record as a CSV file")
+    parser.add_argument("--shards", required=True, type=int, help="The number of shards the run was split into")
+    return vars(parser.parse_args(sys.argv[2:]))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
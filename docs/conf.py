@@ -14,9 +14,12 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('../'))
 sys.path.append(os.path.abspath("../src/attendees/"))
+sys.path.append(os.path.abspath("../src/batch/"))
 sys.path.append(os.path.abspath("../src/certificate_creator/"))
 sys.path.append(os.path.abspath("../src/cli/"))
 sys.path.append(os.path.abspath("../src/mailchimp/"))
+sys.path.append(os.path.abspath("../src/smtp/"))
+sys.path.append(os.path.abspath("../src/utils/"))
 
 
 # -- Project information -----------------------------------------------------
@@ -74,9 +77,15 @@ html_static_path = ['_static']
 
 # autodoc settings
 autodoc_type_aliases = {
+    "AssetBuildFunc": "AssetBuildFunc",
+    "BatchFetchFunc": "BatchFetchFunc",
     "BatchStatusFunc": "BatchStatusFunc",
+    "BulkNamingFunc": "BulkNamingFunc",
     "NamingFunc": "NamingFunc",
-    "CertStatusFunc": "CertStatusFunc"
+    "ProbeFunc": "ProbeFunc",
+    "CertStatusFunc": "CertStatusFunc",
+    "EventStatusFunc": "EventStatusFunc",
+    "RateStatusFunc": "RateStatusFunc"
 }
 
 autodoc_default_options = {
@@ -0,0 +1,180 @@
+"""
+Module for caching parsed attendee records between runs.
+
+Parsing and validating a large CSV file is slow, and the same attendee record
+is often loaded several times while a template is being fixed, e.g. by
+``--estimate``, ``--proof``, and then the real run. The cache stores the
+parsed record as a Feather file, keyed by the CSV file's path and a hash of
+its cells. The columns a run writes back, ``RESULT_COLUMNS``, are left out of
+both the key and the cached record, and are read fresh from the CSV file, so
+a run saving certificate paths and URLs into the record doesn't invalidate
+its entry. Changing any other cell changes the key, so stale entries are
+never used. The cache directory is kept under a size limit by evicting the
+least recently used entries.
+
+Requires ``pyarrow``. Without it, records are always parsed from the CSV file.
+
+TODO:
+    * Impement datalogging
+"""
+
+import csv
+import hashlib
+import os
+from typing import *
+
+import pandas as pd
+
+try:
+    import pyarrow
+    from pyarrow import feather
+except ImportError:
+    pyarrow = feather = None
+
+# pyarrow raises its own errors too, e.g. ArrowTypeError (a TypeError) for
+# object columns of mixed types
+_CACHE_ERRORS = (OSError, ValueError, TypeError) + \
+    ((pyarrow.ArrowException,) if pyarrow is not None else ())
+
+from src.attendees.attendee_fileio import load_attendee_record
+from src.utils.disk_cache import cache_entries, default_cache_dir, evict_lru
+
+RESULT_COLUMNS = ("cert_path", "file_url")
+"""The columns runs write back to attendee records, left out of the cache."""
+
+class RecordCache:
+    """
+    Size-bounded LRU cache of parsed attendee records stored as Feather files.
+
+    Attributes:
+        cache_dir (str): The folder the cached records are stored in.
+        max_bytes (int): The most bytes the cached records may take up.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 256 * 2**20):
+        """
+        Constructor.
+
+        Args:
+            cache_dir (str): Where to store cached records, defaults to ``None``, meaning ``default_cache_dir()``.
+            max_bytes (int): Most bytes the cache may take up, defaults to 256 MiB.
+
+        Raises:
+            ValueError: if max_bytes is negative.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        """Whether caching is possible, i.e. ``pyarrow`` is installed."""
+        return feather is not None
+
+    def load(self, path: str) -> pd.DataFrame:
+        """
+        Load an attendee record, from the cache if possible.
+
+        On a miss, the record is parsed with ``load_attendee_record`` and
+        cached. Cache IO errors are not raised, the record is parsed instead.
+
+        Args:
+            path (str): The absolute or relative path to the attendee record.
+
+        Returns:
+            pd.DataFrame: The parsed attendee record.
+
+        Raises:
+            OSError: if the attendee record cannot be read.
+        """
+        if not self.enabled:
+            return load_attendee_record(path)
+
+        try:
+            key, header, results = self._scan(path)
+        except (UnicodeDecodeError, csv.Error):
+            # Records that aren't UTF-8 CSV files are left to the parser
+            return load_attendee_record(path)
+
+        entry = os.path.join(self.cache_dir, key + ".feather")
+        try:
+            record = feather.read_feather(entry)
+            os.utime(entry)
+        except _CACHE_ERRORS:
+            # Missing or corrupt entries are replaced below
+            record = None
+
+        if record is not None:
+            for col, values in results.items():
+                record[col] = pd.Series(values, index=record.index, dtype=object) \
+                    .where(lambda column: column != "", None)
+            if set(record.columns) == set(header):
+                record = record[header]
+            return record
+
+        record = load_attendee_record(path)
+        try:
+            self._store(entry, record.drop(columns=list(results), errors="ignore"))
+        except _CACHE_ERRORS:
+            # Records pyarrow can't store are just not cached
+            pass
+        return record
+
+    def clear(self):
+        """Remove every cached record."""
+        for entry in cache_entries(self.cache_dir, ".feather"):
+            os.remove(entry)
+
+    # Hidden methods go here
+
+    def _scan(self, path: str
+              ) -> Tuple[str, List[str], Dict[str, List[str]]]:
+        """
+        Get an attendee record's cache key, header, and result columns.
+
+        The key is ``<path hash>-<content hash>``, so entries for the same
+        file share a prefix and old versions can be found and removed. The
+        content hash covers every cell except those of ``RESULT_COLUMNS``,
+        whose values are returned instead.
+        """
+        path = os.path.abspath(path)
+        content = hashlib.sha256()
+
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            header = next(reader, [])
+            kept = [i for i, col in enumerate(header) if col not in RESULT_COLUMNS]
+            results = {col: [] for col in header if col in RESULT_COLUMNS}
+            skipped = [(i, results[col]) for i, col in enumerate(header)
+                       if col in RESULT_COLUMNS]
+
+            content.update(repr([header[i] for i in kept]).encode())
+            for row in reader:
+                content.update(repr([row[i] if i < len(row) else None
+                                     for i in kept]).encode())
+                for i, values in skipped:
+                    values.append(row[i] if i < len(row) else "")
+
+        source = hashlib.sha256(path.encode()).hexdigest()[:16]
+        return f"{source}-{content.hexdigest()[:32]}", header, results
+
+    def _store(self, entry: str, record: pd.DataFrame):
+        """Write a record to the cache, replacing older versions, then evict."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        prefix = os.path.basename(entry).split("-")[0]
+
+        for old in cache_entries(self.cache_dir, ".feather"):
+            if os.path.basename(old).startswith(prefix + "-"):
+                os.remove(old)
+
+        tmp = entry + ".tmp"
+        try:
+            feather.write_feather(record.reset_index(drop=True), tmp)
+        except _CACHE_ERRORS:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, entry)
+        evict_lru(self.cache_dir, ".feather", self.max_bytes)
@@ -0,0 +1,248 @@
+"""
+Module for saving attendee results incrementally during a run.
+
+Rather than rewriting the whole attendee record at the end of a run,
+results are appended to a sidecar journal file and synced to disk as they
+are known. A crash therefore loses only results not yet appended; callers
+appending a chunk of attendees at a time (as ``BatchRunner`` does once a
+chunk is delivered) lose at most the chunks in progress. Once the run
+finishes, the journal is merged into the attendee record, which is replaced
+with a single atomic rename so the record is never left half written.
+
+Reopening a journal after a crash keeps its rows, so the next run can skip
+attendees that already succeeded and still commit everything at the end.
+
+TODO:
+    * Impement datalogging
+"""
+
+import csv
+import os
+import threading
+from typing import *
+
+import pandas as pd
+
+from src.attendees.attendee_fileio import load_attendee_record, save_attendee_record
+
+JOURNAL_COLUMNS = ("id", "cert_path", "file_url", "status")
+"""The columns of a journal file, in order."""
+
+def journal_path(path: str) -> str:
+    """
+    Get where an attendee record's journal is kept.
+
+    Args:
+        path (str): The path to the attendee record.
+
+    Returns:
+        str: The path to the journal, e.g. ``"record.journal.csv"``.
+    """
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.journal{ext or '.csv'}"
+
+class AttendeeJournal:
+    """
+    Append-only journal of attendee results for one attendee record.
+
+    Thread-safe, so render and upload workers can append from any thread.
+
+    Attributes:
+        path (str): The path to the attendee record.
+        journal_path (str): The path to the sidecar journal file.
+        key (str): The attendee record column holding the attendee ID.
+    """
+
+    def __init__(self, path: str, key: str = "email"):
+        """
+        Constructor.
+
+        Opens the journal for appending, creating it if it doesn't exist.
+
+        Args:
+            path (str): The path to the attendee record.
+            key (str): The column holding the attendee ID, defaults to ``"email"``.
+
+        Raises:
+            OSError: if the journal cannot be opened.
+        """
+        self.path = path
+        self.journal_path = journal_path(path)
+        self.key = key
+        self._lock = threading.Lock()
+        self._file = None
+        self._open()
+
+    def __enter__(self) -> "AttendeeJournal":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, attendee_id: str, cert_path: str = None,
+               file_url: str = None, status: str = "ok"):
+        """
+        Append one attendee's result and sync it to disk.
+
+        Later rows for the same attendee override earlier ones.
+
+        Args:
+            attendee_id (str): The attendee's ID.
+            cert_path (str): The path to the attendee's certificate, defaults to ``None``.
+            file_url (str): The URL of the uploaded certificate, defaults to ``None``.
+            status (str): The outcome, e.g. ``"ok"`` or ``"failed"``, defaults to ``"ok"``.
+
+        Raises:
+            ValueError: if the journal has been closed.
+            OSError: if file IO error occurs.
+        """
+        self._write([[attendee_id, cert_path, file_url, status]])
+
+    def append_record(self, attendees: pd.DataFrame,
+                      failed_ids: Collection[str] = (),
+                      delivered_column: str = "file_url"):
+        """
+        Append a result for every attendee in a (partial) attendee record.
+
+        Attendees with a value in the delivered column, and not among the
+        failed IDs, are journalled as ``"ok"`` and the rest as ``"failed"``.
+        When delivery doesn't give file URLs (e.g. email), use the certificate
+        path as the delivered column. The rows are synced to disk together.
+
+        Args:
+            attendees (pd.DataFrame): The attendees, with any of the ``cert_path`` and ``file_url`` columns.
+            failed_ids (Collection[str]): IDs of attendees that failed despite being delivered, matched case-insensitively. Defaults to none.
+            delivered_column (str): The column showing an attendee was delivered, defaults to ``"file_url"``.
+
+        Raises:
+            KeyError: if attendees has no key column.
+            ValueError: if the journal has been closed.
+            OSError: if file IO error occurs.
+        """
+        failed_ids = {str(attendee_id).lower() for attendee_id in failed_ids}
+        rows = []
+        for row in attendees.to_dict("records"):
+            cert_path = _clean(row.get("cert_path"))
+            file_url = _clean(row.get("file_url"))
+            ok = bool(_clean(row.get(delivered_column))) and \
+                str(row[self.key]).lower() not in failed_ids
+            rows.append([row[self.key], cert_path, file_url,
+                         "ok" if ok else "failed"])
+        self._write(rows)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Read the latest journalled result of each attendee.
+
+        Returns:
+            pd.DataFrame: The results indexed by attendee ID.
+
+        Raises:
+            OSError: if file IO error occurs.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            results = pd.read_csv(self.journal_path, dtype=str)
+
+        return results.drop_duplicates("id", keep="last").set_index("id")
+
+    def completed(self) -> Set[str]:
+        """
+        Get the IDs of attendees whose latest result succeeded.
+
+        Returns:
+            Set[str]: The IDs of the completed attendees.
+        """
+        results = self.read()
+        return set(results.index[results["status"] == "ok"])
+
+    def commit(self) -> pd.DataFrame:
+        """
+        Merge the journal into the attendee record and remove the journal.
+
+        The merged record is written to a temporary file next to the attendee
+        record and synced to disk, then renamed over it, so the original record
+        is intact if anything fails before the rename, even a power loss.
+
+        Returns:
+            pd.DataFrame: The merged attendee record.
+
+        Raises:
+            OSError: if file IO error occurs.
+        """
+        results = self.read()
+        attendees = load_attendee_record(self.path)
+        ids = attendees[self.key]
+
+        for col in ("cert_path", "file_url"):
+            merged = ids.map(results[col])
+            if col in attendees.columns:
+                merged = merged.fillna(attendees[col])
+            attendees[col] = merged
+
+        stem, ext = os.path.splitext(self.path)
+        tmp_path = f"{stem}.tmp{ext}"
+        save_attendee_record(tmp_path, attendees)
+        _fsync_path(tmp_path)
+        os.replace(tmp_path, self.path)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+
+        self.close()
+        os.remove(self.journal_path)
+        return attendees
+
+    def close(self):
+        """Close the journal file, keeping its contents."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Hidden methods go here
+
+    def _write(self, rows: List[List[Any]]):
+        """Write journal rows, then flush and sync them to disk."""
+        with self._lock:
+            if self._file is None:
+                raise ValueError("journal has been closed")
+
+            self._writer.writerows(rows)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _open(self):
+        """Open the journal for appending, writing the header if it is new."""
+        is_new = not os.path.exists(self.journal_path) or \
+            os.path.getsize(self.journal_path) == 0
+        self._file = open(self.journal_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+        if is_new:
+            self._writer.writerow(JOURNAL_COLUMNS)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+def _fsync_path(path: str):
+    """Sync a written file's contents to disk."""
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+
+def _fsync_dir(path: str):
+    """Sync a folder's entries to disk, so a rename in it survives power loss."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Folders can't be opened on Windows, where renames are journalled
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _clean(value: Any) -> str:
+    """Map missing values (``None`` or NaN) to ``None``."""
+    return None if value is None or pd.isna(value) else value
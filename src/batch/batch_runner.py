@@ -0,0 +1,724 @@
+"""
+Module for processing many events in a single run.
+
+Events are listed in a manifest CSV file with one event per row. The manifest
+must have the columns ``attendees`` and ``template``, and may have the columns
+``event`` and ``out_dir``. All events share one ``MailchimpManager`` (and so
+one HTTP connection pool and folder cache) and one pool of render workers.
+Alternatively, certificates can be emailed directly through an
+``SMTPManager``, skipping Mailchimp altogether.
+
+Each event's attendee record is split into chunks, and chunks are queued
+round-robin across events so one large event does not starve the small ones.
+Chunks are rendered by a thread pool, or by a process pool reading each
+event's attendees from a ``SharedRoster`` so records aren't pickled to every
+worker.
+
+Results are journalled next to each attendee record as every chunk is
+delivered, and merged into the record once the event finishes, so a crash
+loses only the results of chunks still being delivered, and a rerun skips
+attendees that already succeeded. Since the journal and the failure report
+are named after the attendee record, every event needs its own record.
+When given a shard, only that shard's attendees are processed, and results
+are saved to partial files for ``sharding.merge_partials`` instead of the
+attendee records themselves.
+
+Transient failures are retried through a ``RetryQueue`` alongside healthy
+work. Attendees that still fail are saved to a failure report next to their
+attendee record, which can be used as the attendee record of a re-run. Each
+shard saves its own report, and ``merge_failure_reports`` combines them.
+
+TODO:
+    * Impement datalogging
+"""
+
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait)
+from typing import *
+
+import pandas as pd
+
+from src.attendees.attendee_fileio import load_attendee_record, save_attendee_record
+from src.attendees.attendee_converter import pandas2manager, manager2pandas
+from src.attendees.attendee_journal import AttendeeJournal
+from src.attendees.attendee_cache import RecordCache
+from src.attendees.attendee_manager import Attendee, AttendeeManager
+from src.certificate_creator.certificate_maker import (
+    createCertificate, CertStatusFunc, NamingFunc)
+from src.certificate_creator.cert_naming import (
+    BulkNamingFunc, assign_cert_names, precomputed_name)
+from src.certificate_creator.shared_roster import SharedRoster, render_rows
+from src.certificate_creator.asset_cache import get_asset_cache
+from src.mailchimp.mailchimp_manager import MailchimpManager, BatchStatusFunc
+from src.batch.sharding import (
+    RESULT_COLUMNS, select_shard, save_partial, partial_path)
+from src.batch.retry_queue import RetryQueue
+from src.smtp.smtp_manager import SMTPManager
+
+class EventJob(NamedTuple):
+    """
+    A single event from the manifest.
+
+    Attributes:
+        attendees (str): The path to the attendee record as a CSV file.
+        template (str): The path to the template certificate.
+        event (str): The name of the event, also used as the Mailchimp folder name.
+        out_dir (str): The folder to save the certificates to.
+    """
+    attendees: str
+    template: str
+    event: str
+    out_dir: str
+
+EventStatusFunc = Callable[[str, str, int, int], None]
+"""Alias for event status function.
+
+Args:
+    event (str): The name of the event.
+    stage (str): The stage that has progressed: ``"queued"`` for every event before the run starts; ``"render"``, ``"upload"``, and ``"update"`` (or ``"email"``) as each chunk passes that stage; ``"chunk"`` when a chunk is finished; ``"done"`` when the event is saved.
+    done (int): Number of chunks of the event that have passed the stage.
+    total (int): Total number of chunks in the event, counting retries.
+"""
+
+ErrorFunc = Callable[[str], None]
+"""Alias for error function.
+
+Args:
+    message (str): What went wrong, e.g. a delivery error that will be retried.
+"""
+
+def load_manifest(path: str) -> List[EventJob]:
+    """
+    Loads the events to process from a manifest CSV file.
+
+    Relative paths in the manifest are relative to the manifest's folder.
+    Events without a name are named after their attendee record, and events
+    without an output folder save to a folder named after the event next to
+    their attendee record.
+
+    Args:
+        path (str): The absolute or relative path to the manifest.
+
+    Returns:
+        List[EventJob]: The events in manifest order.
+
+    Raises:
+        OSError: if file IO error occurs.
+        KeyError: if the ``attendees`` or ``template`` column is missing.
+        ValueError: if two events share an attendee record.
+    """
+    manifest = pd.read_csv(path, dtype=str)
+    root = os.path.dirname(os.path.abspath(path))
+
+    for column in ("attendees", "template"):
+        if column not in manifest.columns:
+            raise KeyError(column)
+
+    jobs = []
+    for row in manifest.to_dict("records"):
+        attendees = os.path.join(root, row["attendees"])
+        event = _get_field(row, "event") or \
+            os.path.splitext(os.path.basename(attendees))[0]
+        out_dir = _get_field(row, "out_dir") or \
+            os.path.join(os.path.dirname(attendees), event)
+        jobs.append(EventJob(attendees, os.path.join(root, row["template"]),
+                             event, os.path.join(root, out_dir)))
+
+    _check_records(jobs)
+    return jobs
+
+class BatchRunner:
+    """
+    Runs the full pipeline for many events, sharing resources between them.
+
+    Attributes:
+        mailchimp (MailchimpManager): The authorised Mailchimp manager shared by all events, ``None`` if emailing through SMTP.
+        workers (int): The number of render workers shared by all events.
+        chunk_size (int): The number of attendees per unit of work.
+        shard (Tuple[int, int]): The shard number and number of shards to process, ``None`` if processing everyone.
+        cache (RecordCache): The cache attendee records are loaded through, ``None`` if not caching.
+        naming (Union[str, BulkNamingFunc]): How certificates are named in bulk, ``None`` if left to ``createCertificate``.
+        retries (RetryQueue): The queue failed work is retried through, which also logs failures.
+        smtp (SMTPManager): The SMTP manager certificates are emailed through, ``None`` if delivering through Mailchimp.
+        processes (bool): Whether certificates are rendered in worker processes rather than threads.
+    """
+
+    def __init__(self, mailchimp: MailchimpManager, workers: int = None,
+                 chunk_size: int = 100, shard: Tuple[int, int] = None,
+                 cache: RecordCache = None,
+                 naming: Union[str, BulkNamingFunc] = None,
+                 retries: RetryQueue = None, smtp: SMTPManager = None,
+                 processes: bool = False):
+        """
+        Constructor.
+
+        Args:
+            mailchimp (MailchimpManager): An authorised Mailchimp manager, may be ``None`` if smtp is given.
+            workers (int): The number of render workers, defaults to ``None``, meaning the CPU count.
+            chunk_size (int): The number of attendees per unit of work, defaults to 100.
+            shard (Tuple[int, int]): The shard number (from 1) and number of shards to process, defaults to ``None``, meaning all attendees.
+            cache (RecordCache): Cache to load attendee records through, defaults to ``None``, meaning always parse the CSV files.
+            naming (Union[str, BulkNamingFunc]): Format string or function naming every event's certificates before rendering, see ``cert_naming.assign_cert_names``. Defaults to ``None``, meaning ``createCertificate`` names them.
+            retries (RetryQueue): Queue to retry failed work through, defaults to ``None``, meaning a ``RetryQueue`` with default settings.
+            smtp (SMTPManager): Email certificates directly through this instead of Mailchimp, defaults to ``None``.
+            processes (bool): Render in worker processes fed from a ``SharedRoster`` instead of threads, defaults to ``False``. Worth it when rendering is CPU bound, as it sidesteps the GIL.
+
+        Raises:
+            TypeError: if mailchimp is not a MailchimpManager, or smtp is not an SMTPManager.
+            ValueError: if neither mailchimp nor smtp is given.
+            ValueError: if workers or chunk_size is less than 1.
+        """
+        if mailchimp is None and smtp is None:
+            raise ValueError("one of mailchimp or smtp must be given")
+
+        if mailchimp is not None and not isinstance(mailchimp, MailchimpManager):
+            raise TypeError("mailchimp must be a MailchimpManager")
+
+        if smtp is not None and not isinstance(smtp, SMTPManager):
+            raise TypeError("smtp must be an SMTPManager")
+
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        self.mailchimp = mailchimp
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.shard = shard
+        self.cache = cache
+        self.naming = naming
+        self.retries = retries if retries is not None else RetryQueue()
+        self.smtp = smtp
+        self.processes = processes
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        # Each event's roster and the index of its attendees, when processes is set
+        self._rosters = {}
+
+    @property
+    def busy_workers(self) -> int:
+        """The number of workers currently rendering certificates."""
+        # Process mode counts chunks submitted, not just those rendering
+        return min(self._busy, self.workers)
+
+    def run(self, jobs: List[EventJob],
+            eventFunc: EventStatusFunc = None,
+            certFunc: CertStatusFunc = None,
+            batchFunc: BatchStatusFunc = None,
+            errorFunc: ErrorFunc = None) -> Dict[str, pd.DataFrame]:
+        """
+        Renders, uploads, and updates contacts for every event.
+
+        Blocking function. Certificates are rendered by the worker pool while
+        the Mailchimp stages run on the calling thread as each chunk finishes
+        rendering, so uploads of one event overlap rendering of the others.
+        Work that fails transiently is retried after a backoff without holding
+        up other chunks. Each event's attendee record, and failure report if
+        anyone failed, is saved once all its chunks and retries are done.
+
+        Args:
+            jobs (List[EventJob]): The events to process.
+            eventFunc (EventStatusFunc): Callback informing caller of each event's progress. If ``None``, does nothing.
+            certFunc (CertStatusFunc): Passed on to ``createCertificate``. If ``None``, does nothing.
+            batchFunc (BatchStatusFunc): Passed on to the Mailchimp batch requests. If ``None``, does nothing.
+            errorFunc (ErrorFunc): Callback informing caller of each delivery error that will be retried. Failures that won't be retried go to the ``RetryQueue``'s failureFunc instead. If ``None``, does nothing.
+
+        Returns:
+            Dict[str, pd.DataFrame]: The updated attendee record of each event, keyed by event name.
+
+        Raises:
+            ValueError: if two jobs have the same event name or attendee record.
+            OSError: if file IO error occurs.
+        """
+        names = [job.event for job in jobs]
+        if len(set(names)) != len(names):
+            raise ValueError("event names in a batch must be unique")
+        _check_records(jobs)
+
+        journals = {}
+        try:
+            if self.shard is None:
+                journals = {job.event: AttendeeJournal(job.attendees)
+                            for job in jobs}
+            return self._run(jobs, journals, eventFunc, certFunc, batchFunc,
+                             errorFunc)
+        finally:
+            for journal in journals.values():
+                journal.close()
+
+    # Hidden methods go here
+
+    def _run(self, jobs: List[EventJob], journals: Dict[str, AttendeeJournal],
+             eventFunc: EventStatusFunc, certFunc: CertStatusFunc,
+             batchFunc: BatchStatusFunc,
+             errorFunc: ErrorFunc) -> Dict[str, pd.DataFrame]:
+        """Run every event's chunks through the pipeline, see ``run``."""
+        records = {job.event: self._load(job, journals.get(job.event))
+                   for job in jobs}
+        chunks = {event: self._split(record) for event, record in records.items()}
+        states = {job.event: _EventState(job, journals.get(job.event),
+                                         self._create_folder(job.event),
+                                         records[job.event],
+                                         len(chunks[job.event]))
+                  for job in jobs}
+        for job in jobs:
+            os.makedirs(job.out_dir, exist_ok=True)
+            _notify(eventFunc, job.event, "queued", 0, states[job.event].total)
+        results = {}
+
+        _warm_assets(jobs)
+        with self._publish(jobs, records), self._executor() as pool:
+            pending = self._submit(pool, jobs, chunks, certFunc)
+
+            while pending or len(self.retries):
+                for (job, frame), attempts in self.retries.pop_due():
+                    pending.update(self._submit_chunk(pool, job, frame, certFunc,
+                                                      attempts))
+
+                if not pending:
+                    time.sleep(self.retries.time_until_next())
+                    continue
+
+                finished, _ = wait(pending, self.retries.time_until_next(),
+                                   FIRST_COMPLETED)
+                for future in finished:
+                    task = pending.pop(future)
+                    state = states[task.job.event]
+                    self._complete(task, future, state, eventFunc, batchFunc,
+                                   errorFunc)
+                    _notify(eventFunc, task.job.event, "chunk", state.done,
+                            state.total)
+
+                    if state.done == state.total:
+                        results[task.job.event] = self._finish(state)
+                        _notify(eventFunc, task.job.event, "done", state.done,
+                                state.total)
+
+        return results
+
+    @contextmanager
+    def _publish(self, jobs: List[EventJob], records: Dict[str, pd.DataFrame]):
+        """
+        Publish every event's attendees to a ``SharedRoster`` for the run when
+        rendering in processes, freeing them afterwards.
+        """
+        try:
+            if self.processes:
+                for job in jobs:
+                    self._rosters[job.event] = (
+                        SharedRoster.publish(records[job.event]),
+                        records[job.event].index)
+            yield
+        finally:
+            for roster, _ in self._rosters.values():
+                roster.close()
+                roster.unlink()
+            self._rosters = {}
+
+    def _complete(self, task: "_Task", future: Future, state: "_EventState",
+                  eventFunc: EventStatusFunc, batchFunc: BatchStatusFunc,
+                  errorFunc: ErrorFunc):
+        """
+        Deliver a rendered chunk and queue retries for anything that failed.
+
+        Transient failures of single attendees are retried as a chunk of just
+        those attendees. A chunk that fails as a whole, whether rendering or
+        delivering, is retried whole.
+        """
+        state.done += 1
+        try:
+            attendees = future.result()
+            _advance(eventFunc, state, "render")
+            delivery_errors, responses = self._deliver(attendees, state,
+                                                       eventFunc, batchFunc)
+        except Exception as err:
+            self._retry(task, state, task.frame["email"].tolist(), "chunk", err,
+                        errorFunc)
+            return
+
+        part = manager2pandas(attendees)
+        state.parts.append(part)
+        transient, permanent = self.retries.add_batch_responses(
+            state.job.event, responses)
+
+        if state.journal is not None:
+            failed = {attendee_id for attendee_id, _ in
+                      task.errors + delivery_errors}
+            failed.update(transient + permanent)
+            state.journal.append_record(
+                part, failed, "cert_path" if self.smtp is not None else "file_url")
+
+        for attendee_id, err in task.errors:
+            self._retry(task, state, [attendee_id], "render", err)
+
+        stage = "email" if self.smtp is not None else "mailchimp"
+        for attendee_id, err in delivery_errors:
+            self._retry(task, state, [attendee_id], stage, err, errorFunc)
+
+        if transient:
+            self._retry(task, state, transient, "mailchimp",
+                        ConnectionError("batch operation failed transiently"),
+                        errorFunc)
+
+    def _deliver(self, attendees: AttendeeManager, state: "_EventState",
+                 eventFunc: EventStatusFunc, batchFunc: BatchStatusFunc
+                 ) -> Tuple[List[Tuple[str, Exception]], List[str]]:
+        """
+        Email a chunk's certificates, or upload them and update contacts.
+
+        Contacts the bulk update rejects are returned as errors, and the
+        responses of both the upload batch and any fallback update batch are
+        returned for classifying.
+
+        Returns:
+            Tuple[List[Tuple[str, Exception]], List[str]]: Attendees that could not be emailed or updated, and Mailchimp batch responses.
+        """
+        if self.smtp is not None:
+            errors = self.smtp.send_certificates(attendees, batchFunc)
+            _advance(eventFunc, state, "email")
+            return errors, []
+
+        upload_url = self.mailchimp.upload_certificates(attendees, state.folder,
+                                                        batchFunc)
+        _advance(eventFunc, state, "upload")
+        rejected, update_url = self.mailchimp.update_contact_files(attendees,
+                                                                   batchFunc)
+        _advance(eventFunc, state, "update")
+        errors = [(member.get("email_address"),
+                   ValueError(f"{member.get('error_code')}: {member.get('error')}"))
+                  for member in rejected]
+
+        responses = []
+        for url in (upload_url, update_url):
+            if url:
+                responses.extend(self.mailchimp.download_batch_respones(url))
+        return errors, responses
+
+    def _create_folder(self, event: str) -> int:
+        """Create an event's Mailchimp folder, ``None`` if emailing through SMTP."""
+        if self.smtp is not None:
+            return None
+        return self.mailchimp.create_folder(event)
+
+    def _retry(self, task: "_Task", state: "_EventState",
+               attendee_ids: List[str], stage: str, err: Exception,
+               errorFunc: ErrorFunc = None):
+        """
+        Queue attendees of a chunk for a retry if the error is transient, else
+        log them.
+
+        IDs are matched case-insensitively, since Mailchimp operation IDs are
+        lowercase emails. IDs matching no attendee in the chunk are logged as
+        failures rather than dropped. Retries are reported to errorFunc, as
+        the retry queue only reports work it gives up on.
+        """
+        wanted = {str(attendee_id).lower() for attendee_id in attendee_ids}
+        key = task.frame["email"].astype(str).str.lower()
+        frame = task.frame[key.isin(wanted)]
+
+        unmatched = sorted(wanted - set(key))
+        if unmatched:
+            self.retries.log(task.job.event, unmatched, stage,
+                             LookupError(f"matched no attendee after {err}"),
+                             attempts=task.attempts)
+
+        if frame.empty:
+            return
+
+        if self.retries.add((task.job, frame), task.job.event,
+                            frame["email"].tolist(), stage, err,
+                            attempts=task.attempts):
+            state.total += 1
+            # Render errors already reach certFunc as they happen
+            if errorFunc is not None and stage != "render":
+                errorFunc(f"{task.job.event}: {stage} retrying {len(frame)} "
+                          f"attendees: {type(err).__name__}: {err}")
+
+    def _load(self, job: EventJob, journal: AttendeeJournal) -> pd.DataFrame:
+        """
+        Load an event's attendee record, keeping only the attendees to process.
+
+        Drops attendees outside this shard, and attendees the journal records
+        as completed by an earlier, interrupted run. Certificates are named
+        first, so names are the same whichever attendees are kept.
+        """
+        if self.cache is not None:
+            record = self.cache.load(job.attendees)
+        else:
+            record = load_attendee_record(job.attendees)
+
+        if self.naming is not None:
+            record = assign_cert_names(record, self.naming)
+        if self.shard is not None:
+            record = select_shard(record, *self.shard)
+        if journal is not None:
+            record = record[~record[journal.key].isin(journal.completed())]
+        return record
+
+    def _split(self, record: pd.DataFrame) -> List[pd.DataFrame]:
+        """
+        Split an attendee record into chunks of at most ``chunk_size`` rows.
+
+        An empty record still gives one (empty) chunk so the event finishes.
+        """
+        return [record.iloc[i:i + self.chunk_size]
+                for i in range(0, len(record), self.chunk_size)] or [record]
+
+    def _submit(self, pool: Executor, jobs: List[EventJob],
+                chunks: Dict[str, List[pd.DataFrame]],
+                certFunc: CertStatusFunc) -> Dict[Future, "_Task"]:
+        """
+        Queue every chunk on the pool, taking one chunk per event in turn.
+
+        The pool runs work in submission order, so interleaving the
+        submissions is enough to share the workers fairly between events.
+        """
+        queues = deque((job, deque(chunks[job.event])) for job in jobs)
+        futures = {}
+
+        while queues:
+            job, queue = queues.popleft()
+            if not queue:
+                continue
+
+            futures.update(self._submit_chunk(pool, job, queue.popleft(), certFunc))
+            queues.append((job, queue))
+
+        return futures
+
+    def _submit_chunk(self, pool: Executor, job: EventJob,
+                      frame: pd.DataFrame, certFunc: CertStatusFunc,
+                      attempts: int = 1) -> Dict[Future, "_Task"]:
+        """Queue one chunk on the pool, recording which attendees fail."""
+        errors = []
+
+        def status(attendee: Attendee, err: Exception):
+            if err is not None:
+                errors.append((attendee.get_attribute("email"), err))
+            if certFunc is not None:
+                certFunc(attendee, err)
+
+        namingFunc = precomputed_name if self.naming is not None else None
+        if job.event in self._rosters:
+            future = self._submit_rows(pool, job, frame, namingFunc, status)
+        else:
+            future = pool.submit(self._render, job.template, job.out_dir,
+                                 pandas2manager(frame), namingFunc, status)
+        return {future: _Task(job, frame, errors, attempts)}
+
+    def _submit_rows(self, pool: Executor, job: EventJob, frame: pd.DataFrame,
+                     namingFunc: NamingFunc, statusFunc: CertStatusFunc) -> Future:
+        """
+        Queue a chunk's rows of the event's roster on the process pool.
+
+        Workers send back only each row's certificate path and error, which
+        are applied to the chunk's attendees once the task is done. The
+        returned future resolves to those attendees, as ``_render`` would.
+        """
+        roster, index = self._rosters[job.event]
+        rows = index.get_indexer(frame.index).tolist()
+        attendees = Future()
+
+        def done(task: Future):
+            with self._busy_lock:
+                self._busy -= 1
+            try:
+                results = {row: (cert_path, err)
+                           for row, cert_path, err in task.result()}
+                # Object dtype keeps failures as None rather than NaN
+                rendered = pandas2manager(frame.assign(cert_path=pd.Series(
+                    [results[row][0] for row in rows], frame.index, object)))
+                errors = {email: results[row][1]
+                          for email, row in zip(frame["email"], rows)}
+                for attendee in rendered:
+                    statusFunc(attendee, errors.get(attendee.get_attribute("email")))
+            except BaseException as err:
+                attendees.set_exception(err)
+            else:
+                attendees.set_result(rendered)
+
+        with self._busy_lock:
+            self._busy += 1
+        pool.submit(render_rows, roster.spec, job.template, job.out_dir, rows,
+                    namingFunc).add_done_callback(done)
+        return attendees
+
+    def _executor(self) -> Executor:
+        """Create the pool chunks are rendered on."""
+        if self.processes:
+            return ProcessPoolExecutor(self.workers)
+        return ThreadPoolExecutor(self.workers)
+
+    def _render(self, *args) -> AttendeeManager:
+        """Call ``createCertificate``, counting the worker as busy meanwhile."""
+        with self._busy_lock:
+            self._busy += 1
+        try:
+            return createCertificate(*args)
+        finally:
+            with self._busy_lock:
+                self._busy -= 1
+
+    def _finish(self, state: "_EventState") -> pd.DataFrame:
+        """
+        Commit an event's journal, or save its partial file when sharded, then
+        save a failure report next to the attendee record if anyone failed.
+
+        When sharded, results are merged into the shard's attendees as loaded,
+        so attendees whose every chunk failed are still saved and reported.
+        """
+        job = state.job
+        if state.journal is not None:
+            record = state.journal.commit()
+        else:
+            record = self._merge_parts(state)
+            save_partial(partial_path(job.attendees, *self.shard), record)
+
+        report = self.retries.report(record, job.event)
+        if not report.empty:
+            save_attendee_record(failure_report_path(job.attendees, self.shard),
+                                 report)
+        return record
+
+    def _merge_parts(self, state: "_EventState") -> pd.DataFrame:
+        """Merge the results of an event's delivered chunks into its attendees."""
+        record = state.record.copy()
+        if not state.parts:
+            return record
+
+        results = pd.concat(state.parts).drop_duplicates("email", keep="last") \
+            .set_index("email")
+        for col in RESULT_COLUMNS:
+            if col not in results.columns:
+                continue
+
+            merged = record["email"].map(results[col])
+            if col in record.columns:
+                merged = merged.fillna(record[col])
+            record[col] = merged
+        return record
+
+class _Task(NamedTuple):
+    """A chunk of attendees submitted to the render pool."""
+    job: EventJob
+    frame: pd.DataFrame
+    errors: List[Tuple[str, Exception]]
+    attempts: int
+
+class _EventState:
+    """An event's progress through a run."""
+
+    def __init__(self, job: EventJob, journal: AttendeeJournal, folder: int,
+                 record: pd.DataFrame, total: int):
+        self.job = job
+        self.journal = journal
+        self.folder = folder
+        # The attendees to process, as loaded
+        self.record = record
+        self.parts = []
+        # Units of work, counting retries as extra units
+        self.total = total
+        self.done = 0
+        # Units of work past each pipeline stage
+        self.stages = {}
+
+def failure_report_path(path: str, shard: Tuple[int, int] = None) -> str:
+    """
+    Get where an event's failure report is saved.
+
+    Args:
+        path (str): The path to the event's attendee record.
+        shard (Tuple[int, int]): The shard number and number of shards whose report to get, defaults to ``None``, meaning the report of the whole record.
+
+    Returns:
+        str: The path to the failure report, e.g. ``"record.failures.csv"``, or ``"record.shard-2-of-4.failures.csv"`` for a shard.
+    """
+    if shard is not None:
+        path = partial_path(path, *shard)
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.failures{ext or '.csv'}"
+
+def merge_failure_reports(path: str, count: int) -> pd.DataFrame:
+    """
+    Combine every shard's failure report into the attendee record's report.
+
+    Shards in which nobody failed save no report, so missing reports are
+    skipped. The combined report is saved where an unsharded run would save
+    it, unless no shard had failures.
+
+    Args:
+        path (str): The path to the attendee record.
+        count (int): The number of shards.
+
+    Returns:
+        pd.DataFrame: The combined failure report, empty if no shard had failures.
+
+    Raises:
+        OSError: if file IO error occurs.
+    """
+    reports = [load_attendee_record(report) for report in
+               (failure_report_path(path, (i, count)) for i in range(1, count + 1))
+               if os.path.exists(report)]
+    if not reports:
+        return pd.DataFrame()
+
+    report = pd.concat(reports, ignore_index=True)
+    save_attendee_record(failure_report_path(path), report)
+    return report
+
+def _check_records(jobs: List[EventJob]):
+    """
+    Check no two events share an attendee record.
+
+    Results are journalled and committed per attendee record, so the first
+    event to finish would remove the journal the other is still writing to.
+
+    Raises:
+        ValueError: if two events share an attendee record.
+    """
+    seen = {}
+    for job in jobs:
+        path = os.path.normcase(os.path.abspath(job.attendees))
+        if path in seen:
+            raise ValueError(f"events {seen[path]!r} and {job.event!r} share the "
+                             f"attendee record {job.attendees!r}")
+        seen[path] = job.event
+
+def _warm_assets(jobs: List[EventJob]):
+    """
+    Load every template's styles into the process-wide asset cache.
+
+    Done before the render pool starts, so thread workers share the warm
+    cache and forked worker processes inherit it. Templates the cache can't
+    read are left for the renderer to report per attendee.
+    """
+    cache = get_asset_cache()
+    for template in dict.fromkeys(job.template for job in jobs):
+        try:
+            cache.template_styles(template)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            pass
+
+def _get_field(row: Dict[str, Any], key: str) -> str:
+    """Get an optional manifest field, mapping missing values to ``None``."""
+    value = row.get(key)
+    return value if isinstance(value, str) and value.strip() else None
+
+def _notify(eventFunc: EventStatusFunc, event: str, stage: str, done: int,
+            total: int):
+    """Call the event status function if one was given."""
+    if eventFunc is not None:
+        eventFunc(event, stage, done, total)
+
+def _advance(eventFunc: EventStatusFunc, state: _EventState, stage: str):
+    """Count a unit of work past a pipeline stage and report it."""
+    state.stages[stage] = state.stages.get(stage, 0) + 1
+    _notify(eventFunc, state.job.event, stage, state.stages[stage], state.total)
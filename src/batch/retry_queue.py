@@ -0,0 +1,304 @@
+"""
+Module for retrying failed work instead of failing the whole run.
+
+Failures are classified as transient (timeouts, dropped connections, HTTP 429
+and 5xx responses, SMTP 4xx replies, crashed converter processes) or
+permanent (bad email addresses, missing fields, other HTTP 4xx responses). Transient failures are
+queued to be retried after a jittered exponential backoff, so healthy work
+carries on in the meantime. Permanent failures, and transient failures that
+run out of attempts, are collected into a failure report that is itself a
+valid attendee record, so the failed attendees can be re-run on their own.
+
+TODO:
+    * Impement datalogging
+"""
+
+import heapq
+import itertools
+import json
+import random
+import smtplib
+import subprocess
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import *
+
+import pandas as pd
+from requests import ConnectionError as RequestsConnectionError, Timeout
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+_TRANSIENT_ERRORS = (TimeoutError, FutureTimeoutError, ConnectionError,
+                     RequestsConnectionError, Timeout, BrokenProcessPool,
+                     subprocess.CalledProcessError, subprocess.TimeoutExpired,
+                     smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+class Failure(NamedTuple):
+    """
+    A failure that will not be retried.
+
+    Attributes:
+        event (str): The event the attendee belongs to.
+        attendee_id (str): The attendee's ID.
+        stage (str): Where the failure happened, e.g. ``"render"`` or ``"upload"``.
+        kind (str): ``TRANSIENT`` or ``PERMANENT``.
+        reason (str): What went wrong.
+        attempts (int): How many times the work was tried.
+    """
+    event: str
+    attendee_id: str
+    stage: str
+    kind: str
+    reason: str
+    attempts: int
+
+FailureFunc = Callable[[Failure], None]
+"""Alias for failure function.
+
+Args:
+    failure (Failure): The failure just logged.
+"""
+
+def classify(err: Exception = None, status_code: int = None) -> str:
+    """
+    Classify a failure as transient or permanent.
+
+    Args:
+        err (Exception): The error raised, defaults to ``None``.
+        status_code (int): The HTTP status code of the failed request, defaults to ``None``.
+
+    Returns:
+        str: ``TRANSIENT`` if retrying may succeed, otherwise ``PERMANENT``.
+    """
+    if status_code is None:
+        response = getattr(err, "response", None)
+        status_code = getattr(response, "status_code", None)
+
+    # SMTP 4xx replies are temporary, 5xx replies are permanent
+    if isinstance(err, smtplib.SMTPResponseException):
+        return TRANSIENT if 400 <= err.smtp_code < 500 else PERMANENT
+
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        # Each refused recipient has its own reply, e.g. a 450 greylisting
+        codes = [code for code, _ in err.recipients.values()]
+        return TRANSIENT if any(400 <= code < 500 for code in codes) else PERMANENT
+
+    if status_code is not None:
+        return TRANSIENT if status_code == 429 or status_code >= 500 else PERMANENT
+
+    return TRANSIENT if isinstance(err, _TRANSIENT_ERRORS) else PERMANENT
+
+class RetryQueue:
+    """
+    Queue of transient failures waiting to be retried, plus a failure log.
+
+    Not thread-safe, use from the thread that schedules work.
+
+    Attributes:
+        max_attempts (int): The most times any work is tried.
+        base_delay (float): The backoff before the first retry, in seconds.
+        max_delay (float): The longest backoff, in seconds.
+        failureFunc (FailureFunc): Called with each failure as it is logged, ``None`` if not reporting failures.
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 60.0, seed: int = None,
+                 failureFunc: FailureFunc = None):
+        """
+        Constructor.
+
+        Args:
+            max_attempts (int): Most times any work is tried, defaults to 4.
+            base_delay (float): Backoff before the first retry in seconds, defaults to 1.
+            max_delay (float): Longest backoff in seconds, defaults to 60.
+            seed (int): Seed for the backoff jitter, defaults to ``None``.
+            failureFunc (FailureFunc): Callback informing caller of each failure that won't be retried. If ``None``, does nothing.
+
+        Raises:
+            ValueError: if max_attempts is less than 1 or a delay is negative.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        if base_delay < 0 or max_delay < 0:
+            raise ValueError("delays must not be negative")
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failureFunc = failureFunc
+        self._random = random.Random(seed)
+        self._heap = []
+        self._order = itertools.count()
+        self._failures = []
+
+    def __len__(self) -> int:
+        """Return the number of items waiting to be retried"""
+        return len(self._heap)
+
+    @property
+    def failures(self) -> List[Failure]:
+        """Every failure logged so far, oldest first."""
+        return list(self._failures)
+
+    def add(self, item: Any, event: str, attendee_ids: Sequence[str],
+            stage: str, err: Exception = None, status_code: int = None,
+            attempts: int = 1) -> bool:
+        """
+        Queue failed work for a retry, or log it if it shouldn't be retried.
+
+        Args:
+            item (Any): The work to retry, handed back by ``pop_due``.
+            event (str): The event the work belongs to.
+            attendee_ids (Sequence[str]): The attendees affected.
+            stage (str): Where the failure happened.
+            err (Exception): The error raised, defaults to ``None``.
+            status_code (int): The HTTP status code, defaults to ``None``.
+            attempts (int): How many times the work has been tried, defaults to 1.
+
+        Returns:
+            bool: ``True`` if the work was queued for a retry and vice-versa.
+        """
+        kind = classify(err, status_code)
+        if kind == TRANSIENT and attempts < self.max_attempts:
+            # Full jitter: anywhere from no wait to the exponential backoff
+            cap = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            due = time.monotonic() + self._random.uniform(0, cap)
+            heapq.heappush(self._heap, (due, next(self._order), item, attempts + 1))
+            return True
+
+        self.log(event, attendee_ids, stage, err, status_code, attempts)
+        return False
+
+    def log(self, event: str, attendee_ids: Sequence[str], stage: str,
+            err: Exception = None, status_code: int = None, attempts: int = 1):
+        """
+        Log failed work that won't be retried, whatever its kind.
+
+        Args:
+            event (str): The event the work belongs to.
+            attendee_ids (Sequence[str]): The attendees affected.
+            stage (str): Where the failure happened.
+            err (Exception): The error raised, defaults to ``None``.
+            status_code (int): The HTTP status code, defaults to ``None``.
+            attempts (int): How many times the work has been tried, defaults to 1.
+        """
+        kind = classify(err, status_code)
+        reason = _describe(err, status_code)
+        failures = [Failure(event, str(attendee_id), stage, kind, reason, attempts)
+                    for attendee_id in attendee_ids]
+        self._failures.extend(failures)
+
+        if self.failureFunc is not None:
+            for failure in failures:
+                self.failureFunc(failure)
+
+    def add_batch_responses(self, event: str, responses: List[str],
+                            stage: str = "mailchimp"
+                            ) -> Tuple[List[str], List[str]]:
+        """
+        Classify the failed operations of a Mailchimp batch request.
+
+        Operation IDs are taken to be attendee IDs. Transient failures are
+        not queued, since the whole operation must be resent by the caller.
+        Permanent failures are logged.
+
+        Args:
+            event (str): The event the batch belongs to.
+            responses (List[str]): The JSON responses from ``download_batch_respones``.
+            stage (str): Where the failures happened, defaults to ``"mailchimp"``.
+
+        Returns:
+            Tuple[List[str], List[str]]: The IDs of attendees whose operations failed transiently, then permanently.
+        """
+        transient = []
+        permanent = []
+        for text in responses:
+            response = json.loads(text)
+            status_code = response.get("status_code", 200)
+            if status_code < 400:
+                continue
+
+            attendee_id = response.get("operation_id")
+            if classify(status_code=status_code) == TRANSIENT:
+                transient.append(attendee_id)
+            else:
+                permanent.append(attendee_id)
+                self.add(None, event, [attendee_id], stage,
+                         status_code=status_code)
+
+        return transient, permanent
+
+    def pop_due(self) -> List[Tuple[Any, int]]:
+        """
+        Take every item whose backoff has passed.
+
+        Returns:
+            List[Tuple[Any, int]]: Each due item, with the attempt number it is on.
+        """
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, item, attempts = heapq.heappop(self._heap)
+            due.append((item, attempts))
+        return due
+
+    def time_until_next(self) -> float:
+        """
+        Get how long until the next item is due.
+
+        Returns:
+            float: Seconds until the next item is due, ``None`` if the queue is empty.
+        """
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0.0)
+
+    def report(self, attendees: pd.DataFrame, event: str,
+               key: str = "email") -> pd.DataFrame:
+        """
+        Build a failure report for one event.
+
+        The report holds the failed attendees' rows from the attendee record,
+        plus ``failure_stage``, ``failure_kind``, ``failure_reason``, and
+        ``failure_attempts`` columns, so it can be used as an attendee record
+        to re-run just those attendees. IDs are matched case-insensitively,
+        and failures matching no attendee are added as rows holding only the ID.
+
+        Args:
+            attendees (pd.DataFrame): The event's attendee record.
+            event (str): The event to report on.
+            key (str): The column holding the attendee ID, defaults to ``"email"``.
+
+        Returns:
+            pd.DataFrame: The failed attendees, empty if there were none.
+
+        Raises:
+            KeyError: if attendees has no key column.
+        """
+        failures = pd.DataFrame([f for f in self._failures if f.event == event],
+                                columns=Failure._fields)
+        failures["attendee_id"] = failures["attendee_id"].str.lower()
+        failures = failures.drop_duplicates("attendee_id", keep="last") \
+            .set_index("attendee_id").drop(columns="event").add_prefix("failure_")
+
+        ids = attendees[key].astype(str).str.lower()
+        failed = attendees[ids.isin(failures.index)].copy()
+        for col in failures.columns:
+            failed[col] = ids[failed.index].map(failures[col])
+
+        unmatched = failures[~failures.index.isin(ids)]
+        if not unmatched.empty:
+            unmatched = unmatched.rename_axis(key).reset_index()
+            failed = pd.concat([failed, unmatched], ignore_index=True)
+        return failed
+
+def _describe(err: Exception, status_code: int) -> str:
+    """Describe a failure in one line."""
+    if err is not None:
+        return f"{type(err).__name__}: {err}"
+    if status_code is not None:
+        return f"HTTP {status_code}"
+    return "unknown"
@@ -0,0 +1,288 @@
+"""
+Module for estimating what a run will cost before starting it.
+
+A dry run reads only what it needs: each attendee record's header and row
+count (counting lines without parsing the CSV file), and each journal's
+results, to find how many attendees an interrupted run still has to process.
+A couple of sample certificates are rendered per template to measure how long
+a certificate takes and how big it is, with the first render timed separately
+as warm-up. From these, it predicts the wall time, the bytes uploaded, the
+number of Mailchimp API calls and batches, and the number of render workers
+beyond which delivery, not rendering, is the bottleneck.
+
+Network speeds are not measured, so they are given as assumptions.
+
+TODO:
+    * Impement datalogging
+"""
+
+import csv
+import math
+import os
+import tempfile
+import time
+from typing import *
+
+import pandas as pd
+
+from src.attendees.attendee_cache import RecordCache
+from src.attendees.attendee_converter import pandas2manager
+from src.attendees.attendee_journal import journal_path
+from src.batch.batch_runner import EventJob
+from src.certificate_creator.certificate_maker import createCertificate
+from src.certificate_creator.proof_sheet import sample_attendees
+from src.mailchimp.mailchimp_manager import BULK_MEMBER_LIMIT, MEMBER_PAGE_SIZE
+from src.utils.formatting import format_duration
+
+REQUIRED_COLUMNS = ("fname", "lname", "email")
+"""The columns every attendee record must have."""
+
+class RunEstimate(NamedTuple):
+    """
+    The predicted cost of a run.
+
+    Attributes:
+        events (int): The number of events.
+        attendees (int): The number of attendees across all events.
+        pending (int): The number of attendees still to process, excluding those an earlier run completed.
+        cert_seconds (float): The time to render one certificate, after warm-up.
+        warmup_seconds (float): The extra time taken by the first certificate of each template.
+        cert_bytes (float): The average size of a certificate.
+        upload_bytes (int): The bytes sent, including base64 encoding.
+        api_calls (int): The least number of Mailchimp HTTP requests, 0 if emailing.
+        batches (int): The number of Mailchimp batch requests, 0 if emailing.
+        emails (int): The number of emails sent, 0 if delivering through Mailchimp.
+        workers (int): The number of render workers assumed.
+        best_workers (int): The fewest render workers that keep delivery busy on this machine.
+        wall_seconds (float): The predicted wall time of the run.
+    """
+    events: int
+    attendees: int
+    pending: int
+    cert_seconds: float
+    warmup_seconds: float
+    cert_bytes: float
+    upload_bytes: int
+    api_calls: int
+    batches: int
+    emails: int
+    workers: int
+    best_workers: int
+    wall_seconds: float
+
+def scan_record(path: str) -> Tuple[List[str], int]:
+    """
+    Read an attendee record's header and count its rows without parsing it.
+
+    Rows are counted by line, so quoted fields holding line breaks are
+    overcounted.
+
+    Args:
+        path (str): The absolute or relative path to the attendee record.
+
+    Returns:
+        Tuple[List[str], int]: The column names, and the number of rows.
+
+    Raises:
+        OSError: if file IO error occurs.
+    """
+    # Excel saves "CSV UTF-8" files with a byte order mark
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        header = next(csv.reader([file.readline()]), [])
+
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+
+    # A last row without a trailing line break still counts
+    if last != b"\n":
+        lines += 1
+    return header, max(lines - 1, 0)
+
+def pending_count(path: str, rows: int) -> int:
+    """
+    Get how many attendees a run still has to process.
+
+    Attendees the record's journal shows as completed, by an interrupted run,
+    are skipped by the next run.
+
+    Args:
+        path (str): The path to the attendee record.
+        rows (int): The number of attendees in the record.
+
+    Returns:
+        int: The number of attendees to process.
+
+    Raises:
+        OSError: if the journal exists but cannot be read.
+    """
+    journal = journal_path(path)
+    if not os.path.exists(journal) or os.path.getsize(journal) == 0:
+        return rows
+
+    results = pd.read_csv(journal, usecols=["id", "status"], dtype=str)
+    results = results.drop_duplicates("id", keep="last")
+    return max(rows - int((results["status"] == "ok").sum()), 0)
+
+def estimate_run(jobs: List[EventJob], workers: int = None,
+                 chunk_size: int = 100, samples: int = 2,
+                 shard: Tuple[int, int] = None, smtp: bool = False,
+                 upload_rate: float = 2**20, request_seconds: float = 0.5,
+                 smtp_connections: int = 4,
+                 cache: RecordCache = None) -> RunEstimate:
+    """
+    Predict the cost of running ``BatchRunner`` over some events.
+
+    Blocking function. Renders ``samples`` certificates for each distinct
+    template into a temporary folder, so takes a few seconds per template.
+
+    Args:
+        jobs (List[EventJob]): The events to estimate.
+        workers (int): The number of render workers to assume, defaults to ``None``, meaning the best number.
+        chunk_size (int): The number of attendees per unit of work, defaults to 100.
+        samples (int): Certificates to render per template, defaults to 2.
+        shard (Tuple[int, int]): The shard number and number of shards to process, defaults to ``None``, meaning all attendees.
+        smtp (bool): Whether certificates are emailed rather than uploaded to Mailchimp, defaults to ``False``.
+        upload_rate (float): Assumed upload speed in bytes per second, defaults to 1 MiB/s.
+        request_seconds (float): Assumed time of one HTTP request or email, defaults to 0.5.
+        smtp_connections (int): Connections emails are sent over in parallel, defaults to 4.
+        cache (RecordCache): Cache to sample attendees through, defaults to ``None``, meaning only the start of each record is read. Loading through the cache warms it for the real run, and samples from the whole record.
+
+    Returns:
+        RunEstimate: The predicted cost.
+
+    Raises:
+        KeyError: if an attendee record lacks a required column.
+        ValueError: if samples, chunk_size, or workers is less than 1.
+        OSError: if file IO error occurs.
+    """
+    if samples < 1 or chunk_size < 1:
+        raise ValueError("samples and chunk_size must be at least 1")
+
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    attendees = pending = chunks = 0
+    timings = {}
+    for job in jobs:
+        header, rows = scan_record(job.attendees)
+        for column in REQUIRED_COLUMNS:
+            if column not in header:
+                raise KeyError(column)
+
+        if shard is not None:
+            # The journal is not used when sharded
+            todo = math.ceil(rows / shard[1])
+        else:
+            todo = pending_count(job.attendees, rows)
+
+        attendees += rows
+        pending += todo
+        chunks += max(math.ceil(todo / chunk_size), 1)
+        if job.template not in timings and todo:
+            timings[job.template] = _time_renders(job, samples, cache)
+
+    if timings:
+        warmup, cert_seconds, cert_bytes = (sum(values) / len(timings)
+                                            for values in zip(*timings.values()))
+    else:
+        warmup = cert_seconds = cert_bytes = 0.0
+
+    # Certificates are sent base64 encoded, both as uploads and attachments
+    upload_bytes = math.ceil(pending * cert_bytes * 4 / 3)
+    if smtp:
+        api_calls = batches = 0
+        emails = pending
+        deliver_seconds = upload_bytes / upload_rate + \
+            emails * request_seconds / smtp_connections
+    else:
+        batches = chunks
+        emails = 0
+        # Ping, audience pages, and a folder per event, then per chunk: the
+        # upload batch, at least one poll, its responses, and the bulk upsert
+        api_calls = 1 + max(math.ceil(attendees / MEMBER_PAGE_SIZE), 1) + \
+            len(jobs) + batches * (3 + math.ceil(chunk_size / BULK_MEMBER_LIMIT))
+        deliver_seconds = upload_bytes / upload_rate + api_calls * request_seconds
+
+    cpus = os.cpu_count() or 1
+    if pending and deliver_seconds:
+        needed = math.ceil(cert_seconds * pending / deliver_seconds)
+    else:
+        needed = cpus
+    best_workers = max(min(needed, cpus, chunks), 1)
+    workers = workers or best_workers
+
+    # Delivery starts once the first chunk renders, then overlaps rendering
+    first_chunk = min(chunk_size, pending) * cert_seconds
+    wall = warmup * len(timings) + first_chunk + \
+        max(pending * cert_seconds / workers, deliver_seconds)
+
+    return RunEstimate(len(jobs), attendees, pending, cert_seconds, warmup,
+                       cert_bytes, upload_bytes, api_calls, batches, emails,
+                       workers, best_workers, wall)
+
+def format_estimate(estimate: RunEstimate) -> str:
+    """
+    Describe an estimate for printing.
+
+    Args:
+        estimate (RunEstimate): The estimate.
+
+    Returns:
+        str: One line per figure.
+    """
+    lines = [
+        f"events          {estimate.events}",
+        f"attendees       {estimate.attendees} ({estimate.pending} to process)",
+        f"per certificate {estimate.cert_seconds:.2f}s, "
+        f"{estimate.cert_bytes / 1024:.0f} KiB "
+        f"(+{estimate.warmup_seconds:.2f}s warm-up per template)",
+        f"uploaded        {estimate.upload_bytes / 2**20:.1f} MiB",
+    ]
+    if estimate.emails:
+        lines.append(f"emails          {estimate.emails}")
+    else:
+        lines.append(f"api calls       at least {estimate.api_calls}")
+        lines.append(f"batches         {estimate.batches}")
+    lines.append(f"workers         {estimate.workers} "
+                 f"(best for this machine: {estimate.best_workers})")
+    lines.append(f"wall time       {format_duration(estimate.wall_seconds)}")
+    return "\n".join(lines)
+
+# Hidden functions go here
+
+def _time_renders(job: EventJob, samples: int,
+                  cache: RecordCache) -> Tuple[float, float, float]:
+    """
+    Render sample certificates of a job one at a time.
+
+    Returns:
+        Tuple[float, float, float]: Warm-up time of the first render, mean time of the rest, and mean certificate size.
+    """
+    if cache is not None:
+        record = cache.load(job.attendees)
+    else:
+        record = pd.read_csv(job.attendees, nrows=max(samples * 20, 100), dtype=str)
+    sample = sample_attendees(record, per_group=1, random_count=samples).head(samples)
+
+    times = []
+    sizes = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for i in range(len(sample)):
+            start = time.perf_counter()
+            made = createCertificate(job.template, out_dir,
+                                     pandas2manager(sample.iloc[i:i + 1]))
+            times.append(time.perf_counter() - start)
+            for attendee in made:
+                if attendee.has_attribute("cert_path") and \
+                        attendee.get_attribute("cert_path"):
+                    sizes.append(os.path.getsize(attendee.get_attribute("cert_path")))
+
+    # The first render also loads the template and warms the asset cache
+    steady = times[1:] or times
+    cert_seconds = sum(steady) / len(steady)
+    cert_bytes = sum(sizes) / len(sizes) if sizes else 0.0
+    return max(times[0] - cert_seconds, 0.0), cert_seconds, cert_bytes
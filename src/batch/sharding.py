@@ -0,0 +1,153 @@
+"""
+Module for splitting a run across several machines without a coordinator.
+
+Each attendee belongs to exactly one of N shards, chosen by a stable hash of
+the attendee's ID (their email address by default), so every machine picks
+the same split from the same attendee record. Each shard saves its results to
+a partial file next to the attendee record, and the partial files are merged
+back into the attendee record once every shard has finished.
+
+TODO:
+    * Impement datalogging
+"""
+
+import hashlib
+import os
+from typing import *
+
+import pandas as pd
+
+from src.attendees.attendee_fileio import load_attendee_record, save_attendee_record
+
+RESULT_COLUMNS = ("cert_path", "file_url")
+"""The columns a shard writes to its partial file, besides the ID column."""
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a shard given as ``"i/N"``, e.g. ``"2/4"`` for the second of four.
+
+    Args:
+        spec (str): The shard specification.
+
+    Returns:
+        Tuple[int, int]: The shard number (from 1) and the number of shards.
+
+    Raises:
+        ValueError: if spec is not of the form ``"i/N"`` with 1 <= i <= N.
+    """
+    index, sep, count = spec.partition("/")
+    if not sep:
+        raise ValueError(f"shard must be of the form i/N, not {spec!r}")
+
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError("shard number must be between 1 and the number of shards")
+
+    return index, count
+
+def shard_of(attendee_id: str, count: int) -> int:
+    """
+    Get the shard an attendee belongs to.
+
+    Uses SHA-1 rather than ``hash`` since ``hash`` is salted per process.
+
+    Args:
+        attendee_id (str): The attendee's ID. Case is ignored.
+        count (int): The number of shards.
+
+    Returns:
+        int: The shard number, from 1 to count.
+    """
+    digest = hashlib.sha1(str(attendee_id).strip().lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def select_shard(attendees: pd.DataFrame, index: int, count: int,
+                 key: str = "email") -> pd.DataFrame:
+    """
+    Select the attendees belonging to a shard.
+
+    Args:
+        attendees (pd.DataFrame): The full attendee record.
+        index (int): The shard number, from 1.
+        count (int): The number of shards.
+        key (str): The column holding the attendee ID, defaults to ``"email"``.
+
+    Returns:
+        pd.DataFrame: The attendees in the shard, with their original index.
+
+    Raises:
+        KeyError: if attendees has no key column.
+    """
+    mask = attendees[key].map(lambda attendee_id: shard_of(attendee_id, count))
+    return attendees[mask == index]
+
+def partial_path(path: str, index: int, count: int) -> str:
+    """
+    Get where a shard saves its partial results for an attendee record.
+
+    Args:
+        path (str): The path to the attendee record.
+        index (int): The shard number, from 1.
+        count (int): The number of shards.
+
+    Returns:
+        str: The path to the partial file, e.g. ``"record.shard-2-of-4.csv"``.
+    """
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.shard-{index}-of-{count}{ext or '.csv'}"
+
+def save_partial(path: str, attendees: pd.DataFrame, key: str = "email"):
+    """
+    Save a shard's results to its partial file.
+
+    Only the ID column and whichever of ``RESULT_COLUMNS`` exist are saved.
+
+    Args:
+        path (str): Where to save the partial file.
+        attendees (pd.DataFrame): The shard's updated attendees.
+        key (str): The column holding the attendee ID, defaults to ``"email"``.
+
+    Raises:
+        KeyError: if attendees has no key column.
+        OSError: if file IO error occurs.
+    """
+    columns = [key] + [col for col in RESULT_COLUMNS if col in attendees.columns]
+    attendees[columns].to_csv(path, index=False)
+
+def merge_partials(path: str, count: int, key: str = "email") -> pd.DataFrame:
+    """
+    Merge every shard's partial file back into the attendee record.
+
+    Results in the partial files overwrite those in the attendee record, and
+    attendees missing from every partial file are left unchanged.
+
+    Args:
+        path (str): The path to the attendee record.
+        count (int): The number of shards.
+        key (str): The column holding the attendee ID, defaults to ``"email"``.
+
+    Returns:
+        pd.DataFrame: The merged attendee record, also saved to path.
+
+    Raises:
+        FileNotFoundError: if a shard's partial file is missing.
+        KeyError: if the attendee record has no key column.
+        OSError: if file IO error occurs.
+    """
+    attendees = load_attendee_record(path)
+    partials = pd.concat([pd.read_csv(partial_path(path, i, count), dtype=str)
+                          for i in range(1, count + 1)])
+    partials = partials.drop_duplicates(key, keep="last").set_index(key)
+    ids = attendees[key]
+
+    for col in RESULT_COLUMNS:
+        if col not in partials.columns:
+            continue
+
+        merged = ids.map(partials[col])
+        if col in attendees.columns:
+            merged = merged.fillna(attendees[col])
+        attendees[col] = merged
+
+    save_attendee_record(path, attendees)
+    return attendees
@@ -0,0 +1,363 @@
+"""
+Module for caching processed template assets between runs.
+
+Every run would otherwise reload and re-process the same template assets: the
+fonts, the embedded logo images (e.g. ``assets/IET_Logo_Blue_RGB.png``), and
+the template's document styles. The cache stores the processed form of each
+asset, i.e. parsed font metrics, subsetted font programs, compressed image
+streams, and extracted style parts, keyed by the asset's content hash. Nothing
+is read until the renderer first asks for an asset, and each asset is then
+kept in memory for the rest of the run, so the first certificate costs the
+same as the hundredth once the cache is warm. ``BatchRunner`` warms each
+template's styles before its render pool starts, so forked worker processes
+inherit them. Each entry ends with a checksum of its contents, and a damaged
+entry is rebuilt like a missing one. The cache directory is kept under a size
+limit by evicting the least recently used entries.
+
+Font metrics and subsetting require ``fontTools``, and image streams require
+``Pillow``. Without them, metrics and image streams are not available, and
+fonts are embedded whole.
+
+TODO:
+    * Impement datalogging
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+import zlib
+from typing import *
+
+try:
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+except ImportError:
+    TTFont = font_subset = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from src.utils.disk_cache import cache_entries, default_cache_dir, evict_lru
+
+_CHECKSUM_SIZE = 16
+"""Bytes of SHA-256 checksum ending each cache entry."""
+
+AssetBuildFunc = Callable[[bytes], bytes]
+"""Alias for asset build function.
+
+Args:
+    data (bytes): The raw contents of the asset file.
+
+Returns:
+    bytes: The processed asset to cache.
+"""
+
+class ImageStream(NamedTuple):
+    """
+    An image ready to embed in a PDF as a Flate-compressed stream.
+
+    Attributes:
+        width (int): The width in pixels.
+        height (int): The height in pixels.
+        colour_space (str): The PDF colour space, e.g. ``"DeviceRGB"``.
+        data (bytes): The zlib-compressed pixel data.
+        alpha (bytes): The zlib-compressed alpha channel, ``None`` if opaque.
+    """
+    width: int
+    height: int
+    colour_space: str
+    data: bytes
+    alpha: bytes
+
+class AssetCache:
+    """
+    Size-bounded LRU cache of processed template assets.
+
+    Thread-safe. Entries are shared between every template using the same
+    asset, since they are keyed by content rather than path.
+
+    Attributes:
+        cache_dir (str): The folder the cached assets are stored in.
+        max_bytes (int): The most bytes the cached assets may take up.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 128 * 2**20):
+        """
+        Constructor.
+
+        Args:
+            cache_dir (str): Where to store cached assets, defaults to ``None``, meaning ``default_cache_dir("assets")``.
+            max_bytes (int): Most bytes the cache may take up, defaults to 128 MiB.
+
+        Raises:
+            ValueError: if max_bytes is negative.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+
+        self.cache_dir = cache_dir or default_cache_dir("assets")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._hashes = {}
+
+    def get(self, path: str, kind: str, build: AssetBuildFunc) -> bytes:
+        """
+        Get a processed asset, building and caching it on a miss.
+
+        Cache IO errors are not raised, and damaged entries are not used,
+        the asset is built instead.
+
+        Args:
+            path (str): The absolute or relative path to the asset file.
+            kind (str): What the asset is processed into, e.g. ``"font-metrics"``. Part of the key, so one file can have several kinds.
+            build (AssetBuildFunc): Processes the asset file's contents.
+
+        Returns:
+            bytes: The processed asset.
+
+        Raises:
+            OSError: if the asset file cannot be read.
+        """
+        data, digest = self._read(path)
+        key = f"{kind}-{digest}"
+
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+
+        entry = os.path.join(self.cache_dir, key + ".bin")
+        asset = self._load(entry)
+        if asset is None:
+            if data is None:
+                with open(path, "rb") as file:
+                    data = file.read()
+            asset = build(data)
+            try:
+                self._store(entry, asset)
+            except OSError:
+                # A read-only or full cache just means rebuilding next run
+                pass
+
+        with self._lock:
+            self._memory[key] = asset
+        return asset
+
+    def font_metrics(self, path: str) -> Dict[str, Any]:
+        """
+        Get a font's metrics, in font units.
+
+        Args:
+            path (str): The path to a TrueType or OpenType font.
+
+        Returns:
+            Dict[str, Any]: ``units_per_em``, ``ascent``, ``descent``, ``cap_height``, and ``widths`` mapping each character to its advance width. ``None`` without ``fontTools``.
+
+        Raises:
+            OSError: if the font cannot be read.
+        """
+        if TTFont is None:
+            return None
+        return json.loads(self.get(path, "font-metrics", _build_font_metrics))
+
+    def font_subset(self, path: str, text: str) -> bytes:
+        """
+        Get a font program holding only the glyphs needed for some text.
+
+        Subset by every character a run could print, e.g. the template's text
+        plus all attendee names, so one subset serves the whole run.
+
+        Args:
+            path (str): The path to a TrueType or OpenType font.
+            text (str): The characters to keep.
+
+        Returns:
+            bytes: The subsetted font program, or the whole font without ``fontTools``.
+
+        Raises:
+            OSError: if the font cannot be read.
+        """
+        chars = "".join(sorted(set(text)))
+        if font_subset is None:
+            return self.get(path, "font", lambda data: data)
+
+        kind = "font-subset-" + hashlib.sha256(chars.encode()).hexdigest()[:16]
+        return self.get(path, kind, lambda data: _build_font_subset(data, chars))
+
+    def image_stream(self, path: str) -> ImageStream:
+        """
+        Get an image as a compressed stream ready to embed.
+
+        Args:
+            path (str): The path to the image, e.g. a PNG file.
+
+        Returns:
+            ImageStream: The compressed image. ``None`` without ``Pillow``.
+
+        Raises:
+            OSError: if the image cannot be read.
+        """
+        if Image is None:
+            return None
+        return _unpack_image(self.get(path, "image", _build_image_stream))
+
+    def template_styles(self, path: str, part: str = "word/styles.xml") -> bytes:
+        """
+        Get a part of a .docx template, by default its style definitions.
+
+        Args:
+            path (str): The path to the .docx template.
+            part (str): The part to extract, defaults to ``"word/styles.xml"``.
+
+        Returns:
+            bytes: The part's contents.
+
+        Raises:
+            OSError: if the template cannot be read.
+            KeyError: if the template has no such part.
+        """
+        def extract(data: bytes) -> bytes:
+            with zipfile.ZipFile(io.BytesIO(data)) as docx:
+                return docx.read(part)
+
+        return self.get(path, "docx-" + part.replace("/", "_"), extract)
+
+    def clear(self):
+        """Remove every cached asset, from memory and from disk."""
+        with self._lock:
+            self._memory.clear()
+            self._hashes.clear()
+
+        for entry in cache_entries(self.cache_dir, ".bin"):
+            os.remove(entry)
+
+    # Hidden methods go here
+
+    def _read(self, path: str) -> Tuple[bytes, str]:
+        """
+        Get an asset file's content hash, and its contents if they had to be read.
+
+        Hashes are remembered by path, modification time, and size, so each
+        file is only read once per run.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        source = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if source in self._hashes:
+                return None, self._hashes[source]
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        with self._lock:
+            self._hashes[source] = digest
+        return data, digest
+
+    def _load(self, entry: str) -> bytes:
+        """Read a cached asset, ``None`` if it is missing, unreadable, or damaged."""
+        try:
+            with open(entry, "rb") as file:
+                packed = file.read()
+            os.utime(entry)
+        except OSError:
+            return None
+
+        asset, checksum = packed[:-_CHECKSUM_SIZE], packed[-_CHECKSUM_SIZE:]
+        if len(packed) < _CHECKSUM_SIZE or _checksum(asset) != checksum:
+            return None
+        return asset
+
+    def _store(self, entry: str, asset: bytes):
+        """Write an asset and its checksum to the cache, then evict."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{entry}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(asset + _checksum(asset))
+        os.replace(tmp, entry)
+        evict_lru(self.cache_dir, ".bin", self.max_bytes)
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_asset_cache() -> AssetCache:
+    """
+    Get the process-wide asset cache, creating it on first use.
+
+    The renderer should load every template asset through this, so render
+    worker processes each warm their own memory from the shared disk cache.
+
+    Returns:
+        AssetCache: The cache in the default cache directory.
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AssetCache()
+        return _shared_cache
+
+# Hidden functions go here
+
+def _checksum(asset: bytes) -> bytes:
+    """Get the checksum ending an asset's cache entry."""
+    return hashlib.sha256(asset).digest()[:_CHECKSUM_SIZE]
+
+def _build_font_metrics(data: bytes) -> bytes:
+    """Parse a font's metrics into JSON."""
+    font = TTFont(io.BytesIO(data), lazy=True)
+    hmtx = font["hmtx"]
+    os2 = font["OS/2"] if "OS/2" in font else None
+    widths = {chr(code): hmtx[glyph][0]
+              for code, glyph in font.getBestCmap().items()}
+
+    return json.dumps({
+        "units_per_em": font["head"].unitsPerEm,
+        "ascent": font["hhea"].ascent,
+        "descent": font["hhea"].descent,
+        "cap_height": getattr(os2, "sCapHeight", None),
+        "widths": widths,
+    }).encode()
+
+def _build_font_subset(data: bytes, chars: str) -> bytes:
+    """Subset a font to the glyphs of some characters."""
+    font = TTFont(io.BytesIO(data))
+    subsetter = font_subset.Subsetter()
+    subsetter.populate(text=chars)
+    subsetter.subset(font)
+
+    out = io.BytesIO()
+    font.save(out)
+    return out.getvalue()
+
+def _build_image_stream(data: bytes) -> bytes:
+    """
+    Compress an image's pixels, packed as a JSON header line then the streams.
+    """
+    image = Image.open(io.BytesIO(data))
+    alpha = b""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA" if image.mode != "LA" else "LA")
+        alpha = zlib.compress(image.getchannel("A").tobytes(), 9)
+    image = image.convert("L" if image.mode in ("L", "LA", "1") else "RGB")
+
+    pixels = zlib.compress(image.tobytes(), 9)
+    header = {"width": image.width, "height": image.height,
+              "colour_space": "DeviceGray" if image.mode == "L" else "DeviceRGB",
+              "alpha": len(alpha)}
+    return json.dumps(header).encode() + b"\n" + pixels + alpha
+
+def _unpack_image(packed: bytes) -> ImageStream:
+    """Unpack an image stream built by ``_build_image_stream``."""
+    header, body = packed.split(b"\n", 1)
+    header = json.loads(header)
+    split = len(body) - header["alpha"]
+    return ImageStream(header["width"], header["height"],
+                       header["colour_space"], body[:split],
+                       body[split:] or None)
@@ -0,0 +1,201 @@
+"""
+Module for naming every certificate in one pass before rendering.
+
+Calling a ``NamingFunc`` once per ``Attendee`` is slow on large records, and
+names like "John Smith" collide, making one certificate overwrite another.
+Instead, every name is computed at once from the attendee record, using
+either a format string such as ``"{fname} {lname}"`` or a function from the
+record to a Series of names. Names are then made safe for the file system,
+and duplicates are resolved deterministically in record order by appending
+" (2)", " (3)", and so on.
+
+The names are stored in the ``cert_name`` column, and ``precomputed_name``
+is a ``NamingFunc`` that hands them to ``createCertificate``.
+
+TODO:
+    * Impement datalogging
+"""
+
+import string
+from typing import *
+
+import pandas as pd
+
+from src.attendees.attendee_manager import Attendee
+
+BulkNamingFunc = Callable[[pd.DataFrame], pd.Series]
+"""Alias for bulk naming function.
+
+Args:
+    attendees (pd.DataFrame): The attendee record.
+
+Return:
+    pd.Series: The name of each attendee's certificate, with the same index as the record.
+"""
+
+NAME_COLUMN = "cert_name"
+"""The attendee record column the certificate names are stored in."""
+
+MAX_NAME_LENGTH = 150
+"""The longest certificate name allowed in UTF-8 bytes, excluding any
+duplicate suffix. File systems limit names to 255 bytes, which leaves room
+for the suffix and the ``.pdf`` extension."""
+
+_UNSAFE_CHARS = r'[<>:"/\\|?*\x00-\x1f]'
+
+_RESERVED_NAMES = {"con", "prn", "aux", "nul"} | \
+    {f"{dev}{i}" for dev in ("com", "lpt") for i in range(1, 10)}
+
+def assign_cert_names(attendees: pd.DataFrame,
+                      naming: Union[str, BulkNamingFunc] = "{fname} {lname}"
+                      ) -> pd.DataFrame:
+    """
+    Name every attendee's certificate, storing the names in ``cert_name``.
+
+    Args:
+        attendees (pd.DataFrame): The attendee record.
+        naming (Union[str, BulkNamingFunc]): A format string of attendee record columns, or a function from the record to names. Defaults to ``"{fname} {lname}"``.
+
+    Returns:
+        pd.DataFrame: A copy of attendees with the ``cert_name`` column.
+
+    Raises:
+        TypeError: if naming is not a string or callable.
+        KeyError: if the format string uses a column attendees does not have.
+        ValueError: if the naming function does not return one name per attendee.
+    """
+    if isinstance(naming, str):
+        names = format_names(attendees, naming)
+    elif callable(naming):
+        names = naming(attendees)
+    else:
+        raise TypeError("naming must be a format string or callable")
+
+    if not isinstance(names, pd.Series) or not names.index.equals(attendees.index):
+        raise ValueError("naming function must return a Series indexed like attendees")
+
+    attendees = attendees.copy()
+    attendees[NAME_COLUMN] = deduplicate_names(sanitise_names(names))
+    return attendees
+
+def format_names(attendees: pd.DataFrame, fmt: str) -> pd.Series:
+    """
+    Fill a format string with each attendee's columns, a column at a time.
+
+    Missing values are treated as empty strings.
+
+    Args:
+        attendees (pd.DataFrame): The attendee record.
+        fmt (str): Format string naming attendee record columns, e.g. ``"{lname}, {fname}"``.
+
+    Returns:
+        pd.Series: The formatted names.
+
+    Raises:
+        KeyError: if fmt uses a column attendees does not have.
+        ValueError: if fmt uses positional fields or conversions.
+    """
+    names = pd.Series("", index=attendees.index, dtype=object)
+
+    for literal, field, spec, conversion in string.Formatter().parse(fmt):
+        names = names + literal
+        if field is None:
+            continue
+
+        if not field or field.isdigit() or conversion:
+            raise ValueError("format fields must be plain column names")
+
+        column = attendees[field]
+        if spec:
+            column = column.map(lambda value: "" if pd.isna(value) else format(value, spec))
+        names = names + column.fillna("").astype(str)
+
+    return names
+
+def sanitise_names(names: pd.Series) -> pd.Series:
+    """
+    Make names safe to use as file names on any common file system.
+
+    Replaces characters Windows forbids with underscores, collapses
+    whitespace, strips leading and trailing spaces and dots, shortens names
+    longer than ``MAX_NAME_LENGTH`` bytes without splitting a character, and
+    prefixes reserved device names (e.g. ``"CON"``) with an underscore.
+    Empty names become ``"certificate"``.
+
+    Args:
+        names (pd.Series): The names to sanitise.
+
+    Returns:
+        pd.Series: The sanitised names.
+    """
+    # Whitespace is collapsed first, since tabs and newlines are unsafe
+    names = names.fillna("").astype(str).str.normalize("NFC") \
+        .str.replace(r"\s+", " ", regex=True) \
+        .str.replace(_UNSAFE_CHARS, "_", regex=True)
+
+    # A character is at most 4 bytes, so only longer names need encoding
+    long = names.str.len() > MAX_NAME_LENGTH // 4
+    if long.any():
+        names[long] = names[long].map(_truncate)
+    names = names.str.strip(" .")
+
+    stems = names.str.split(".", n=1).str[0].str.lower()
+    names = names.where(~stems.isin(_RESERVED_NAMES), "_" + names)
+    return names.where(names != "", "certificate")
+
+def deduplicate_names(names: pd.Series) -> pd.Series:
+    """
+    Make names unique, ignoring case, by numbering repeats in order.
+
+    The first "John Smith" keeps its name, the second becomes
+    "John Smith (2)", and so on. A suffixed name that clashes with another
+    name is numbered further, so the result is always unique.
+
+    Args:
+        names (pd.Series): The names to make unique.
+
+    Returns:
+        pd.Series: The unique names, in the same order.
+    """
+    folded = names.str.casefold()
+    repeat = folded.groupby(folded, sort=False).cumcount()
+    if not repeat.any():
+        return names
+
+    unique = names.where(repeat == 0, names + " (" + (repeat + 1).astype(str) + ")")
+    if not unique.str.casefold().duplicated().any():
+        return unique
+
+    # Rare case: a suffixed name equals another attendee's name
+    taken = set()
+    result = []
+    for name in unique:
+        base, n = name, 1
+        while name.casefold() in taken:
+            n += 1
+            name = f"{base} ({n})"
+        taken.add(name.casefold())
+        result.append(name)
+
+    return pd.Series(result, index=names.index, dtype=object)
+
+def precomputed_name(attendee: Attendee) -> str:
+    """
+    ``NamingFunc`` that uses the name given by ``assign_cert_names``.
+
+    Args:
+        attendee (Attendee): An attendee with the ``cert_name`` attribute.
+
+    Returns:
+        str: The attendee's certificate name.
+
+    Raises:
+        KeyError: if the attendee has no ``cert_name`` attribute.
+    """
+    return attendee.get_attribute(NAME_COLUMN)
+
+# Hidden functions go here
+
+def _truncate(name: str) -> str:
+    """Cut a name to ``MAX_NAME_LENGTH`` UTF-8 bytes, dropping any split character."""
+    return name.encode("utf-8")[:MAX_NAME_LENGTH].decode("utf-8", "ignore")
@@ -7,6 +7,7 @@ fields or variables to substitute into. Certificates will be saved as PDF files.
 TODO:
     * Implement functions
     * Use multiprocessing to speed up certificate creation.
+    * Load template fonts, images, and styles through ``asset_cache.get_asset_cache()``.
     * Impement datalogging
     * Research other options for templates besides .docx files.
     * Research other options for certificates besides PDF files.
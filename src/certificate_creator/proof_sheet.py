@@ -0,0 +1,153 @@
+"""
+Module for proof-checking a template on a small sample of attendees.
+
+Rather than checking every certificate by hand, a stratified sample is
+rendered and tiled onto a single contact sheet PDF. The sample covers the
+cases most likely to break a layout: the longest names, the shortest names,
+and names with non-ASCII characters, plus a few random attendees. Once the
+sheet looks right, the full render and upload can be started.
+
+Tiling the sheet requires ``PyMuPDF``. Without it, the sample certificates
+are left in a folder next to where the sheet would have been saved.
+
+TODO:
+    * Impement datalogging
+"""
+
+import os
+import tempfile
+from typing import *
+
+import pandas as pd
+
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+from src.attendees.attendee_converter import pandas2manager
+from src.certificate_creator.certificate_maker import createCertificate, NamingFunc
+
+SHEET_SIZE = (842, 595)
+"""Width and height of a contact sheet page in points (A4 landscape)."""
+
+def sample_attendees(attendees: pd.DataFrame, per_group: int = 2,
+                     random_count: int = 3, seed: int = 0,
+                     name_columns: Sequence[str] = ("fname", "lname")
+                     ) -> pd.DataFrame:
+    """
+    Pick a stratified sample of attendees for proof-checking.
+
+    Takes the longest names, the longest names with non-ASCII characters,
+    the shortest names, then random attendees from the rest, never picking an
+    attendee twice. The same seed always gives the same sample.
+
+    Args:
+        attendees (pd.DataFrame): The attendee record.
+        per_group (int): How many attendees to take from each group, defaults to 2.
+        random_count (int): How many random attendees to add, defaults to 3.
+        seed (int): Seed for the random picks, defaults to 0.
+        name_columns (Sequence[str]): The columns that make up the printed name, defaults to first and last name.
+
+    Returns:
+        pd.DataFrame: The sampled attendees, in the order picked, empty if attendees is empty.
+
+    Raises:
+        KeyError: if attendees lacks a name column.
+        ValueError: if per_group or random_count is negative.
+    """
+    if per_group < 0 or random_count < 0:
+        raise ValueError("sample sizes must not be negative")
+
+    names = attendees[list(name_columns)]
+    if attendees.empty:
+        return attendees.copy()
+
+    names = names.fillna("").astype(str).agg(" ".join, axis=1)
+    lengths = names.str.len()
+    longest = lengths.sort_values(ascending=False, kind="stable").index
+    non_ascii = longest[~names[longest].str.isascii()]
+    shortest = lengths.sort_values(kind="stable").index
+
+    picked = []
+    for group in (longest, non_ascii, shortest):
+        picked.extend([i for i in group if i not in picked][:per_group])
+
+    rest = attendees.drop(index=picked)
+    picked.extend(rest.sample(min(random_count, len(rest)), random_state=seed).index)
+    return attendees.loc[picked]
+
+def createProofSheet(in_path: str, out_path: str, attendees: pd.DataFrame,
+                     namingFunc: NamingFunc = None, columns: int = 3,
+                     **sample_kwargs) -> str:
+    """
+    Renders a sample of certificates onto one contact sheet for checking.
+
+    Blocking function, but renders only the sample, so takes seconds
+    regardless of how many attendees there are.
+
+    Args:
+        in_path (str): The path to the template document.
+        out_path (str): Where to save the contact sheet PDF, including the filename.
+        attendees (pd.DataFrame): The full attendee record.
+        namingFunc (NamingFunc): Passed on to ``createCertificate``, defaults to ``None``.
+        columns (int): How many certificates to fit across each page, defaults to 3.
+        sample_kwargs (dict): Passed on to ``sample_attendees``.
+
+    Returns:
+        str: The path to the contact sheet, or to the folder of sample certificates if ``PyMuPDF`` is not installed.
+
+    Raises:
+        ValueError: if columns is less than 1, or attendees is empty.
+        OSError: if template or certificate file IO error occurs.
+    """
+    if columns < 1:
+        raise ValueError("columns must be at least 1")
+
+    if attendees.empty:
+        raise ValueError("attendees is empty, there is nothing to proof")
+
+    sample = pandas2manager(sample_attendees(attendees, **sample_kwargs))
+
+    if fitz is None:
+        out_dir = os.path.splitext(out_path)[0]
+        os.makedirs(out_dir, exist_ok=True)
+        createCertificate(in_path, out_dir, sample, namingFunc)
+        return out_dir
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rendered = createCertificate(in_path, tmp_dir, sample, namingFunc)
+        paths = [attendee.get_attribute("cert_path") for attendee in rendered]
+        _tile([path for path in paths if path is not None], out_path, columns)
+
+    return out_path
+
+# Hidden functions go here
+
+def _tile(paths: List[str], out_path: str, columns: int):
+    """
+    Tile the first page of each PDF onto contact sheet pages.
+
+    Cells have the sheet's aspect ratio, so there are as many rows as columns.
+    Pages are placed as vector content scaled into their cell, so the sheet
+    stays small and quick to open however many certificates it holds.
+    """
+    width, height = SHEET_SIZE
+    cell_w, cell_h = width / columns, height / columns
+    per_page = columns * columns
+    sheet = fitz.open()
+
+    for i, path in enumerate(paths):
+        if i % per_page == 0:
+            page = sheet.new_page(width=width, height=height)
+
+        row, col = divmod(i % per_page, columns)
+        cell = fitz.Rect(col * cell_w, row * cell_h,
+                         (col + 1) * cell_w, (row + 1) * cell_h)
+        with fitz.open(path) as cert:
+            page.show_pdf_page(cell + (4, 4, -4, -4), cert, 0)
+
+    if not paths:
+        sheet.new_page(width=width, height=height)
+    sheet.save(out_path, garbage=3, deflate=True)
+    sheet.close()
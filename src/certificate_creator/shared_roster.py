@@ -0,0 +1,288 @@
+"""
+Module for handing the attendee record to render worker processes cheaply.
+
+Pickling ``Attendee`` objects or DataFrames to every worker process costs
+serialisation time and a copy of the record per worker. Instead, the columns
+the renderer needs are published once into ``multiprocessing.shared_memory``
+in an Arrow-like layout: for each column, an array of UTF-8 byte offsets and
+a validity mask, followed by one buffer of all the strings. Workers attach to
+the block by name and read rows by index without copying the buffer. Tasks
+are just lists of row indices, and workers send back only small
+``(index, cert_path, error)`` tuples. ``render_shared`` renders a whole
+record this way, and ``BatchRunner`` submits ``render_rows`` tasks to its
+process pool for each chunk.
+
+TODO:
+    * Impement datalogging
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from src.attendees.attendee_manager import Attendee, AttendeeManager
+from src.certificate_creator.certificate_maker import (
+    createCertificate, CertStatusFunc, NamingFunc)
+
+class RosterSpec(NamedTuple):
+    """
+    Small, picklable description of a published roster.
+
+    Attributes:
+        name (str): The name of the shared memory block.
+        columns (Tuple[str, ...]): The published columns, in order.
+        n_rows (int): The number of rows.
+    """
+    name: str
+    columns: Tuple[str, ...]
+    n_rows: int
+
+RenderResult = Tuple[int, str, Exception]
+"""Alias for a worker's result for one row: index, certificate path, and error (``None`` if successful)."""
+
+class SharedRoster:
+    """
+    Read-only attendee columns held in shared memory.
+
+    Create with ``publish`` in the parent process and ``attach`` in workers.
+    The publishing process must ``unlink`` the roster once workers are done.
+
+    Attributes:
+        spec (RosterSpec): What workers need to attach to the roster.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, spec: RosterSpec):
+        """
+        Constructor, use ``publish`` or ``attach`` instead.
+
+        Args:
+            shm (shared_memory.SharedMemory): The shared memory block.
+            spec (RosterSpec): The layout of the block.
+        """
+        self.spec = spec
+        self._shm = shm
+        n_cols, n_rows = len(spec.columns), spec.n_rows
+        offsets_size = n_cols * (n_rows + 1) * 8
+        self._offsets = np.ndarray((n_cols, n_rows + 1), np.int64, shm.buf)
+        self._valid = np.ndarray((n_cols, n_rows), np.bool_, shm.buf,
+                                 offset=offsets_size)
+        self._data = shm.buf[offsets_size + n_cols * n_rows:]
+
+    def __enter__(self) -> "SharedRoster":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.spec.n_rows
+
+    @classmethod
+    def publish(cls, attendees: pd.DataFrame,
+                columns: Sequence[str] = None) -> "SharedRoster":
+        """
+        Copy attendee columns into a new shared memory block.
+
+        Values are stored as strings, missing values as ``None``.
+
+        Args:
+            attendees (pd.DataFrame): The attendee record.
+            columns (Sequence[str]): The columns to publish, defaults to ``None``, meaning all of them.
+
+        Returns:
+            SharedRoster: The published roster, owned by the caller.
+
+        Raises:
+            KeyError: if a column is not in attendees.
+        """
+        columns = tuple(attendees.columns if columns is None else columns)
+        n_rows = len(attendees)
+        encoded = [attendees[col].map(
+            lambda value: b"" if pd.isna(value) else str(value).encode())
+            for col in columns]
+        lengths = np.array([enc.map(len).to_numpy(np.int64) for enc in encoded])
+        lengths = lengths.reshape(len(columns), n_rows)
+
+        offsets = np.zeros((len(columns), n_rows + 1), np.int64)
+        np.cumsum(lengths, axis=1, out=offsets[:, 1:])
+        # Each column's strings follow the previous column's
+        starts = np.concatenate(([0], np.cumsum(offsets[:, -1])[:-1]))
+        offsets += starts[:, None]
+        data = b"".join(b"".join(enc) for enc in encoded)
+
+        header = offsets.nbytes + len(columns) * n_rows
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(header + len(data), 1))
+        roster = cls(shm, RosterSpec(shm.name, columns, n_rows))
+        roster._offsets[:] = offsets
+        roster._valid[:] = np.array([attendees[col].notna().to_numpy(bool)
+                                     for col in columns]).reshape(len(columns), n_rows)
+        roster._data[:len(data)] = data
+        return roster
+
+    @classmethod
+    def attach(cls, spec: RosterSpec) -> "SharedRoster":
+        """
+        Attach to a roster published by another process.
+
+        Args:
+            spec (RosterSpec): The published roster's spec.
+
+        Returns:
+            SharedRoster: The roster, read without copying.
+
+        Raises:
+            FileNotFoundError: if the roster has been unlinked.
+        """
+        return cls(shared_memory.SharedMemory(spec.name), spec)
+
+    def row(self, index: int) -> Dict[str, str]:
+        """
+        Read one row of the roster.
+
+        Args:
+            index (int): The row number, from 0.
+
+        Returns:
+            Dict[str, str]: Mapping of column name to value, ``None`` if missing.
+
+        Raises:
+            IndexError: if index is out of range.
+        """
+        if not 0 <= index < self.spec.n_rows:
+            raise IndexError("roster row out of range")
+
+        row = {}
+        for i, col in enumerate(self.spec.columns):
+            if self._valid[i, index]:
+                start, end = self._offsets[i, index], self._offsets[i, index + 1]
+                row[col] = bytes(self._data[start:end]).decode()
+            else:
+                row[col] = None
+        return row
+
+    def close(self):
+        """Detach from the shared memory block, keeping it for other processes."""
+        # Views must be released before the block can be closed
+        self._offsets = self._valid = None
+        self._data.release()
+        self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory block, call once from the publishing process."""
+        self._shm.unlink()
+
+def render_shared(in_path: str, out_dir: str, attendees: pd.DataFrame,
+                  namingFunc: NamingFunc = None,
+                  statusFunc: CertStatusFunc = None,
+                  workers: int = None, chunk_size: int = 50,
+                  columns: Sequence[str] = None) -> pd.Series:
+    """
+    Creates certificates in worker processes fed from a shared roster.
+
+    Blocking function. Workers attach to the roster once, render chunks of
+    rows with ``render_rows``, and send back small status tuples. The parent
+    builds ``Attendee`` objects only for ``statusFunc``.
+
+    Args:
+        in_path (str): The path to the template document.
+        out_dir (str): The folder to save the certificates to.
+        attendees (pd.DataFrame): The attendee record. Must have ``fname``, ``lname``, and ``email`` columns.
+        namingFunc (NamingFunc): Passed on to ``createCertificate``, must be picklable (a module-level function). Defaults to ``None``.
+        statusFunc (CertStatusFunc): Called in the parent with each attendee and its error or ``None``. Defaults to ``None``.
+        workers (int): The number of worker processes, defaults to ``None``, meaning the CPU count.
+        chunk_size (int): The number of rows per task, defaults to 50.
+        columns (Sequence[str]): The columns workers need, defaults to ``None``, meaning all of them.
+
+    Returns:
+        pd.Series: Each attendee's certificate path, ``None`` if it failed, indexed like attendees.
+
+    Raises:
+        KeyError: if a column is not in attendees.
+        ValueError: if chunk_size is less than 1.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    paths = pd.Series(None, index=attendees.index, dtype=object)
+    chunks = [list(range(start, min(start + chunk_size, len(attendees))))
+              for start in range(0, len(attendees), chunk_size)]
+
+    roster = SharedRoster.publish(attendees, columns)
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            tasks = [pool.submit(render_rows, roster.spec, in_path, out_dir, rows,
+                                 namingFunc) for rows in chunks]
+
+            for task in tasks:
+                for index, cert_path, err in task.result():
+                    paths.iat[index] = cert_path
+                    if statusFunc is not None:
+                        statusFunc(_to_attendee(roster.row(index)), err)
+    finally:
+        roster.close()
+        roster.unlink()
+
+    return paths
+
+def render_rows(spec: RosterSpec, in_path: str, out_dir: str,
+                rows: Sequence[int],
+                namingFunc: NamingFunc = None) -> List[RenderResult]:
+    """
+    Render some rows of a published roster, run in a worker process.
+
+    The worker attaches to each roster the first time it renders from it,
+    and stays attached until it exits.
+
+    Args:
+        spec (RosterSpec): The published roster's spec.
+        in_path (str): The path to the template document.
+        out_dir (str): The folder to save the certificates to.
+        rows (Sequence[int]): The row numbers to render, from 0.
+        namingFunc (NamingFunc): Passed on to ``createCertificate``, defaults to ``None``.
+
+    Returns:
+        List[RenderResult]: The result of each row, in the order given.
+
+    Raises:
+        FileNotFoundError: if the roster has been unlinked.
+        IndexError: if a row is out of range.
+    """
+    roster = _worker_rosters.get(spec.name)
+    if roster is None:
+        roster = _worker_rosters[spec.name] = SharedRoster.attach(spec)
+
+    attendees = AttendeeManager()
+    indices = {}
+    errors = {}
+
+    for index in rows:
+        attendee = _to_attendee(roster.row(index))
+        attendees.add_attendee(attendee, index)
+        indices[id(attendee)] = index
+
+    def record(attendee: Attendee, err: Exception):
+        errors[indices[id(attendee)]] = err
+
+    rendered = createCertificate(in_path, out_dir, attendees, namingFunc, record)
+    results = []
+    for index in rows:
+        attendee = rendered.get_attendee(index)
+        cert_path = attendee.get_attribute("cert_path") \
+            if attendee.has_attribute("cert_path") else None
+        results.append((index, cert_path, errors.get(index)))
+
+    return results
+
+# Hidden functions go here
+
+_worker_rosters = {}
+"""The rosters a worker process has attached to, keyed by block name."""
+
+def _to_attendee(row: Dict[str, str]) -> Attendee:
+    """Build an ``Attendee`` from a roster row."""
+    row = dict(row)
+    return Attendee(row.pop("fname"), row.pop("lname"), row.pop("email"), **row)
@@ -8,13 +8,25 @@ TODO:
 """
 
 import curses
-from typing import Dict, Any
+import os
+import sys
+from typing import Dict, Any, List
 
 from src.attendees.attendee_manager import Attendee, AttendeeManager
 from src.attendees.attendee_fileio import *
 from src.attendees.attendee_converter import *
 from src.certificate_creator.certificate_maker import createCertificate
 from src.mailchimp.mailchimp_manager import MailchimpManager
+from src.batch.batch_runner import (
+    BatchRunner, EventJob, failure_report_path, load_manifest, merge_failure_reports)
+from src.batch.retry_queue import RetryQueue
+from src.batch.run_estimator import estimate_run, format_estimate
+from src.batch.sharding import merge_partials
+from src.attendees.attendee_cache import RecordCache
+from src.certificate_creator.proof_sheet import createProofSheet
+from src.certificate_creator.cert_naming import assign_cert_names, precomputed_name
+from src.cli.dashboard import Dashboard
+from src.smtp.smtp_manager import SMTPManager
 
 def run_cli(argv: Dict[str, str]):
     """
@@ -25,6 +37,125 @@ def run_cli(argv: Dict[str, str]):
     """
     raise NotImplementedError
 
+def run_batch_cli(argv: Dict[str, str]):
+    """
+    Runs every event listed in a manifest in one process, or the single event
+    given by the attendee record and template.
+
+    Shows the live dashboard when run in a terminal, otherwise prints each
+    event's progress.
+
+    Args:
+        argv (Dict[str, str]): The processed command line arguments, must include ``"manifest"``, or ``"attendees"`` and ``"template"``.
+
+    Raises:
+        OSError: if the manifest or an attendee record cannot be loaded.
+        ConnectionError: if Mailchimp authorisation fails.
+        smtplib.SMTPException: if the SMTP server cannot be reached or rejects the login.
+    """
+    dashboard = Dashboard() if sys.stdout.isatty() else None
+    mailchimp = smtp = None
+    if argv.get("smtp_host") is not None:
+        smtp = SMTPManager(argv["smtp_host"], argv["sender"], argv["smtp_port"],
+                           argv.get("smtp_user"), argv.get("smtp_password"),
+                           not argv.get("smtp_no_tls"))
+    else:
+        mailchimp = _connect_mailchimp(argv, dashboard)
+
+    retries = RetryQueue(failureFunc=dashboard and dashboard.failure_status)
+    runner = BatchRunner(mailchimp, argv.get("workers"), shard=argv.get("shard"),
+                         cache=_record_cache(argv), naming=argv.get("naming"),
+                         retries=retries, smtp=smtp,
+                         processes=argv.get("processes", False))
+    jobs = _load_jobs(argv)
+
+    try:
+        if dashboard is None:
+            runner.run(jobs, _print_event_status)
+            return
+
+        dashboard.watch("workers", lambda: (runner.busy_workers, runner.workers))
+        if mailchimp is not None:
+            limiter = mailchimp.rate_limiter
+            dashboard.watch("in flight", lambda: (limiter.in_flight, limiter.limit))
+        with dashboard:
+            runner.run(jobs, dashboard.event_status, dashboard.cert_status,
+                       dashboard.batch_status, dashboard.error)
+    finally:
+        if smtp is not None:
+            smtp.close()
+
+def run_estimate_cli(argv: Dict[str, str]):
+    """
+    Prints a prediction of a run's cost without running it.
+
+    Estimates the events in the manifest if given, otherwise the single event
+    given by the attendee record and template.
+
+    Args:
+        argv (Dict[str, str]): The processed command line arguments.
+
+    Raises:
+        OSError: if the manifest or an attendee record cannot be read.
+        KeyError: if an attendee record lacks a required column.
+    """
+    estimate = estimate_run(_load_jobs(argv), argv.get("workers"), shard=argv.get("shard"),
+                            smtp=argv.get("smtp_host") is not None,
+                            cache=_record_cache(argv))
+    print(format_estimate(estimate))
+
+def run_proof_cli(argv: Dict[str, str]):
+    """
+    Renders a proof sheet into each event's output folder, without delivering.
+
+    Proofs the events in the manifest if given, otherwise the single event
+    given by the attendee record and template. Certificates are named as the
+    real run would name them.
+
+    Args:
+        argv (Dict[str, str]): The processed command line arguments.
+
+    Raises:
+        OSError: if the manifest, an attendee record, or a template cannot be read.
+    """
+    cache = _record_cache(argv)
+    for job in _load_jobs(argv):
+        os.makedirs(job.out_dir, exist_ok=True)
+        if cache is not None:
+            attendees = cache.load(job.attendees)
+        else:
+            attendees = load_attendee_record(job.attendees)
+        namingFunc = None
+        if argv.get("naming") is not None:
+            # Name the whole record so duplicate suffixes match the real run
+            attendees = assign_cert_names(attendees, argv["naming"])
+            namingFunc = precomputed_name
+
+        proof = createProofSheet(job.template,
+                                 os.path.join(job.out_dir, "proof.pdf"),
+                                 attendees, namingFunc)
+        print(f"{job.event}: proof saved to {proof}")
+
+def run_merge_cli(argv: Dict[str, str]):
+    """
+    Merges every shard's partial results back into the attendee record, and
+    combines the shards' failure reports.
+
+    Args:
+        argv (Dict[str, str]): The processed ``merge`` arguments, must include ``"attendees"`` and ``"shards"``.
+
+    Raises:
+        FileNotFoundError: if a shard's partial file is missing.
+        OSError: if file IO error occurs.
+    """
+    attendees = merge_partials(argv["attendees"], argv["shards"])
+    print(f"Merged {argv['shards']} shards into {len(attendees)} attendees")
+
+    report = merge_failure_reports(argv["attendees"], argv["shards"])
+    if not report.empty:
+        print(f"{len(report)} attendees failed, see "
+              f"{failure_report_path(argv['attendees'])}")
+
 # TODO: Decide on needed CLI public functions
 
 def load_attendees(path: str) -> AttendeeManager:
@@ -46,4 +177,31 @@ def load_attendees(path: str) -> AttendeeManager:
 
 # Hidden functions go here
 
+def _connect_mailchimp(argv: Dict[str, str],
+                       dashboard: Dashboard) -> MailchimpManager:
+    """Authorise a Mailchimp manager, reporting its rate to the dashboard if any."""
+    mailchimp = MailchimpManager(dashboard and dashboard.rate_status)
+    if not mailchimp.set_authorisation({"server": argv["server_key"],
+                                        "api_key": argv["api_key"]}):
+        raise ConnectionError("Mailchimp authorisation failed")
+    mailchimp.set_list(argv["list_id"],
+                       new_member_status=argv.get("new_member_status"))
+    return mailchimp
+
+def _record_cache(argv: Dict[str, str]) -> RecordCache:
+    """Get the cache to load attendee records through, ``None`` if disabled."""
+    return None if argv.get("no_cache") else RecordCache()
+
+def _load_jobs(argv: Dict[str, str]) -> List[EventJob]:
+    """Get the manifest's events, or the single event given on the command line."""
+    if argv.get("manifest") is not None:
+        return load_manifest(argv["manifest"])
+
+    event = argv.get("event") or \
+        os.path.splitext(os.path.basename(argv["attendees"]))[0]
+    return [EventJob(argv["attendees"], argv["template"], event,
+                     os.path.join(os.path.dirname(argv["attendees"]), event))]
 
+def _print_event_status(event: str, stage: str, done: int, total: int):
+    """Print an event's progress as a single line."""
+    print(f"{event}: {stage} {done}/{total}")
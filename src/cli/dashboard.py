@@ -0,0 +1,246 @@
+"""
+Module for the live curses progress dashboard.
+
+The dashboard's callbacks plug straight into ``createCertificate``,
+``MailchimpManager``, and ``BatchRunner`` as their status functions. The
+callbacks only update counters under a lock, so they stay cheap even at
+thousands of calls per second. A separate thread redraws the screen at a
+capped rate, working out rolling rates and ETAs from those counters.
+
+TODO:
+    * Impement datalogging
+"""
+
+import curses
+import threading
+import time
+from collections import deque
+from typing import *
+
+from src.attendees.attendee import Attendee
+from src.batch.retry_queue import Failure
+from src.utils.formatting import format_duration
+
+_EVENT_STAGES = ("queued", "chunk", "done")
+"""Event stages tracked per event, any other stage is a pipeline stage."""
+
+ProbeFunc = Callable[[], Tuple[int, int]]
+"""Alias for probe function, polled by the redraw thread.
+
+Returns:
+    Tuple[int, int]: How many are busy, and how many there are in total, e.g. busy workers and workers.
+"""
+
+class Dashboard:
+    """
+    Curses dashboard showing progress, throughput, ETA, and recent errors.
+
+    Use as a context manager around the run. Pass ``cert_status``,
+    ``batch_status``, ``rate_status``, ``event_status``, ``failure_status``,
+    and ``error`` as callbacks, and register ``watch`` probes for anything
+    else to show, e.g. busy workers.
+
+    Attributes:
+        max_fps (float): The most times per second the screen is redrawn.
+        window (float): How many seconds the rolling rates are averaged over.
+    """
+
+    def __init__(self, max_fps: float = 4.0, window: float = 10.0,
+                 max_errors: int = 5):
+        """
+        Constructor.
+
+        Args:
+            max_fps (float): Most redraws per second, defaults to 4.
+            window (float): Seconds the rolling rates are averaged over, defaults to 10.
+            max_errors (int): How many recent errors to show, defaults to 5.
+
+        Raises:
+            ValueError: if max_fps or window is not positive.
+        """
+        if max_fps <= 0 or window <= 0:
+            raise ValueError("max_fps and window must be positive")
+
+        self.max_fps = max_fps
+        self.window = window
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = time.monotonic()
+        self._certs = [0, 0]
+        self._batch = ("idle", 0, 0)
+        self._rate = None
+        self._events = {}
+        self._stages = {}
+        self._errors = deque(maxlen=max_errors)
+        self._probes = {}
+        self._samples = deque()
+
+    def __enter__(self) -> "Dashboard":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def cert_status(self, attendee: Attendee, err: Exception):
+        """``CertStatusFunc`` counting certificates made and failed."""
+        with self._lock:
+            self._certs[err is not None] += 1
+            if err is not None:
+                self._errors.append(f"certificate: {type(err).__name__}: {err}")
+
+    def batch_status(self, status: str, successful: int, failed: int):
+        """``BatchStatusFunc`` showing the latest Mailchimp request's progress."""
+        with self._lock:
+            self._batch = (status, successful, failed)
+
+    def rate_status(self, rate: float, limit: int):
+        """``RateStatusFunc`` showing the Mailchimp request rate and concurrency limit."""
+        with self._lock:
+            self._rate = (rate, limit)
+
+    def event_status(self, event: str, stage: str, done: int, total: int):
+        """
+        ``EventStatusFunc`` tracking each event's chunks, and each pipeline
+        stage's chunks across all events.
+        """
+        with self._lock:
+            if stage in _EVENT_STAGES:
+                self._events[event] = (stage, done, total)
+                return
+
+            self._stages.setdefault(stage, {})[event] = done
+            current, chunks, _ = self._events.get(event, ("queued", 0, total))
+            self._events[event] = (current, chunks, total)
+
+    def failure_status(self, failure: Failure):
+        """``FailureFunc`` adding each failure that won't be retried to the recent errors."""
+        # Render failures were already added by cert_status
+        if failure.stage != "render":
+            self.error(f"{failure.event}: {failure.stage} {failure.attendee_id}: "
+                       f"{failure.reason}")
+
+    def error(self, message: str):
+        """
+        Add a message to the recent errors.
+
+        Args:
+            message (str): The error message.
+        """
+        with self._lock:
+            self._errors.append(message)
+
+    def watch(self, name: str, probe: ProbeFunc):
+        """
+        Show a busy/total gauge, polled by the redraw thread.
+
+        Args:
+            name (str): The gauge label, e.g. ``"workers"``.
+            probe (ProbeFunc): Gets how many are busy and how many there are.
+        """
+        with self._lock:
+            self._probes[name] = probe
+
+    def start(self):
+        """Start redrawing on a background thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=curses.wrapper,
+                                            args=(self._loop,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop redrawing and restore the terminal."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    # Hidden methods go here
+
+    def _loop(self, screen: "curses.window"):
+        """Redraw until stopped, at most ``max_fps`` times per second."""
+        curses.curs_set(0)
+        while not self._stop.is_set():
+            self._draw(screen, self._snapshot())
+            self._stop.wait(1 / self.max_fps)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Copy the counters under the lock, then work out the rates outside it."""
+        with self._lock:
+            snap = {"certs": tuple(self._certs), "batch": self._batch,
+                    "rate": self._rate, "events": dict(self._events),
+                    "stages": {stage: sum(counts.values())
+                               for stage, counts in self._stages.items()},
+                    "errors": list(self._errors), "probes": dict(self._probes)}
+
+        now = time.monotonic()
+        done_chunks = sum(done for _, done, _ in snap["events"].values())
+        self._samples.append((now, sum(snap["certs"]), done_chunks))
+        while now - self._samples[0][0] > self.window and len(self._samples) > 2:
+            self._samples.popleft()
+
+        then, certs, chunks = self._samples[0]
+        elapsed = max(now - then, 1e-6)
+        snap["cert_speed"] = (sum(snap["certs"]) - certs) / elapsed
+        snap["chunk_speed"] = (done_chunks - chunks) / elapsed
+        snap["elapsed"] = now - self._start
+        return snap
+
+    def _draw(self, screen: "curses.window", snap: Dict[str, Any]):
+        """Draw one frame from a snapshot."""
+        lines = [f"Certificate Automater - {format_duration(snap['elapsed'])} elapsed", ""]
+        made, failed = snap["certs"]
+        lines.append(f"certificates  {made} made  {failed} failed  "
+                     f"{snap['cert_speed']:.1f}/s")
+
+        status, successful, failed = snap["batch"]
+        lines.append(f"mailchimp     {status}  {successful} ok  {failed} failed")
+        if snap["rate"] is not None:
+            lines.append(f"http          {snap['rate'][0]:.1f} req/s  "
+                         f"limit {snap['rate'][1]}")
+
+        for name, probe in snap["probes"].items():
+            busy, total = probe()
+            lines.append(f"{name:<13} {_bar(busy, total)} {busy}/{total}")
+
+        lines.extend(self._event_lines(snap))
+        lines.append("")
+        lines.append("Recent errors:" if snap["errors"] else "No errors")
+        lines.extend(f"  {message}" for message in snap["errors"])
+
+        screen.erase()
+        height, width = screen.getmaxyx()
+        for y, line in enumerate(lines[:height]):
+            screen.addnstr(y, 0, line, width - 1)
+        screen.refresh()
+
+    def _event_lines(self, snap: Dict[str, Any]) -> List[str]:
+        """Progress bar of each pipeline stage and event, then the overall ETA."""
+        events = snap["events"]
+        if not events:
+            return []
+
+        lines = [""]
+        chunks = sum(total for _, _, total in events.values())
+        for stage, done in snap["stages"].items():
+            lines.append(f"{stage:<13} {_bar(done, chunks)} {done}/{chunks}")
+
+        if snap["stages"]:
+            lines.append("")
+        for event, (stage, done, total) in events.items():
+            lines.append(f"{event[:13]:<13} {_bar(done, total)} {done}/{total} {stage}")
+
+        remaining = sum(total - done for _, done, total in events.values())
+        if remaining and snap["chunk_speed"] > 0:
+            eta = format_duration(remaining / snap["chunk_speed"])
+        else:
+            eta = "--" if remaining else "done"
+        lines.append(f"{'ETA':<13} {eta}")
+        return lines
+
+def _bar(done: int, total: int, width: int = 30) -> str:
+    """Text progress bar, e.g. ``[#####.....]``."""
+    filled = int(width * done / total) if total else 0
+    return "[" + "#" * filled + "." * (width - filled) + "]"
@@ -0,0 +1,278 @@
+"""
+Module for waiting on Mailchimp batch requests.
+
+Polls any number of batch requests in one loop. The time between polls adapts
+to how quickly ``finished_operations`` is growing: fast batches are checked
+again about when they should finish, and stalled batches are checked less
+and less often. An optional local webhook receiver wakes the poller as soon as
+Mailchimp reports a batch as finished, rather than waiting for the next poll.
+
+TODO:
+    * Impement datalogging
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import *
+from urllib.parse import parse_qs
+
+BatchFetchFunc = Callable[[str], Dict[str, Any]]
+"""Alias for batch fetch function.
+
+Args:
+    batch_id (str): The ID of the batch request.
+
+Returns:
+    Dict[str, Any]: The batch status as returned by Mailchimp's ``/batches/{batch_id}``.
+"""
+
+class BatchWebhook:
+    """
+    Local HTTP receiver for Mailchimp batch webhooks.
+
+    Mailchimp must be able to reach the receiver, e.g. through a tunnel, and
+    the webhook must be registered with ``MailchimpManager.register_batch_webhook``.
+
+    Attributes:
+        host (str): The interface the receiver listens on.
+        port (int): The port the receiver listens on.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Constructor.
+
+        Args:
+            host (str): The interface to listen on, defaults to ``"127.0.0.1"``.
+            port (int): The port to listen on, defaults to 0, meaning any free port.
+        """
+        self._finished = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._thread = None
+        self.host, self.port = self._server.server_address[:2]
+
+    @property
+    def wake(self) -> threading.Event:
+        """The event set whenever a batch webhook arrives."""
+        return self._wake
+
+    def start(self):
+        """Start receiving webhooks on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever,
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop receiving webhooks and close the socket."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def is_finished(self, batch_id: str) -> bool:
+        """
+        Checks if Mailchimp has reported a batch request as finished.
+
+        Args:
+            batch_id (str): The ID of the batch request.
+
+        Returns:
+            bool: ``True`` if a webhook for the batch has been received and vice-versa.
+        """
+        with self._lock:
+            return batch_id in self._finished
+
+    def notify(self, batch_id: str):
+        """
+        Record a batch request as finished and wake any waiting poller.
+
+        Args:
+            batch_id (str): The ID of the finished batch request.
+        """
+        with self._lock:
+            self._finished.add(batch_id)
+        self._wake.set()
+
+class BatchPoller:
+    """
+    Waits for many batch requests with adaptive polling intervals.
+
+    Attributes:
+        min_interval (float): The shortest time between polls in seconds.
+        max_interval (float): The longest time between polls in seconds.
+        backoff (float): Factor the interval grows by when no batch progresses.
+    """
+
+    def __init__(self, fetch: BatchFetchFunc, min_interval: float = 1.0,
+                 max_interval: float = 30.0, backoff: float = 1.5,
+                 webhook: BatchWebhook = None):
+        """
+        Constructor.
+
+        Args:
+            fetch (BatchFetchFunc): Gets the current status of a batch request.
+            min_interval (float): Shortest time between polls in seconds, defaults to 1.
+            max_interval (float): Longest time between polls in seconds, defaults to 30.
+            backoff (float): Factor the interval grows by when no batch progresses, defaults to 1.5.
+            webhook (BatchWebhook): Receiver that wakes the poller early, defaults to ``None``, meaning polling only.
+
+        Raises:
+            ValueError: if min_interval is not positive or is greater than max_interval.
+            ValueError: if backoff is less than 1.
+        """
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals must be positive and min_interval <= max_interval")
+
+        if backoff < 1:
+            raise ValueError("backoff must be at least 1")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._fetch = fetch
+        self._webhook = webhook
+
+    def wait(self, batch_ids: List[str],
+             status_func: Callable[[str, int, int], None] = None,
+             successful: int = 0, failed: int = 0) -> Dict[str, Dict[str, Any]]:
+        """
+        Block until every batch request has finished.
+
+        Args:
+            batch_ids (List[str]): The IDs of the batch requests to wait on.
+            status_func (BatchStatusFunc): Called after each poll with ``"pending"`` or ``"finished"``, then the total successes and failures across all batches. If ``None``, does nothing.
+            successful (int): Successes to add to the batches' own count.
+            failed (int): Failures to add to the batches' own count.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The final status of each batch request, keyed by batch ID.
+        """
+        latest = {}
+        pending = list(dict.fromkeys(batch_ids))
+        history = {}
+        notified = set()
+        interval = self.min_interval
+
+        while pending:
+            if self._webhook is not None:
+                self._webhook.wake.clear()
+
+            for batch_id in pending:
+                latest[batch_id] = self._fetch(batch_id)
+
+            pending = [batch_id for batch_id in pending
+                       if latest[batch_id]["status"] != "finished"]
+            _report(status_func, latest, pending, successful, failed)
+            interval = self._next_interval(pending, latest, history, interval)
+
+            if pending:
+                self._sleep(interval, pending, notified)
+
+        return latest
+
+    # Hidden methods go here
+
+    def _next_interval(self, pending: List[str],
+                       latest: Dict[str, Dict[str, Any]],
+                       history: Dict[str, Tuple[float, int]],
+                       interval: float) -> float:
+        """
+        Work out how long to wait before the next poll.
+
+        Aims to poll again about when the soonest batch should finish, based on
+        its operations per second since the last poll. If no batch progressed,
+        the previous interval is backed off instead.
+        """
+        now = time.monotonic()
+        estimates = []
+
+        for batch_id in pending:
+            batch = latest[batch_id]
+            done = batch["finished_operations"]
+            last = history.get(batch_id)
+            history[batch_id] = (now, done)
+
+            if last is not None and done > last[1]:
+                speed = (done - last[1]) / max(now - last[0], 1e-6)
+                estimates.append((batch["total_operations"] - done) / speed)
+
+        if estimates:
+            interval = min(estimates)
+        else:
+            interval *= self.backoff
+
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _sleep(self, interval: float, pending: List[str], notified: Set[str]):
+        """
+        Sleep until the next poll, waking early if a new webhook arrives.
+
+        A batch can still read as unfinished just after its webhook, e.g.
+        while ``"finalizing"``, so webhooks already acted on, tracked in
+        notified, only shorten the sleep to ``min_interval``.
+        """
+        if self._webhook is None:
+            time.sleep(interval)
+            return
+
+        if self._new_webhooks(pending, notified):
+            return
+
+        if any(batch_id in notified for batch_id in pending):
+            interval = min(interval, self.min_interval)
+
+        deadline = time.monotonic() + interval
+        while time.monotonic() < deadline:
+            self._webhook.wake.wait(deadline - time.monotonic())
+            self._webhook.wake.clear()
+            if self._new_webhooks(pending, notified):
+                return
+
+    def _new_webhooks(self, pending: List[str], notified: Set[str]) -> bool:
+        """Check for webhooks of pending batches not yet acted on, marking them."""
+        new = {batch_id for batch_id in pending
+               if batch_id not in notified and self._webhook.is_finished(batch_id)}
+        notified.update(new)
+        return bool(new)
+
+def _report(status_func: Callable[[str, int, int], None],
+            latest: Dict[str, Dict[str, Any]], pending: List[str],
+            successful: int, failed: int):
+    """Call the status function with totals across all batches, if one was given."""
+    if status_func is None:
+        return
+
+    errored = sum(batch["errored_operations"] for batch in latest.values())
+    finished = sum(batch["finished_operations"] for batch in latest.values())
+    status_func("pending" if pending else "finished",
+                successful + finished - errored, failed + errored)
+
+def _make_handler(webhook: BatchWebhook) -> type:
+    """Make a request handler class that reports batch webhooks to webhook."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # Mailchimp checks the URL with a GET before sending webhooks
+            self.send_response(200)
+            self.end_headers()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode())
+
+            if form.get("type") == ["batch_operation_completed"]:
+                for batch_id in form.get("data[id]", []):
+                    webhook.notify(batch_id)
+
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format: str, *args):
+            pass
+
+    return _Handler
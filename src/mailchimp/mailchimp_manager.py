@@ -10,11 +10,16 @@ TODO:
 """
 
 from __future__ import annotations
+import hashlib
+import json
+import time
 from typing import *
 
 from requests import *
 
 from src.attendees.attendee_manager import Attendee, AttendeeManager
+from src.mailchimp.batch_poller import BatchPoller, BatchWebhook
+from src.mailchimp.rate_limiter import RateLimiter, RateStatusFunc
 
 BatchStatusFunc = Callable[[str, int, int], None]
 """Type alias for batch status update callback.
@@ -25,19 +30,52 @@ Args:
     failed (int): Number of failed requests.
 """
 
+BULK_MEMBER_LIMIT = 500
+"""The most members Mailchimp accepts in one bulk list-members request."""
+
+MEMBER_PAGE_SIZE = 1000
+"""The most members Mailchimp returns in one page of list members."""
+
+MAX_THROTTLED_RETRIES = 3
+"""How many times a request rejected with HTTP 429 is retried."""
+
+MEMBER_STATUSES = ("subscribed", "unsubscribed", "cleaned", "pending",
+                   "transactional")
+"""The statuses Mailchimp accepts for new audience members."""
+
 class MailchimpManager:
     """
     Abstract Mailchimp manager without authorisation.
 
+    Keeps a single HTTP session for its lifetime so the underlying connection
+    pool is reused by every request, including across events in batch mode.
+    Every request goes through one shared ``RateLimiter``.
+
     Attributes:
         TODO: detail public attributes
     """
 
-    def __init__(self):
+    def __init__(self, rate_func: RateStatusFunc = None):
         """
         Constructor
+
+        Args:
+            rate_func (RateStatusFunc): Callback informing caller of the request rate and concurrency limit whenever they change. If ``None``, does nothing.
         """
-        raise NotImplementedError
+        self._session = Session()
+        self._limiter = RateLimiter(status_func=rate_func)
+        self._poller = BatchPoller(self._get_batch)
+        self._base_url = None
+        self._folders = {}
+        self._list_id = None
+        self._merge_field = None
+        self._new_member_status = None
+        self._members = None
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """The rate limiter shared by every request to the API."""
+        return self._limiter
     
     def set_authorisation(self, keys: Dict[str, str]) -> bool:
         """
@@ -54,9 +92,115 @@ class MailchimpManager:
             bool: ``True`` if authorisation passed and vice-versa.
         
         Raises:
-            TODO: Document all possible errors
+            TypeError: if keys is not a dictionary.
+            KeyError: if the server key or both the API key and OAuth token are missing.
+            RequestException: if the Mailchimp server could not be reached.
         """
-        raise NotImplementedError
+        if not isinstance(keys, dict):
+            raise TypeError("keys must be a dictionary")
+
+        if "server" not in keys:
+            raise KeyError("server")
+
+        if "access_token" in keys:
+            self._session.auth = None
+            self._session.headers["Authorization"] = f"Bearer {keys['access_token']}"
+        elif "api_key" in keys:
+            self._session.headers.pop("Authorization", None)
+            self._session.auth = ("anystring", keys["api_key"])
+        else:
+            raise KeyError("api_key")
+
+        self._base_url = f"https://{keys['server']}.api.mailchimp.com/3.0"
+        self._folders = {}
+        self._members = None
+        return self.ping().ok
+
+    def set_batch_webhook(self, webhook: BatchWebhook):
+        """
+        Wake batch waits as soon as the webhook receiver hears a batch finish.
+
+        Args:
+            webhook (BatchWebhook): A started webhook receiver, or ``None`` to poll only.
+
+        Raises:
+            TypeError: if webhook is not a BatchWebhook or ``None``.
+        """
+        if webhook is not None and not isinstance(webhook, BatchWebhook):
+            raise TypeError("webhook must be a BatchWebhook")
+
+        self._poller = BatchPoller(self._get_batch, webhook=webhook)
+
+    def register_batch_webhook(self, url: str) -> str:
+        """
+        Register a public URL for Mailchimp to send batch webhooks to.
+
+        Args:
+            url (str): The public URL that forwards to a ``BatchWebhook``.
+
+        Returns:
+            str: The batch webhook ID given by Mailchimp.
+
+        Raises:
+            RuntimeError: if authorisation has not been set.
+            HTTPError: if Mailchimp rejects the request.
+        """
+        resp = self._request("POST", "/batch-webhooks", json={"url": url})
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    def wait_for_batches(self, batch_ids: List[str],
+                         status_func: BatchStatusFunc = None
+                         ) -> Dict[str, Dict[str, Any]]:
+        """
+        Wait for batch requests to finish, polling them all in one loop.
+
+        Blocking function. Polls less often while batches are slow, and wakes
+        straight away if a batch webhook receiver has been set.
+
+        Args:
+            batch_ids (List[str]): The IDs of the batch requests.
+            status_func (BatchStatusFunc): Callback informing caller of the combined progress of all batches. If ``None``, does nothing.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The final status of each batch, keyed by batch ID.
+
+        Raises:
+            RuntimeError: if authorisation has not been set.
+            HTTPError: if Mailchimp rejects a request.
+        """
+        return self._poller.wait(batch_ids, status_func)
+
+    def set_list(self, list_id: str, merge_field: str = "CERT_URL",
+                 new_member_status: str = None):
+        """
+        Set the audience whose contacts are updated with certificate URLs.
+
+        By default only existing members are updated, since adding attendees
+        to an audience, e.g. as marketing subscribers, needs their consent.
+
+        Args:
+            list_id (str): The Mailchimp audience (list) ID.
+            merge_field (str): The merge tag that stores the certificate URL, defaults to ``"CERT_URL"``.
+            new_member_status (str): Add attendees who aren't members with this status, e.g. ``"transactional"``. Defaults to ``None``, meaning they are skipped.
+
+        Raises:
+            TypeError: if list_id or merge_field is not a string.
+            ValueError: if new_member_status is not one of ``MEMBER_STATUSES``.
+        """
+        if not isinstance(list_id, str):
+            raise TypeError("list_id must be a string")
+
+        if not isinstance(merge_field, str):
+            raise TypeError("merge_field must be a string")
+
+        if new_member_status is not None and new_member_status not in MEMBER_STATUSES:
+            raise ValueError(f"new_member_status must be one of {MEMBER_STATUSES}")
+
+        self._list_id = list_id
+        self._merge_field = merge_field
+        self._new_member_status = new_member_status
+        self._members = None
     
     def ping(self) -> Response:
         """
@@ -66,15 +210,18 @@ class MailchimpManager:
             The response from the Mailchimp server.
 
         Raises:
-            TODO: Detail potential errors
+            RuntimeError: if authorisation has not been set.
+            RequestException: if the Mailchimp server could not be reached.
         """
-        raise NotImplementedError
+        return self._request("GET", "/ping")
     
     def create_folder(self, foldername: str) -> int:
         """
         Creates folder on user's Mailchimp account.
 
-        Blocking function that makes HTTP request to create folder.
+        Blocking function that makes HTTP request to create folder. Folder IDs
+        are cached by name, so asking for the same folder twice (e.g. two
+        events in one batch run) only makes one request.
 
         Args:
             foldername (str): The name of the folder to create.
@@ -83,9 +230,20 @@ class MailchimpManager:
             int: the folder ID given by Mailchimp.
         
         Raises:
-            TODO: Document all possible errors
+            TypeError: if foldername is not a string.
+            RuntimeError: if authorisation has not been set.
+            HTTPError: if Mailchimp rejects the request.
         """
-        raise NotImplementedError
+        if not isinstance(foldername, str):
+            raise TypeError("foldername must be a string")
+
+        if foldername not in self._folders:
+            resp = self._request("POST", "/file-manager/folders",
+                                 json={"name": foldername})
+            resp.raise_for_status()
+            self._folders[foldername] = resp.json()["id"]
+
+        return self._folders[foldername]
 
     def upload_certificates(self, attendees: AttendeeManager,
                             folder_id: int = None,
@@ -110,23 +268,65 @@ class MailchimpManager:
         raise NotImplementedError
 
     def update_contact_files(self, attendees: AttendeeManager,
-                             status_func: BatchStatusFunc = None) -> str:
+                             status_func: BatchStatusFunc = None
+                             ) -> Tuple[List[Dict[str, Any]], str]:
         """
         Updates the attendee contact file field.
 
-        Blocking function that waits for batch request to complete.
+        Blocking function. Contacts are upserted with the bulk list-members
+        endpoint, up to ``BULK_MEMBER_LIMIT`` per request. Contacts whose
+        merge field already holds their file URL are skipped, using a local
+        copy of the audience fetched once per audience. Attendees who aren't
+        members are rejected unless ``set_list`` was given a new member
+        status. Only members in a bulk request that fails outright are sent
+        as a batch request, which this waits on.
 
         Args:
             attendees (AttendeeManager): The collection of attendees with file URLs.
             status_func (BatchStatusFunc): Callback to inform caller of progress, must take in status (string), then number of successes, then number failed. If ``None``, does nothing.
 
         Returns:
-            str: The response_body_url to download the responses.
+            Tuple[List[Dict[str, Any]], str]: The members the bulk requests rejected, as Mailchimp's error entries with ``email_address``, ``error``, and ``error_code``. Then the response_body_url to download the batch responses, ``None`` if no batch request was needed.
 
         Raises:
-            TODO: Document potential errors.
+            RuntimeError: if authorisation or the audience has not been set.
+            HTTPError: if fetching the audience members or starting a batch fails.
+
+        Note:
+            This used to return only the response_body_url. Callers must now
+            unpack the rejected members too, e.g.
+            ``rejected, url = manager.update_contact_files(attendees)``, and
+            check url for ``None`` before downloading batch responses.
         """
-        raise NotImplementedError
+        if self._list_id is None:
+            raise RuntimeError("audience has not been set")
+
+        members, rejected = self._changed_members(attendees)
+        fallback = []
+        successful = failed = 0
+
+        for i in range(0, len(members), BULK_MEMBER_LIMIT):
+            chunk = members[i:i + BULK_MEMBER_LIMIT]
+            resp = self._request("POST", f"/lists/{self._list_id}",
+                                 json={"members": chunk, "update_existing": True})
+
+            if not resp.ok:
+                fallback.extend(chunk)
+                continue
+
+            body = resp.json()
+            failed += body.get("error_count", 0)
+            successful += len(chunk) - body.get("error_count", 0)
+            rejected.extend(body.get("errors", []))
+            self._cache_members(chunk, body.get("errors", []))
+            _notify(status_func, "pending", successful, failed)
+
+        if not fallback:
+            _notify(status_func, "finished", successful, failed)
+            return rejected, None
+
+        return rejected, self._upsert_by_batch(fallback, status_func,
+                                               successful, failed)
 
     def download_batch_respones(self, response_body_url: str,
                                 keep_files: bool = False) -> List[str]:
@@ -147,3 +347,200 @@ class MailchimpManager:
             TODO: Document potential errors.
         """
         raise NotImplementedError
+
+    # Hidden methods go here
+
+    def _request(self, method: str, path: str, **kwargs) -> Response:
+        """
+        Send a request to the Mailchimp API through the shared session.
+
+        Waits on the rate limiter before sending, and retries requests that
+        Mailchimp throttles up to ``MAX_THROTTLED_RETRIES`` times.
+
+        Args:
+            method (str): The HTTP method, e.g. ``"GET"``.
+            path (str): The API path relative to the API root, e.g. ``"/ping"``.
+            kwargs (dict): Passed on to ``Session.request``.
+
+        Returns:
+            Response: The response from the Mailchimp server.
+
+        Raises:
+            RuntimeError: if authorisation has not been set.
+            RequestException: if the Mailchimp server could not be reached.
+        """
+        if self._base_url is None:
+            raise RuntimeError("authorisation has not been set")
+
+        for _ in range(MAX_THROTTLED_RETRIES):
+            resp = self._send(method, path, **kwargs)
+            if resp.status_code != 429:
+                return resp
+
+        return self._send(method, path, **kwargs)
+
+    def _send(self, method: str, path: str, **kwargs) -> Response:
+        """
+        Send one request, reporting its outcome to the rate limiter.
+
+        The limiter's slot is released whatever is raised, e.g. a
+        ``TypeError`` for a body that can't be serialised, so failed requests
+        never use up the concurrency limit.
+        """
+        self._limiter.acquire()
+        start = time.monotonic()
+        status_code = request = None
+
+        try:
+            resp = self._session.request(method, self._base_url + path, **kwargs)
+            status_code, request = resp.status_code, resp.request
+            return resp
+        except RequestException as err:
+            request = err.request
+            raise
+        finally:
+            self._limiter.release(status_code, time.monotonic() - start,
+                                  _body_size(request))
+
+    def _changed_members(self, attendees: AttendeeManager
+                         ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Build bulk upsert entries for attendees whose file URL has changed.
+
+        Attendees without a file URL are left out. Attendees who aren't
+        members are returned as error entries instead, unless new members are
+        allowed.
+        """
+        if self._members is None:
+            self._members = self._fetch_members()
+
+        members = []
+        rejected = []
+        for attendee in attendees:
+            if not attendee.has_attribute("file_url"):
+                continue
+
+            email = attendee.get_attribute("email")
+            url = attendee.get_attribute("file_url")
+            if url is None or self._members.get(email.lower()) == url:
+                continue
+
+            member = {"email_address": email,
+                      "merge_fields": {self._merge_field: url}}
+            if email.lower() in self._members:
+                members.append(member)
+            elif self._new_member_status is not None:
+                member["status_if_new"] = self._new_member_status
+                members.append(member)
+            else:
+                rejected.append({"email_address": email,
+                                 "error": "not a member of the audience",
+                                 "error_code": "NOT_A_MEMBER"})
+
+        return members, rejected
+
+    def _fetch_members(self) -> Dict[str, str]:
+        """
+        Fetch every audience member's current file URL, one page at a time.
+
+        Returns:
+            Dict[str, str]: Mapping of lowercase email address to file URL.
+
+        Raises:
+            HTTPError: if Mailchimp rejects a request.
+        """
+        members = {}
+        offset = 0
+        total = 1
+
+        while offset < total:
+            resp = self._request(
+                "GET", f"/lists/{self._list_id}/members",
+                params={"count": MEMBER_PAGE_SIZE, "offset": offset,
+                        "fields": "total_items,members.email_address,"
+                                  "members.merge_fields"})
+            resp.raise_for_status()
+            body = resp.json()
+            total = body["total_items"]
+
+            for member in body["members"]:
+                url = member.get("merge_fields", {}).get(self._merge_field)
+                members[member["email_address"].lower()] = url
+
+            if not body["members"]:
+                break
+            offset += len(body["members"])
+
+        return members
+
+    def _cache_members(self, members: List[Dict[str, Any]],
+                       errors: List[Dict[str, Any]]):
+        """Record upserted file URLs locally, skipping members that failed."""
+        rejected = {error.get("email_address", "").lower() for error in errors}
+
+        for member in members:
+            email = member["email_address"].lower()
+            if email not in rejected:
+                self._members[email] = member["merge_fields"][self._merge_field]
+
+    def _upsert_by_batch(self, members: List[Dict[str, Any]],
+                         status_func: BatchStatusFunc,
+                         successful: int, failed: int) -> str:
+        """
+        Upsert members through a batch request and wait for it to finish.
+
+        Args:
+            members (List[Dict[str, Any]]): The bulk upsert entries to send.
+            status_func (BatchStatusFunc): Progress callback, may be ``None``.
+            successful (int): Successes so far from bulk requests.
+            failed (int): Failures so far from bulk requests.
+
+        Returns:
+            str: The response_body_url to download the batch responses.
+
+        Raises:
+            HTTPError: if Mailchimp rejects the batch request.
+        """
+        operations = []
+        for member in members:
+            email = member["email_address"].lower()
+            operations.append({
+                "method": "PUT",
+                "path": f"/lists/{self._list_id}/members/{_subscriber_hash(email)}",
+                "operation_id": email,
+                "body": json.dumps(member)})
+
+        resp = self._request("POST", "/batches", json={"operations": operations})
+        resp.raise_for_status()
+        batch_id = resp.json()["id"]
+        batch = self._poller.wait([batch_id], status_func, successful,
+                                  failed)[batch_id]
+        # Batch results are per operation, so the local copy can't be trusted
+        self._members = None
+        return batch["response_body_url"]
+
+    def _get_batch(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Get the current status of a batch request.
+
+        Raises:
+            HTTPError: if Mailchimp rejects the request.
+        """
+        resp = self._request("GET", f"/batches/{batch_id}")
+        resp.raise_for_status()
+        return resp.json()
+
+def _subscriber_hash(email: str) -> str:
+    """Get Mailchimp's subscriber hash, the MD5 hash of the lowercase email."""
+    return hashlib.md5(email.lower().encode()).hexdigest()
+
+def _body_size(request: PreparedRequest) -> int:
+    """Get the size of a sent request's body, 0 if unknown."""
+    body = getattr(request, "body", None)
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+def _notify(status_func: BatchStatusFunc, status: str, successful: int,
+            failed: int):
+    """Call the batch status function if one was given."""
+    if status_func is not None:
+        status_func(status, successful, failed)
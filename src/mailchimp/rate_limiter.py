@@ -0,0 +1,189 @@
+"""
+Module for limiting the rate and concurrency of Mailchimp API requests.
+
+Mailchimp caps the number of simultaneous connections per account and answers
+with HTTP 429 when it is exceeded. The limiter combines a token bucket (the
+request rate) with a concurrency limit, and tunes both with additive increase,
+multiplicative decrease (AIMD): every fast, successful request nudges the rate
+and limit up, while a 429 or slow request cuts them down. Like TCP, the cut
+happens at most once per window: requests sent before the last cut were sent
+at the old rate, so their 429s don't cut again. Requests with large bodies,
+e.g. certificate uploads, are slow because of their size, so their latency
+isn't taken as a sign of congestion.
+
+TODO:
+    * Impement datalogging
+"""
+
+import threading
+import time
+from typing import *
+
+RateStatusFunc = Callable[[float, int], None]
+"""Alias for rate status function.
+
+Args:
+    rate (float): The current request rate in requests per second.
+    limit (int): The current limit on concurrent requests.
+"""
+
+class RateLimiter:
+    """
+    Thread-safe token bucket and concurrency limit tuned by AIMD.
+
+    Call ``acquire`` before each request and ``release`` with its outcome after.
+
+    Attributes:
+        min_rate (float): The lowest rate the limiter will back off to.
+        max_rate (float): The highest rate the limiter will grow to.
+        max_limit (int): The highest concurrency limit the limiter will grow to.
+        target_latency (float): Requests slower than this, in seconds, count as congestion.
+        large_body (int): Requests with bodies bigger than this, in bytes, never count as congestion for being slow.
+    """
+
+    def __init__(self, rate: float = 5.0, limit: int = 4,
+                 min_rate: float = 0.5, max_rate: float = 50.0,
+                 max_limit: int = 10, target_latency: float = 2.0,
+                 increase: float = 0.5, decrease: float = 0.5,
+                 large_body: int = 64 * 2**10,
+                 status_func: RateStatusFunc = None):
+        """
+        Constructor.
+
+        Args:
+            rate (float): Initial requests per second, defaults to 5.
+            limit (int): Initial concurrent request limit, defaults to 4.
+            min_rate (float): Lowest rate, defaults to 0.5.
+            max_rate (float): Highest rate, defaults to 50.
+            max_limit (int): Highest concurrent request limit, defaults to 10, Mailchimp's per-account connection cap.
+            target_latency (float): Latency in seconds above which requests count as congestion, defaults to 2.
+            increase (float): Requests per second added after each good request, defaults to 0.5.
+            decrease (float): Factor the rate and limit are multiplied by on congestion, defaults to 0.5.
+            large_body (int): Bytes above which a request's latency is ignored, defaults to 64 KiB.
+            status_func (RateStatusFunc): Called with the new rate and limit whenever either changes. If ``None``, does nothing.
+
+        Raises:
+            ValueError: if the rates, limits, or latency are not positive, or if min_rate > max_rate.
+            ValueError: if decrease is not between 0 and 1.
+        """
+        if min(rate, limit, min_rate, max_rate, max_limit, target_latency) <= 0:
+            raise ValueError("rates, limits, and latency must be positive")
+
+        if min_rate > max_rate:
+            raise ValueError("min_rate must not be greater than max_rate")
+
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.large_body = large_body
+        self._increase = increase
+        self._decrease = decrease
+        self._status_func = status_func
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._limit = min(limit, max_limit)
+        self._limit_credit = 0.0
+        self._tokens = 1.0
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._decreased = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        """The current request rate, in requests per second."""
+        return self._rate
+
+    @property
+    def limit(self) -> int:
+        """The current number of requests allowed in flight at once."""
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests acquired but not yet released."""
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+
+        Waits for both a free concurrency slot and a token from the bucket.
+        """
+        with self._cond:
+            while True:
+                self._refill()
+                if self._in_flight < self._limit and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    return
+
+                wait = None
+                if self._in_flight < self._limit:
+                    wait = (1 - self._tokens) / self._rate
+                self._cond.wait(wait)
+
+    def release(self, status_code: int = None, latency: float = 0.0,
+                size: int = 0):
+        """
+        Free the request's slot and adapt to its outcome.
+
+        Args:
+            status_code (int): The HTTP status code of the response, ``None`` if the request failed without a response.
+            latency (float): How long the request took in seconds.
+            size (int): The size of the request body in bytes, defaults to 0.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            slow = latency > self.target_latency and size <= self.large_body
+
+            if status_code == 429 or slow:
+                # Only requests sent since the last cut reflect the current rate
+                if now - latency >= self._decreased:
+                    self._back_off()
+                    self._decreased = now
+            elif status_code is not None and status_code < 500:
+                self._speed_up()
+
+            self._cond.notify_all()
+
+    # Hidden methods go here
+
+    def _refill(self):
+        """Add tokens for the time since the last refill, up to one second's worth."""
+        now = time.monotonic()
+        burst = max(self._rate, 1.0)
+        self._tokens = min(burst, self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+
+    def _speed_up(self):
+        """Additively increase the rate, and the limit once per whole request of credit."""
+        rate = min(self._rate + self._increase, self.max_rate)
+        # Limit grows by one after roughly a limit's worth of good requests
+        self._limit_credit += 1 / self._limit
+        limit = self._limit
+        if self._limit_credit >= 1:
+            self._limit_credit = 0.0
+            limit = min(self._limit + 1, self.max_limit)
+
+        self._set(rate, limit)
+
+    def _back_off(self):
+        """Multiplicatively decrease the rate and limit."""
+        self._limit_credit = 0.0
+        self._tokens = min(self._tokens, 0.0)
+        self._set(max(self._rate * self._decrease, self.min_rate),
+                  max(int(self._limit * self._decrease), 1))
+
+    def _set(self, rate: float, limit: int):
+        """Set the rate and limit, reporting them if either changed."""
+        changed = rate != self._rate or limit != self._limit
+        self._rate = rate
+        self._limit = limit
+
+        if changed and self._status_func is not None:
+            self._status_func(rate, limit)
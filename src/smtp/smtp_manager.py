@@ -0,0 +1,281 @@
+"""
+Module that delivers certificates directly by email over SMTP.
+
+An alternative to ``MailchimpManager`` for small events: rather than uploading
+certificates and updating contacts, each attendee is emailed their certificate
+as an attachment. A pool of persistent, authenticated SMTP connections is kept
+open for the whole run, so the connection and login cost is paid once per
+connection rather than once per email, and the connections send in parallel.
+Each connection can be rate limited to stay under the mail server's limits.
+
+Can be tested against a local sink such as ``aiosmtpd`` by setting ``port``
+to the sink's port and ``use_tls`` to ``False``.
+
+TODO:
+    * Impement datalogging
+"""
+
+import mimetypes
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import *
+
+from src.attendees.attendee_manager import Attendee, AttendeeManager
+from src.mailchimp.mailchimp_manager import BatchStatusFunc
+
+class SMTPManager:
+    """
+    Sends certificates as email attachments through pooled SMTP connections.
+
+    Attributes:
+        host (str): The SMTP server's host name.
+        port (int): The SMTP server's port.
+        sender (str): The From address of every email.
+        subject (str): The subject of every email, may use ``{fname}`` and ``{lname}``.
+        body (str): The body of every email, may use ``{fname}`` and ``{lname}``.
+        pool_size (int): The number of connections kept open.
+        max_rate (float): The most emails each connection sends per second, ``None`` if unlimited.
+    """
+
+    def __init__(self, host: str, sender: str, port: int = 587,
+                 username: str = None, password: str = None,
+                 use_tls: bool = True, pool_size: int = 4,
+                 max_rate: float = None,
+                 subject: str = "Your certificate of attendance",
+                 body: str = "Hi {fname},\n\nThank you for attending. Your "
+                             "certificate of attendance is attached.\n",
+                 timeout: float = 30.0):
+        """
+        Constructor.
+
+        Args:
+            host (str): The SMTP server's host name.
+            sender (str): The From address of every email.
+            port (int): The SMTP server's port, defaults to 587.
+            username (str): Username to log in with, defaults to ``None``, meaning don't log in.
+            password (str): Password to log in with, defaults to ``None``.
+            use_tls (bool): Whether to upgrade connections with STARTTLS, defaults to ``True``.
+            pool_size (int): Number of connections to keep open, defaults to 4.
+            max_rate (float): Most emails per second per connection, defaults to ``None``, meaning unlimited.
+            subject (str): Subject of every email, may use ``{fname}`` and ``{lname}``.
+            body (str): Body of every email, may use ``{fname}`` and ``{lname}``.
+            timeout (float): Socket timeout in seconds, defaults to 30.
+
+        Raises:
+            ValueError: if pool_size is less than 1 or max_rate is not positive.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.subject = subject
+        self.body = body
+        self.pool_size = pool_size
+        self.max_rate = max_rate
+        self._username = username
+        self._password = password
+        self._use_tls = use_tls
+        self._timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SMTPManager":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send_certificates(self, attendees: AttendeeManager,
+                          status_func: BatchStatusFunc = None
+                          ) -> List[Tuple[str, Exception]]:
+        """
+        Email each attendee who has a certificate their certificate.
+
+        Blocking function that waits until every email has been sent or has
+        failed. Attendees without a ``cert_path`` are skipped.
+
+        Args:
+            attendees (AttendeeManager): The collection of attendees with certificate paths.
+            status_func (BatchStatusFunc): Callback informing caller of progress, must take in status (string), then number of successes, then number failed. If ``None``, does nothing.
+
+        Returns:
+            List[Tuple[str, Exception]]: The email address and error of each attendee that could not be sent to.
+        """
+        recipients = [attendee for attendee in attendees
+                      if attendee.has_attribute("cert_path")
+                      and attendee.get_attribute("cert_path")]
+        failures = []
+        successful = 0
+
+        with ThreadPoolExecutor(self.pool_size) as pool:
+            results = pool.map(self._try_send, recipients)
+            for attendee, err in zip(recipients, results):
+                if err is None:
+                    successful += 1
+                else:
+                    failures.append((attendee.get_attribute("email"), err))
+                if status_func is not None:
+                    status_func("pending", successful, len(failures))
+
+        if status_func is not None:
+            status_func("finished", successful, len(failures))
+        return failures
+
+    def send_certificate(self, attendee: Attendee):
+        """
+        Email one attendee their certificate.
+
+        Blocking function. Borrows a connection from the pool, reconnecting
+        once if the server has dropped it.
+
+        Args:
+            attendee (Attendee): The attendee, with a ``cert_path`` attribute.
+
+        Raises:
+            KeyError: if attendee has no ``cert_path`` attribute.
+            OSError: if the certificate cannot be read.
+            smtplib.SMTPException: if the server rejects the email.
+        """
+        message = self._build_message(attendee)
+        try:
+            self._send(message)
+        except smtplib.SMTPServerDisconnected:
+            # Servers drop idle connections, so try once more on a fresh one
+            self._send(message)
+
+    def close(self):
+        """Close every idle connection in the pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    # Hidden methods go here
+
+    def _try_send(self, attendee: Attendee) -> Exception:
+        """Send to one attendee, returning the error instead of raising it."""
+        try:
+            self.send_certificate(attendee)
+        except Exception as err:
+            return err
+        return None
+
+    def _build_message(self, attendee: Attendee) -> EmailMessage:
+        """Build an attendee's email with their certificate attached."""
+        names = {"fname": attendee.get_attribute("fname"),
+                 "lname": attendee.get_attribute("lname")}
+        path = attendee.get_attribute("cert_path")
+        maintype, subtype = (mimetypes.guess_type(path)[0] or
+                             "application/octet-stream").split("/")
+
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = attendee.get_attribute("email")
+        message["Subject"] = self.subject.format(**names)
+        message.set_content(self.body.format(**names))
+        with open(path, "rb") as file:
+            message.add_attachment(file.read(), maintype=maintype,
+                                   subtype=subtype,
+                                   filename=os.path.basename(path))
+        return message
+
+    def _send(self, message: EmailMessage):
+        """
+        Send a message on a pooled connection.
+
+        The connection is only returned to the pool if the server replied
+        with an error, since smtplib then resets the transaction. After any
+        other error, e.g. a timeout in the middle of DATA, the protocol state
+        is unknown, so the connection is discarded.
+        """
+        conn = self._checkout()
+        try:
+            conn.send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            self._idle.put(conn)
+            raise
+        except BaseException:
+            self._discard(conn)
+            raise
+
+        self._idle.put(conn)
+
+    def _checkout(self) -> "_Connection":
+        """Borrow an idle connection, opening one if the pool isn't full."""
+        while True:
+            with self._lock:
+                opening = self._idle.empty() and self._opened < self.pool_size
+                if opening:
+                    self._opened += 1
+
+            if opening:
+                break
+
+            try:
+                # Time out to notice places freed by discarded connections
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+        try:
+            return self._connect()
+        except BaseException:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _discard(self, conn: "_Connection"):
+        """Close a connection and free its place in the pool."""
+        conn.quit()
+        with self._lock:
+            self._opened -= 1
+
+    def _connect(self) -> "_Connection":
+        """Open, secure, and log in a new connection."""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self._timeout)
+        try:
+            smtp.ehlo()
+            if self._use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self._username is not None:
+                smtp.login(self._username, self._password or "")
+        except BaseException:
+            smtp.close()
+            raise
+
+        return _Connection(smtp, self.max_rate)
+
+class _Connection:
+    """An SMTP connection that spaces out its emails to respect a rate limit."""
+
+    def __init__(self, smtp: smtplib.SMTP, max_rate: float):
+        self._smtp = smtp
+        self._interval = 1 / max_rate if max_rate else 0.0
+        self._last = 0.0
+
+    def send_message(self, message: EmailMessage):
+        wait = self._last + self._interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last = time.monotonic()
+        self._smtp.send_message(message)
+
+    def quit(self):
+        try:
+            self._smtp.quit()
+        except OSError:
+            self._smtp.close()
@@ -0,0 +1,142 @@
+import os
+import zipfile
+
+import pytest
+
+import src.certificate_creator.asset_cache as asset_cache
+from src.certificate_creator.asset_cache import AssetCache
+
+STYLES = b"<w:styles>Normal</w:styles>"
+
+@pytest.fixture
+def template(tmp_path) -> str:
+    path = tmp_path / "template.docx"
+    with zipfile.ZipFile(path, "w") as docx:
+        docx.writestr("word/document.xml", "<w:document/>")
+        docx.writestr("word/styles.xml", STYLES)
+    return str(path)
+
+@pytest.fixture
+def cache(tmp_path) -> AssetCache:
+    return AssetCache(str(tmp_path / "cache"))
+
+@pytest.fixture
+def builds() -> list:
+    return []
+
+def build_upper(builds: list):
+    def build(data: bytes) -> bytes:
+        builds.append(data)
+        return data.upper()
+    return build
+
+def entries(cache: AssetCache) -> list:
+    return sorted(os.listdir(cache.cache_dir))
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        AssetCache(max_bytes=-1)
+
+def test_get(tmp_path, cache: AssetCache, builds: list):
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"logo")
+
+    assert cache.get(str(path), "upper", build_upper(builds)) == b"LOGO"
+    assert cache.get(str(path), "upper", build_upper(builds)) == b"LOGO"
+    assert len(builds) == 1, "Asset was built again within a run"
+
+    # A later run reads the entry from disk
+    later = AssetCache(cache.cache_dir)
+    assert later.get(str(path), "upper", build_upper(builds)) == b"LOGO"
+    assert len(builds) == 1, "Asset was built again in a later run"
+    assert len(entries(cache)) == 1
+
+def test_get_keyed_by_content(tmp_path, cache: AssetCache, builds: list):
+    first, second = tmp_path / "first.png", tmp_path / "second.png"
+    first.write_bytes(b"logo")
+    second.write_bytes(b"logo")
+
+    cache.get(str(first), "upper", build_upper(builds))
+    cache.get(str(second), "upper", build_upper(builds))
+    assert len(builds) == 1, "Same asset at another path was built again"
+
+    second.write_bytes(b"other logo")
+    assert cache.get(str(second), "upper", build_upper(builds)) == b"OTHER LOGO"
+    assert len(builds) == 2
+
+@pytest.mark.parametrize("damage", [
+    lambda packed: b"",
+    lambda packed: packed[:-1],
+    lambda packed: b"X" + packed[1:]]
+)
+def test_get_damaged_entry(tmp_path, cache: AssetCache, builds: list, damage):
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"logo")
+    cache.get(str(path), "upper", build_upper(builds))
+    entry = os.path.join(cache.cache_dir, entries(cache)[0])
+    with open(entry, "rb") as file:
+        packed = file.read()
+    with open(entry, "wb") as file:
+        file.write(damage(packed))
+
+    later = AssetCache(cache.cache_dir)
+    assert later.get(str(path), "upper", build_upper(builds)) == b"LOGO", \
+        "Damaged entry was used"
+    assert len(builds) == 2
+    with open(entry, "rb") as file:
+        assert file.read() == packed, "Damaged entry was not replaced"
+
+def test_get_unwritable_cache(tmp_path, builds: list):
+    blocker = tmp_path / "cache"
+    blocker.write_bytes(b"not a folder")
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"logo")
+
+    cache = AssetCache(str(blocker))
+    assert cache.get(str(path), "upper", build_upper(builds)) == b"LOGO"
+
+def test_get_missing_asset(tmp_path, cache: AssetCache, builds: list):
+    with pytest.raises(OSError):
+        cache.get(str(tmp_path / "missing.png"), "upper", build_upper(builds))
+
+def test_evict(tmp_path, builds: list):
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"logo")
+    cache = AssetCache(str(tmp_path / "cache"), max_bytes=0)
+
+    assert cache.get(str(path), "upper", build_upper(builds)) == b"LOGO"
+    assert entries(cache) == []
+
+def test_template_styles(cache: AssetCache, template: str):
+    assert cache.template_styles(template) == STYLES
+    assert len(entries(cache)) == 1
+
+    with pytest.raises(KeyError):
+        cache.template_styles(template, "word/numbering.xml")
+
+def test_clear(cache: AssetCache, template: str):
+    cache.template_styles(template)
+    cache.clear()
+    assert entries(cache) == []
+
+def test_image_stream_without_pillow(monkeypatch, tmp_path, cache: AssetCache):
+    monkeypatch.setattr(asset_cache, "Image", None)
+    path = tmp_path / "logo.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n")
+
+    assert cache.image_stream(str(path)) is None
+    assert not os.path.exists(cache.cache_dir), "Unembeddable image was cached"
+
+def test_image_stream(tmp_path, cache: AssetCache):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "logo.png"
+    Image.new("RGBA", (3, 2), (255, 0, 0, 128)).save(path)
+
+    stream = cache.image_stream(str(path))
+    assert (stream.width, stream.height, stream.colour_space) == (3, 2, "DeviceRGB")
+    assert asset_cache.zlib.decompress(stream.data) == b"\xff\x00\x00" * 6
+    assert asset_cache.zlib.decompress(stream.alpha) == b"\x80" * 6
+
+def test_font_metrics_without_fonttools(monkeypatch, tmp_path, cache: AssetCache):
+    monkeypatch.setattr(asset_cache, "TTFont", None)
+    assert cache.font_metrics(str(tmp_path / "font.ttf")) is None
@@ -0,0 +1,119 @@
+import os
+
+import pandas as pd
+import pytest
+
+import src.attendees.attendee_cache as attendee_cache
+from src.attendees.attendee_cache import RecordCache
+
+@pytest.fixture
+def parses(monkeypatch) -> list:
+    """Replace the record parser with ``pd.read_csv``, counting its calls."""
+    calls = []
+
+    def parse(path: str) -> pd.DataFrame:
+        calls.append(path)
+        return pd.read_csv(path, dtype=str, encoding_errors="replace")
+
+    monkeypatch.setattr(attendee_cache, "load_attendee_record", parse)
+    return calls
+
+@pytest.fixture
+def cache(tmp_path) -> RecordCache:
+    pytest.importorskip("pyarrow")
+    return RecordCache(str(tmp_path / "cache"))
+
+@pytest.fixture
+def record(tmp_path) -> str:
+    path = tmp_path / "record.csv"
+    pd.DataFrame({"fname": ["Ann", "Bob"], "lname": ["Lee", "Ray"],
+                  "email": ["a@example.com", "b@example.com"]}
+                 ).to_csv(path, index=False)
+    return str(path)
+
+def entries(cache: RecordCache) -> list:
+    return sorted(os.listdir(cache.cache_dir))
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        RecordCache(max_bytes=-1)
+
+def test_hit(cache: RecordCache, record: str, parses: list):
+    first = cache.load(record)
+    second = cache.load(record)
+
+    assert len(parses) == 1, "Record was parsed again on a hit"
+    assert second.equals(first)
+    assert len(entries(cache)) == 1
+
+def test_miss_on_change(cache: RecordCache, record: str, parses: list):
+    cache.load(record)
+    old = entries(cache)
+    pd.DataFrame({"fname": ["Ann", "Bob"], "lname": ["Lee", "Rae"],
+                  "email": ["a@example.com", "b@example.com"]}
+                 ).to_csv(record, index=False)
+
+    assert list(cache.load(record)["lname"]) == ["Lee", "Rae"], "Stale entry was used"
+    assert len(parses) == 2
+    assert len(entries(cache)) == 1 and entries(cache) != old, \
+        "Old version of the record was not replaced"
+
+def test_hit_after_results_written_back(cache: RecordCache, record: str,
+                                        parses: list):
+    cache.load(record)
+    # As a run's journal commit would save the record
+    saved = pd.read_csv(record, dtype=str)
+    saved["cert_path"] = ["Ann Lee.pdf", None]
+    saved["file_url"] = ["https://example.com/ann.pdf", None]
+    saved.to_csv(record, index=False)
+
+    loaded = cache.load(record)
+    assert len(parses) == 1, "Writing back results invalidated the entry"
+    assert list(loaded.columns) == ["fname", "lname", "email", "cert_path", "file_url"]
+    assert loaded["file_url"][0] == "https://example.com/ann.pdf", \
+        "Result columns were not read fresh from the record"
+    assert pd.isna(loaded["cert_path"][1])
+
+def test_corrupt_entry(cache: RecordCache, record: str, parses: list):
+    expected = cache.load(record)
+    entry, = entries(cache)
+    with open(os.path.join(cache.cache_dir, entry), "wb") as file:
+        file.write(b"not a feather file")
+
+    assert cache.load(record).equals(expected)
+    assert len(parses) == 2, "Corrupt entry was not treated as a miss"
+
+    cache.load(record)
+    assert len(parses) == 2, "Corrupt entry was not replaced"
+
+def test_evict(tmp_path, record: str, parses: list):
+    pytest.importorskip("pyarrow")
+    cache = RecordCache(str(tmp_path / "cache"), max_bytes=0)
+    cache.load(record)
+    assert entries(cache) == []
+
+def test_clear(cache: RecordCache, record: str, parses: list):
+    cache.load(record)
+    cache.clear()
+    assert entries(cache) == []
+
+def test_not_utf8(cache: RecordCache, tmp_path, parses: list):
+    path = tmp_path / "latin1.csv"
+    path.write_bytes("fname,lname,email\nZo\xeb,Lee,z@example.com\n".encode("latin-1"))
+
+    cache.load(str(path))
+    assert len(parses) == 1, "Record was not left to the parser"
+
+def test_disabled(monkeypatch, tmp_path, record: str, parses: list):
+    monkeypatch.setattr(attendee_cache, "feather", None)
+    cache = RecordCache(str(tmp_path / "cache"))
+
+    assert not cache.enabled
+    cache.load(record)
+    cache.load(record)
+    assert len(parses) == 2
+    assert not os.path.exists(cache.cache_dir)
+
+def test_missing_record(cache: RecordCache, tmp_path, parses: list):
+    with pytest.raises(OSError):
+        cache.load(str(tmp_path / "missing.csv"))
@@ -0,0 +1,119 @@
+import os
+
+import pandas as pd
+import pytest
+
+import src.attendees.attendee_journal as attendee_journal
+from src.attendees.attendee_journal import AttendeeJournal, journal_path
+
+@pytest.fixture(autouse=True)
+def csv_fileio(monkeypatch):
+    monkeypatch.setattr(attendee_journal, "load_attendee_record",
+                        lambda path: pd.read_csv(path, dtype=str))
+    monkeypatch.setattr(attendee_journal, "save_attendee_record",
+                        lambda path, attendees: attendees.to_csv(path, index=False))
+
+def patch(monkeypatch, target: str, func):
+    """Replace ``os.replace`` or a function of the journal module."""
+    module = attendee_journal.os if target == "replace" else attendee_journal
+    monkeypatch.setattr(module, target, func)
+
+@pytest.fixture
+def record(tmp_path) -> str:
+    path = tmp_path / "record.csv"
+    pd.DataFrame({"fname": ["Ann", "Bob", "Cat"], "lname": ["Lee", "Ray", "Roe"],
+                  "email": ["a@example.com", "b@example.com", "c@example.com"],
+                  "cert_path": [None, None, "old/Cat Roe.pdf"]}
+                 ).to_csv(path, index=False)
+    return str(path)
+
+@pytest.mark.parametrize("path, expected", [
+    ("record.csv", "record.journal.csv"),
+    (os.path.join("events", "record"), os.path.join("events", "record.journal.csv"))]
+)
+def test_journal_path(path: str, expected: str):
+    assert journal_path(path) == expected
+
+def test_append_read(record: str):
+    with AttendeeJournal(record) as journal:
+        journal.append("a@example.com", status="failed")
+        journal.append("b@example.com", "Bob Ray.pdf", "https://example.com/b.pdf")
+        journal.append("a@example.com", "Ann Lee.pdf", "https://example.com/a.pdf")
+
+        results = journal.read()
+        assert results.loc["a@example.com", "status"] == "ok", \
+            "Later row did not override the earlier one"
+        assert journal.completed() == {"a@example.com", "b@example.com"}
+
+def test_append_record(record: str):
+    part = pd.DataFrame({"email": ["a@example.com", "b@example.com", "c@example.com"],
+                         "cert_path": ["Ann Lee.pdf", "Bob Ray.pdf", None],
+                         "file_url": ["https://example.com/a.pdf",
+                                      "https://example.com/b.pdf", None]})
+    with AttendeeJournal(record) as journal:
+        journal.append_record(part, failed_ids=["B@Example.com"])
+        assert journal.completed() == {"a@example.com"}
+
+        journal.append_record(part, delivered_column="cert_path")
+        assert journal.completed() == {"a@example.com", "b@example.com"}
+
+def test_resume(record: str):
+    journal = AttendeeJournal(record)
+    journal.append("a@example.com", "Ann Lee.pdf", "https://example.com/a.pdf")
+    # As if the run crashed without closing the journal
+    del journal
+
+    with AttendeeJournal(record) as journal:
+        assert journal.completed() == {"a@example.com"}, \
+            "Rows of the interrupted run were lost"
+        journal.append("b@example.com", "Bob Ray.pdf", "https://example.com/b.pdf")
+        assert journal.completed() == {"a@example.com", "b@example.com"}
+
+    with open(journal_path(record)) as file:
+        assert file.read().count("status") == 1, "Header was written twice"
+
+def test_commit(record: str):
+    with AttendeeJournal(record) as journal:
+        journal.append("a@example.com", "Ann Lee.pdf", "https://example.com/a.pdf")
+        journal.append("b@example.com", status="failed")
+        committed = journal.commit()
+
+    saved = pd.read_csv(record, dtype=str)
+    assert committed.equals(saved)
+    assert list(saved["file_url"].fillna("")) == ["https://example.com/a.pdf", "", ""]
+    assert list(saved["cert_path"].fillna("")) == ["Ann Lee.pdf", "", "old/Cat Roe.pdf"], \
+        "Existing results were not kept"
+    assert not os.path.exists(journal_path(record)), "Journal was not removed"
+    assert sorted(os.listdir(os.path.dirname(record))) == ["record.csv"]
+
+def test_commit_closes(record: str):
+    journal = AttendeeJournal(record)
+    journal.commit()
+    with pytest.raises(ValueError):
+        journal.append("a@example.com")
+
+@pytest.mark.parametrize("target", ["save_attendee_record", "replace"])
+def test_commit_atomic(monkeypatch, record: str, target: str):
+    with open(record, "rb") as file:
+        original = file.read()
+    working = getattr(attendee_journal.os if target == "replace" else attendee_journal,
+                      target)
+
+    def fail(*args):
+        raise OSError("disk full")
+    patch(monkeypatch, target, fail)
+
+    with AttendeeJournal(record) as journal:
+        journal.append("a@example.com", "Ann Lee.pdf", "https://example.com/a.pdf")
+        with pytest.raises(OSError):
+            journal.commit()
+
+    with open(record, "rb") as file:
+        assert file.read() == original, "Record was changed by a failed commit"
+    assert os.path.exists(journal_path(record)), "Journal was removed by a failed commit"
+
+    patch(monkeypatch, target, working)
+    with AttendeeJournal(record) as journal:
+        journal.commit()
+    assert pd.read_csv(record)["file_url"][0] == "https://example.com/a.pdf", \
+        "Results were not committed on the next attempt"
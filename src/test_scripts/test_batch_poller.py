@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from src.mailchimp.batch_poller import BatchPoller
+
+def batch(done: int, total: int = 100, status: str = "started") -> dict:
+    return {"status": status, "finished_operations": done,
+            "total_operations": total, "errored_operations": 0}
+
+@pytest.fixture
+def poller() -> BatchPoller:
+    return BatchPoller(lambda batch_id: None, min_interval=1.0,
+                       max_interval=30.0, backoff=2.0)
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        BatchPoller(lambda batch_id: None, min_interval=0)
+
+    with pytest.raises(ValueError):
+        BatchPoller(lambda batch_id: None, min_interval=5, max_interval=1)
+
+    with pytest.raises(ValueError):
+        BatchPoller(lambda batch_id: None, backoff=0.5)
+
+def test_first_poll_backs_off(poller: BatchPoller):
+    history = {}
+    interval = poller._next_interval(["b1"], {"b1": batch(0)}, history, 2.0)
+
+    assert interval == 4.0, "Interval did not back off without progress"
+    assert history["b1"][1] == 0, "Progress was not recorded"
+
+def test_stalled_backs_off(poller: BatchPoller):
+    history = {"b1": (time.monotonic() - 5, 40)}
+    interval = poller._next_interval(["b1"], {"b1": batch(40)}, history, 3.0)
+    assert interval == 6.0
+
+def test_estimates_soonest_finish(poller: BatchPoller):
+    ago = time.monotonic() - 10
+    # b1 does 5 ops/s with 50 left, b2 does 1 op/s with 80 left
+    history = {"b1": (ago, 0), "b2": (ago, 10)}
+    latest = {"b1": batch(50), "b2": batch(20)}
+    interval = poller._next_interval(["b1", "b2"], latest, history, 1.0)
+
+    assert 9.5 <= interval <= 10.5, "Interval was not the soonest estimated finish"
+
+@pytest.mark.parametrize("done, total, expected", [
+    (99, 100, 1.0),
+    (1, 10000, 30.0)]
+)
+def test_estimate_clamped(poller: BatchPoller, done: int, total: int,
+                          expected: float):
+    history = {"b1": (time.monotonic() - 1, 0)}
+    interval = poller._next_interval(["b1"], {"b1": batch(done, total)},
+                                     history, 1.0)
+    assert interval == expected
+
+def test_backoff_clamped(poller: BatchPoller):
+    interval = poller._next_interval(["b1"], {"b1": batch(0)}, {}, 25.0)
+    assert interval == 30.0
+
+def test_wait():
+    polls = {"b1": iter([batch(0), batch(50), batch(100, status="finished")]),
+             "b2": iter([batch(100, status="finished")])}
+    statuses = []
+    poller = BatchPoller(lambda batch_id: next(polls[batch_id]),
+                         min_interval=0.01, max_interval=0.05)
+
+    latest = poller.wait(["b1", "b2", "b1"],
+                         lambda status, ok, failed: statuses.append(status))
+    assert set(latest) == {"b1", "b2"}
+    assert latest["b1"]["status"] == "finished"
+    assert statuses[-1] == "finished"
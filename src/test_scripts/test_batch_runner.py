@@ -0,0 +1,379 @@
+import multiprocessing
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+import src.attendees.attendee_journal as attendee_journal
+import src.batch.batch_runner as batch_runner
+import src.certificate_creator.shared_roster as shared_roster
+from src.certificate_creator.asset_cache import AssetCache
+from src.attendees.attendee_journal import journal_path
+from src.batch.batch_runner import (BatchRunner, EventJob, failure_report_path,
+                                    load_manifest, merge_failure_reports)
+from src.batch.retry_queue import RetryQueue
+from src.batch.sharding import partial_path
+from src.mailchimp.mailchimp_manager import MailchimpManager
+
+class StubAttendee:
+    """Stands in for ``Attendee``, holding attributes in a dict."""
+
+    def __init__(self, attributes: dict):
+        self.attributes = dict(attributes)
+
+    def get_attribute(self, attribute: str):
+        return self.attributes[attribute]
+
+    def has_attribute(self, attribute: str) -> bool:
+        return attribute in self.attributes
+
+    def set_attribute(self, attribute: str, value):
+        self.attributes[attribute] = value
+
+class StubManager:
+    """Stands in for ``AttendeeManager``."""
+
+    def __init__(self, attendees=()):
+        self._attendees = dict(enumerate(attendees))
+
+    def add_attendee(self, attendee: StubAttendee, attendee_id):
+        self._attendees[attendee_id] = attendee
+
+    def get_attendee(self, attendee_id) -> StubAttendee:
+        return self._attendees[attendee_id]
+
+    def __iter__(self):
+        return iter(list(self._attendees.values()))
+
+    def __len__(self) -> int:
+        return len(self._attendees)
+
+class FakeMailchimp(MailchimpManager):
+    """Uploads and updates nothing, giving each certificate a made-up URL."""
+
+    def __init__(self):
+        super().__init__()
+        self.folders = []
+        self.uploads = []
+
+    def create_folder(self, name: str) -> int:
+        self.folders.append(name)
+        return len(self.folders)
+
+    def upload_certificates(self, attendees, folder_id, batchFunc=None) -> str:
+        self.uploads.append([attendee.get_attribute("email") for attendee in attendees])
+        for attendee in attendees:
+            if attendee.has_attribute("cert_path") and attendee.get_attribute("cert_path"):
+                attendee.set_attribute("file_url",
+                                       "https://example.com/" + attendee.get_attribute("email"))
+        return None
+
+    def update_contact_files(self, attendees, batchFunc=None):
+        return [], None
+
+    def download_batch_respones(self, batch_url: str, keep_files: bool = False):
+        return []
+
+def fake_create_certificate(in_path, out_dir, attendees, namingFunc=None,
+                            statusFunc=None):
+    """Name each certificate without rendering it, failing attendees named Bad."""
+    for attendee in attendees:
+        if attendee.get_attribute("fname") == "Bad":
+            attendee.set_attribute("cert_path", None)
+            statusFunc(attendee, ValueError("template field missing"))
+            continue
+
+        name = namingFunc(attendee) if namingFunc else attendee.get_attribute("email")
+        attendee.set_attribute("cert_path", os.path.join(out_dir, name + ".pdf"))
+        statusFunc(attendee, None)
+    return attendees
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    """Replace the unimplemented record IO, converters and renderer."""
+    load = lambda path: pd.read_csv(path, dtype=str)
+    save = lambda path, attendees: attendees.to_csv(path, index=False)
+    for module in (batch_runner, attendee_journal):
+        monkeypatch.setattr(module, "load_attendee_record", load)
+        monkeypatch.setattr(module, "save_attendee_record", save)
+
+    monkeypatch.setattr(batch_runner, "pandas2manager", lambda df: StubManager(
+        StubAttendee(row) for row in df.to_dict("records")))
+    monkeypatch.setattr(batch_runner, "manager2pandas", lambda attendees: pd.DataFrame(
+        [attendee.attributes for attendee in attendees]))
+    monkeypatch.setattr(batch_runner, "createCertificate", fake_create_certificate)
+    # Worker processes are forked, so they see these too
+    monkeypatch.setattr(shared_roster, "createCertificate", fake_create_certificate)
+    monkeypatch.setattr(shared_roster, "AttendeeManager", StubManager)
+    monkeypatch.setattr(shared_roster, "Attendee", lambda fname, lname, email, **row:
+                        StubAttendee(dict(fname=fname, lname=lname, email=email, **row)))
+
+def write_record(path, names: list) -> str:
+    pd.DataFrame({"fname": names, "lname": ["Lee"] * len(names),
+                  "email": [f"{name.lower()}{i}@example.com" for i, name in enumerate(names)]}
+                 ).to_csv(path, index=False)
+    return str(path)
+
+def make_jobs(tmp_path, sizes: dict) -> list:
+    jobs = []
+    for event, size in sizes.items():
+        names = ["Bad" if i == 1 else f"Name{i}" for i in range(size)]
+        record = write_record(tmp_path / f"{event}.csv", names)
+        jobs.append(EventJob(record, "template.docx", event, str(tmp_path / event)))
+    return jobs
+
+def write_manifest(tmp_path, contents: str) -> str:
+    path = tmp_path / "manifest.csv"
+    path.write_text(contents)
+    return str(path)
+
+@pytest.fixture
+def renders(monkeypatch, stub_pipeline) -> list:
+    """Record the event and attendees of every chunk rendered, in order."""
+    calls = []
+
+    def render(in_path, out_dir, attendees, *args):
+        calls.append((os.path.basename(out_dir),
+                      [attendee.get_attribute("email") for attendee in attendees]))
+        return fake_create_certificate(in_path, out_dir, attendees, *args)
+
+    monkeypatch.setattr(batch_runner, "createCertificate", render)
+    return calls
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        BatchRunner(None)
+
+    with pytest.raises(TypeError):
+        BatchRunner(object())
+
+    with pytest.raises(ValueError):
+        BatchRunner(MailchimpManager(), workers=0)
+
+    with pytest.raises(ValueError):
+        BatchRunner(MailchimpManager(), chunk_size=0)
+
+def test_load_manifest(tmp_path):
+    (tmp_path / "events").mkdir()
+    path = write_manifest(tmp_path / "events", "attendees,template,event,out_dir\n"
+                                               "day1.csv,template.docx,Day 1,certs\n"
+                                               "../day2.csv,template.docx,,\n")
+    root = str(tmp_path / "events")
+
+    assert load_manifest(path) == [
+        EventJob(os.path.join(root, "day1.csv"), os.path.join(root, "template.docx"),
+                 "Day 1", os.path.join(root, "certs")),
+        EventJob(os.path.join(root, "..", "day2.csv"), os.path.join(root, "template.docx"),
+                 "day2", os.path.join(root, "..", "day2"))]
+
+@pytest.mark.parametrize("contents", [
+    "attendees,event\nday1.csv,Day 1\n",
+    "template,event\ntemplate.docx,Day 1\n"]
+)
+def test_load_manifest_missing_column(tmp_path, contents: str):
+    with pytest.raises(KeyError):
+        load_manifest(write_manifest(tmp_path, contents))
+
+def test_run_duplicate_events(tmp_path):
+    jobs = make_jobs(tmp_path, {"day1": 1, "day2": 1})
+    jobs[1] = jobs[1]._replace(event="day1")
+    with pytest.raises(ValueError):
+        BatchRunner(MailchimpManager()).run(jobs)
+
+def test_run_fair(renders: list, tmp_path):
+    jobs = make_jobs(tmp_path, {"large": 6, "small": 2, "medium": 4})
+    BatchRunner(FakeMailchimp(), workers=1, chunk_size=2).run(jobs)
+
+    # One worker renders in submission order
+    assert [event for event, _ in renders] == \
+        ["large", "small", "medium", "large", "medium", "large"], \
+        "Chunks were not taken from each event in turn"
+
+def test_run_completes_each_event(renders: list, tmp_path):
+    jobs = make_jobs(tmp_path, {"large": 6, "small": 2})
+    events = []
+
+    def event_status(event: str, stage: str, done: int, total: int):
+        events.append((event, stage, done, total))
+        if stage == "done":
+            job, = [job for job in jobs if job.event == event]
+            record = pd.read_csv(job.attendees, dtype=str)
+            assert not os.path.exists(journal_path(job.attendees)), \
+                "Journal was not committed when the event finished"
+            assert record["file_url"].notna().sum() == len(record) - 1
+
+    mailchimp = FakeMailchimp()
+    results = BatchRunner(mailchimp, workers=2, chunk_size=2).run(
+        jobs, eventFunc=event_status)
+
+    assert mailchimp.folders == ["large", "small"]
+    assert ("large", "queued", 0, 3) in events and ("small", "queued", 0, 1) in events
+    assert sorted(event for event in events if event[1] == "done") == \
+        [("large", "done", 3, 3), ("small", "done", 1, 1)], \
+        "An event was not finished exactly once"
+    for job in jobs:
+        record = results[job.event]
+        assert record.equals(pd.read_csv(job.attendees, dtype=str)), \
+            "Returned record was not the saved one"
+        assert pd.isna(record["file_url"][1]), "Failed attendee has a URL"
+
+        report = pd.read_csv(failure_report_path(job.attendees), dtype=str)
+        assert list(report["email"]) == ["bad1@example.com"]
+        assert report["failure_stage"][0] == "render"
+
+def test_run_resume(renders: list, tmp_path):
+    job, = make_jobs(tmp_path, {"day1": 4})
+    pd.DataFrame({"id": ["name00@example.com", "bad1@example.com"],
+                  "cert_path": ["earlier.pdf", None],
+                  "file_url": ["https://example.com/earlier", None],
+                  "status": ["ok", "failed"]}
+                 ).to_csv(journal_path(job.attendees), index=False)
+
+    record = BatchRunner(FakeMailchimp(), chunk_size=10).run([job])["day1"]
+
+    rendered = [email for _, emails in renders for email in emails]
+    assert "name00@example.com" not in rendered, "Completed attendee was rendered again"
+    assert "bad1@example.com" in rendered, "Failed attendee was not retried"
+    assert list(record["file_url"].fillna("")) == [
+        "https://example.com/earlier", "",
+        "https://example.com/name22@example.com",
+        "https://example.com/name33@example.com"]
+
+class FlakyMailchimp(FakeMailchimp):
+    """Fails the first upload with a transient error."""
+
+    def upload_certificates(self, attendees, folder_id, batchFunc=None) -> str:
+        if not self.uploads:
+            self.uploads.append(None)
+            raise ConnectionError("connection reset")
+        return super().upload_certificates(attendees, folder_id, batchFunc)
+
+def test_run_retries_transient(renders: list, tmp_path):
+    jobs = make_jobs(tmp_path, {"day1": 2, "day2": 2})
+    events, errors, failures = [], [], []
+    runner = BatchRunner(FlakyMailchimp(), workers=1,
+                         retries=RetryQueue(base_delay=0, max_delay=0,
+                                            failureFunc=failures.append))
+
+    results = runner.run(jobs, eventFunc=lambda *status: events.append(status),
+                         errorFunc=errors.append)
+    assert [event for event, _ in renders] == ["day1", "day2", "day1"], \
+        "Failed chunk was not retried"
+    assert results["day1"]["file_url"].notna().sum() == 1
+    assert ("day1", "done", 2, 2) in events, "Retry was not counted in the total"
+    assert errors == ["day1: chunk retrying 2 attendees: ConnectionError: connection reset"], \
+        "Retried delivery error was not reported"
+    assert sorted((f.event, f.attendee_id, f.stage) for f in failures) == \
+        [("day1", "bad1@example.com", "render"), ("day2", "bad1@example.com", "render")], \
+        "Failures were not reported as they were logged"
+
+def test_run_shard(renders: list, tmp_path):
+    job, = make_jobs(tmp_path, {"day1": 20})
+    original = pd.read_csv(job.attendees, dtype=str)
+
+    record = BatchRunner(FakeMailchimp(), shard=(2, 3)).run([job])["day1"]
+    rendered = [email for _, emails in renders for email in emails]
+
+    assert sorted(rendered) == sorted(record["email"]), \
+        "Attendees outside the shard were rendered"
+    assert 0 < len(record) < 20
+    assert pd.read_csv(job.attendees, dtype=str).equals(original), \
+        "Sharded run changed the attendee record"
+    assert not os.path.exists(journal_path(job.attendees))
+    assert pd.read_csv(partial_path(job.attendees, 2, 3), dtype=str)["email"] \
+        .tolist() == record["email"].tolist()
+    # bad1@example.com falls in shard 2
+    report = pd.read_csv(failure_report_path(job.attendees, (2, 3)), dtype=str)
+    assert list(report["email"]) == ["bad1@example.com"]
+    assert not os.path.exists(failure_report_path(job.attendees)), \
+        "Shard saved the whole record's failure report"
+
+def test_load_manifest_shared_record(tmp_path):
+    path = write_manifest(tmp_path, "attendees,template,event\n"
+                                    "record.csv,day1.pdf,Day 1\n"
+                                    "./record.csv,day2.pdf,Day 2\n")
+    with pytest.raises(ValueError):
+        load_manifest(path)
+
+def test_run_shared_record(tmp_path):
+    record = str(tmp_path / "record.csv")
+    jobs = [EventJob(record, "day1.pdf", "Day 1", str(tmp_path / "day1")),
+            EventJob(os.path.join(str(tmp_path), ".", "record.csv"), "day2.pdf",
+                     "Day 2", str(tmp_path / "day2"))]
+    with pytest.raises(ValueError):
+        BatchRunner(MailchimpManager()).run(jobs)
+    assert os.listdir(tmp_path) == [], "Journals were opened before the check"
+
+@pytest.mark.parametrize("shard, expected", [
+    (None, "record.failures.csv"),
+    ((2, 4), "record.shard-2-of-4.failures.csv")]
+)
+def test_failure_report_path(shard: tuple, expected: str):
+    assert failure_report_path("record.csv", shard) == expected
+
+def test_merge_failure_reports(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_runner, "load_attendee_record",
+                        lambda path: pd.read_csv(path, dtype=str))
+    monkeypatch.setattr(batch_runner, "save_attendee_record",
+                        lambda path, df: df.to_csv(path, index=False))
+    path = str(tmp_path / "record.csv")
+    # Nobody failed in the second shard, so it saved no report
+    for i, email in ((1, "a@example.com"), (3, "c@example.com")):
+        pd.DataFrame({"email": [email], "failure_stage": ["render"]}
+                     ).to_csv(failure_report_path(path, (i, 3)), index=False)
+
+    report = merge_failure_reports(path, 3)
+    assert list(report["email"]) == ["a@example.com", "c@example.com"]
+    assert report.equals(pd.read_csv(failure_report_path(path), dtype=str)), \
+        "Combined report was not saved"
+
+def test_merge_failure_reports_none(tmp_path):
+    path = str(tmp_path / "record.csv")
+    assert merge_failure_reports(path, 2).empty
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.parametrize("naming", [None, "{fname} {lname}"])
+def test_run_processes(stub_pipeline, tmp_path, naming: str):
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("worker processes only see the stubs when forked")
+    threads, processes = (tmp_path / "threads", tmp_path / "processes")
+    results = {}
+    for folder, use_processes in ((threads, False), (processes, True)):
+        folder.mkdir()
+        jobs = make_jobs(folder, {"small": 3, "large": 12})
+        runner = BatchRunner(FakeMailchimp(), workers=2, chunk_size=5,
+                             naming=naming, processes=use_processes)
+        certs = []
+        results[use_processes] = runner.run(
+            jobs, certFunc=lambda attendee, err: certs.append(
+                (attendee.get_attribute("email"), err is None)))
+        assert sorted(certs) == sorted(
+            (email, not email.startswith("bad"))
+            for job in jobs for email in pd.read_csv(job.attendees)["email"])
+        assert runner.busy_workers == 0
+
+    for event in ("small", "large"):
+        by_threads = results[False][event].fillna("")
+        by_processes = results[True][event].fillna("")
+        for col in ("cert_path", "file_url"):
+            by_threads[col] = by_threads[col].str.replace(str(threads), "")
+            by_processes[col] = by_processes[col].str.replace(str(processes), "")
+        assert by_processes.equals(by_threads), "Processes rendered differently from threads"
+        assert by_processes["file_url"].str.len().gt(0).sum() == \
+            (2 if event == "small" else 11)
+
+def test_run_warms_template_assets(monkeypatch, stub_pipeline, tmp_path):
+    cache = AssetCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(batch_runner, "get_asset_cache", lambda: cache)
+    template = tmp_path / "template.docx"
+    with zipfile.ZipFile(template, "w") as docx:
+        docx.writestr("word/styles.xml", "<w:styles/>")
+    jobs = [job._replace(template=str(template))
+            for job in make_jobs(tmp_path, {"day1": 3, "day2": 3})]
+    # Templates the cache can't read are left to the renderer
+    jobs.append(make_jobs(tmp_path, {"day3": 3})[0])
+
+    results = BatchRunner(FakeMailchimp(), workers=2).run(jobs)
+    assert len(results) == 3
+    assert len(os.listdir(cache.cache_dir)) == 1, "Template styles were not cached"
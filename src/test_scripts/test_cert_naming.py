@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from src.certificate_creator.cert_naming import (assign_cert_names,
+                                                 deduplicate_names,
+                                                 format_names, sanitise_names,
+                                                 MAX_NAME_LENGTH, NAME_COLUMN)
+
+def test_assign_cert_names():
+    attendees = pd.DataFrame({"fname": ["John", "Jane"], "lname": ["Smith", "Doe"]})
+    named = assign_cert_names(attendees)
+
+    assert list(named[NAME_COLUMN]) == ["John Smith", "Jane Doe"]
+    assert NAME_COLUMN not in attendees.columns, "Attendee record was modified"
+
+def test_format_string():
+    attendees = pd.DataFrame({"fname": ["John"], "lname": ["Smith"],
+                              "id": [7]})
+    named = assign_cert_names(attendees, "{lname}, {fname} {id:03d}")
+    assert named[NAME_COLUMN][0] == "Smith, John 007"
+
+def test_format_missing_value():
+    attendees = pd.DataFrame({"fname": ["John"], "lname": [None]})
+    assert format_names(attendees, "{fname} {lname}")[0] == "John "
+
+def test_naming_function():
+    attendees = pd.DataFrame({"email": ["a@example.com", "b@example.com"]})
+    named = assign_cert_names(attendees, lambda df: df["email"].str.upper())
+    assert list(named[NAME_COLUMN]) == ["A@EXAMPLE.COM", "B@EXAMPLE.COM"]
+
+@pytest.mark.parametrize("naming, error", [
+    ("{missing}", KeyError),
+    ("{0}", ValueError),
+    ("{fname!r}", ValueError),
+    (lambda df: df["fname"].iloc[:1], ValueError),
+    (42, TypeError)]
+)
+def test_invalid_naming(naming, error: type):
+    attendees = pd.DataFrame({"fname": ["John", "Jane"]})
+    with pytest.raises(error):
+        assign_cert_names(attendees, naming)
+
+@pytest.mark.parametrize("name, expected", [
+    ('Ann: "The Great"', "Ann_ _The Great_"),
+    ("a/b\\c", "a_b_c"),
+    ("  Ann \t Lee.. ", "Ann Lee"),
+    ("CON", "_CON"),
+    ("nul.txt", "_nul.txt"),
+    ("", "certificate"),
+    (None, "certificate"),
+    ("x" * 200, "x" * MAX_NAME_LENGTH)]
+)
+def test_sanitise_names(name: str, expected: str):
+    assert sanitise_names(pd.Series([name], dtype=object))[0] == expected
+
+@pytest.mark.parametrize("char", ["x", "é", "名", "😀"])
+def test_sanitise_long_names(char: str):
+    name = sanitise_names(pd.Series([char * 300], dtype=object))[0]
+    size = len(name.encode("utf-8"))
+
+    assert MAX_NAME_LENGTH - len(char.encode("utf-8")) < size <= MAX_NAME_LENGTH, \
+        "Name was not cut to MAX_NAME_LENGTH bytes"
+    assert name == char * len(name), "A character was split"
+
+    # Even a heavily duplicated name fits the file system with its extension
+    suffixed = deduplicate_names(pd.Series([name] * 1000)).iloc[-1] + ".pdf"
+    assert len(suffixed.encode("utf-8")) <= 255
+
+def test_deduplicate_names():
+    names = pd.Series(["John Smith", "Jane Doe", "john smith", "John Smith"])
+    assert list(deduplicate_names(names)) == \
+        ["John Smith", "Jane Doe", "john smith (2)", "John Smith (3)"]
+
+def test_deduplicate_suffix_clash():
+    names = pd.Series(["Ann (2)", "Ann", "Ann"])
+    unique = deduplicate_names(names)
+
+    assert list(unique) == ["Ann (2)", "Ann", "Ann (2) (2)"]
+    assert not unique.str.casefold().duplicated().any(), "Names are not unique"
+
+def test_unique_names_unchanged():
+    names = pd.Series(["Ann", "Bob"], index=[5, 9])
+    assert deduplicate_names(names).equals(names)
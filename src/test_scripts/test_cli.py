@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+import certificate_automator
+import src.cli.cli as cli
+from src.batch.batch_runner import EventJob
+
+class FakeRunner:
+    """Stands in for ``BatchRunner``, recording how it was made and run."""
+
+    def __init__(self, mailchimp, workers=None, **kwargs):
+        self.workers = workers
+        self.kwargs = kwargs
+        self.jobs = None
+        runners.append(self)
+
+    def run(self, jobs, *funcs):
+        self.jobs = jobs
+        return {}
+
+class FakeSMTP:
+    """Stands in for ``SMTPManager``."""
+
+    def __init__(self, *args):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+runners = []
+
+@pytest.fixture
+def fake_batch(monkeypatch) -> list:
+    runners.clear()
+    monkeypatch.setattr(cli, "BatchRunner", FakeRunner)
+    monkeypatch.setattr(cli, "SMTPManager", FakeSMTP)
+    return runners
+
+def test_run_batch_cli_single_event(tmp_path, fake_batch: list):
+    attendees = str(tmp_path / "day1.csv")
+    cli.run_batch_cli({"manifest": None, "attendees": attendees,
+                       "template": "template.docx", "event": None,
+                       "shard": (2, 3), "smtp_host": "localhost",
+                       "sender": "certs@example.com", "smtp_port": 25,
+                       "no_cache": True})
+
+    runner, = fake_batch
+    assert runner.jobs == [EventJob(attendees, "template.docx", "day1",
+                                    os.path.join(str(tmp_path), "day1"))], \
+        "Single event was not run as a batch of one"
+    assert runner.kwargs["shard"] == (2, 3)
+    assert runner.kwargs["smtp"].closed, "SMTP connection was not closed"
+
+@pytest.mark.parametrize("args, expected", [
+    (["--attendees", "a.csv", "--template", "t.docx", "--server-key", "us1",
+      "--api-key", "key", "--list-id", "list1"], "run_cli"),
+    (["--manifest", "events.csv", "--server-key", "us1", "--api-key", "key",
+      "--list-id", "list1"], "run_batch_cli"),
+    (["--attendees", "a.csv", "--template", "t.docx", "--server-key", "us1",
+      "--api-key", "key", "--list-id", "list1", "--shard", "1/2"], "run_batch_cli"),
+    (["--attendees", "a.csv", "--template", "t.docx", "--smtp-host", "localhost",
+      "--sender", "certs@example.com"], "run_batch_cli"),
+    (["--attendees", "a.csv", "--template", "t.docx", "--shard", "1/2",
+      "--estimate"], "run_estimate_cli"),
+    (["--attendees", "a.csv", "--template", "t.docx", "--proof"], "run_proof_cli")]
+)
+def test_main_dispatch(monkeypatch, args: list, expected: str):
+    called = []
+    for name in ("run_cli", "run_batch_cli", "run_estimate_cli", "run_proof_cli"):
+        monkeypatch.setattr(cli, name, lambda argv, name=name: called.append(name))
+    monkeypatch.setattr(sys, "argv", ["certificate_automator.py"] + args)
+
+    certificate_automator.main()
+    assert called == [expected]
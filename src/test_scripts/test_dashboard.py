@@ -0,0 +1,113 @@
+import pytest
+
+import src.cli.dashboard as dashboard
+from src.batch.retry_queue import Failure, PERMANENT
+from src.cli.dashboard import Dashboard
+
+@pytest.fixture
+def clock(monkeypatch) -> list:
+    """Replace the dashboard's clock with one set through ``clock[0]``."""
+    now = [0.0]
+    monkeypatch.setattr(dashboard.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.mark.parametrize("kwargs", [{"max_fps": 0}, {"window": -1}])
+def test_invalid_arguments(kwargs: dict):
+    with pytest.raises(ValueError):
+        Dashboard(**kwargs)
+
+def test_snapshot(clock: list):
+    board = Dashboard(max_errors=2)
+    board.cert_status(None, None)
+    board.cert_status(None, None)
+    board.cert_status(None, ValueError("missing fname"))
+    board.batch_status("finished", 3, 1)
+    board.rate_status(9.5, 4)
+    board.event_status("day1", "queued", 0, 4)
+    board.event_status("day1", "render", 2, 4)
+    board.event_status("day2", "render", 1, 3)
+    board.event_status("day1", "chunk", 1, 4)
+    board.error("day1: upload retrying 2 attendees: TimeoutError: ")
+    board.watch("workers", lambda: (1, 2))
+
+    snap = board._snapshot()
+    assert snap["certs"] == (2, 1)
+    assert snap["batch"] == ("finished", 3, 1)
+    assert snap["rate"] == (9.5, 4)
+    assert snap["events"] == {"day1": ("chunk", 1, 4), "day2": ("queued", 0, 3)}, \
+        "Pipeline stages changed the event stage"
+    assert snap["stages"] == {"render": 3}, "Stage counts were not summed over events"
+    assert snap["errors"] == ["certificate: ValueError: missing fname",
+                              "day1: upload retrying 2 attendees: TimeoutError: "]
+    assert snap["probes"]["workers"]() == (1, 2)
+
+    # The snapshot is a copy
+    board.error("later")
+    assert len(snap["errors"]) == 2 and snap["errors"][-1] != "later"
+
+def test_snapshot_rates(clock: list):
+    board = Dashboard(window=10)
+    board.event_status("day1", "queued", 0, 10)
+    board._snapshot()
+
+    clock[0] = 4.0
+    for _ in range(8):
+        board.cert_status(None, None)
+    board.event_status("day1", "chunk", 2, 10)
+    snap = board._snapshot()
+    assert snap["elapsed"] == 4.0
+    assert snap["cert_speed"] == 2.0
+    assert snap["chunk_speed"] == 0.5
+
+    # Samples older than the window are dropped
+    clock[0] = 20.0
+    board._snapshot()
+    clock[0] = 24.0
+    snap = board._snapshot()
+    assert snap["cert_speed"] == 0.0, "Rate was not averaged over the window only"
+
+def test_failure_status():
+    board = Dashboard()
+    board.failure_status(Failure("day1", "a@example.com", "upload", PERMANENT,
+                                 "HTTP 400", 1))
+    board.failure_status(Failure("day1", "b@example.com", "render", PERMANENT,
+                                 "KeyError: 'fname'", 1))
+
+    assert board._snapshot()["errors"] == ["day1: upload a@example.com: HTTP 400"], \
+        "Render failure was shown twice"
+
+def snapshot(events: dict, stages: dict = None, chunk_speed: float = 0.0) -> dict:
+    return {"events": events, "stages": stages or {}, "chunk_speed": chunk_speed}
+
+def test_event_lines_empty():
+    assert Dashboard()._event_lines(snapshot({})) == []
+
+def test_event_lines():
+    lines = Dashboard()._event_lines(snapshot(
+        {"a very long event name": ("chunk", 1, 4), "day2": ("queued", 0, 2)},
+        {"render": 3}, chunk_speed=0.5))
+
+    assert lines == ["",
+                     f"{'render':<13} {dashboard._bar(3, 6)} 3/6",
+                     "",
+                     f"a very long e {dashboard._bar(1, 4)} 1/4 chunk",
+                     f"day2          {dashboard._bar(0, 2)} 0/2 queued",
+                     "ETA           0:00:10"], "Event names were not cut to fit"
+
+@pytest.mark.parametrize("events, chunk_speed, eta", [
+    ({"day1": ("chunk", 1, 2)}, 0.0, "--"),
+    ({"day1": ("done", 2, 2)}, 0.0, "done"),
+    ({"day1": ("done", 2, 2)}, 1.0, "done")]
+)
+def test_event_lines_eta(events: dict, chunk_speed: float, eta: str):
+    lines = Dashboard()._event_lines(snapshot(events, chunk_speed=chunk_speed))
+    assert lines[-1] == f"{'ETA':<13} {eta}"
+
+@pytest.mark.parametrize("done, total, expected", [
+    (0, 4, "[....]"),
+    (2, 4, "[##..]"),
+    (4, 4, "[####]"),
+    (0, 0, "[....]")]
+)
+def test_bar(done: int, total: int, expected: str):
+    assert dashboard._bar(done, total, width=4) == expected
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from src.utils.disk_cache import cache_entries, default_cache_dir, evict_lru
+
+def write_entry(folder, name: str, size: int, used: int) -> str:
+    path = folder / name
+    path.write_bytes(b"x" * size)
+    os.utime(path, ns=(used, used))
+    return str(path)
+
+def test_default_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert default_cache_dir("assets") == \
+        os.path.join(str(tmp_path), "certificate_automator", "assets")
+
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert default_cache_dir().endswith(
+        os.path.join(".cache", "certificate_automator", "records"))
+
+def test_cache_entries(tmp_path):
+    assert cache_entries(str(tmp_path / "missing"), ".bin") == []
+
+    entry = write_entry(tmp_path, "a.bin", 1, 0)
+    write_entry(tmp_path, "a.bin.123.tmp", 1, 0)
+    assert cache_entries(str(tmp_path), ".bin") == [entry]
+
+@pytest.mark.parametrize("max_bytes, kept", [
+    (30, ["new.bin", "newer.bin", "old.bin"]),
+    (25, ["new.bin", "newer.bin"]),
+    (10, ["newer.bin"]),
+    (0, [])]
+)
+def test_evict_lru(tmp_path, max_bytes: int, kept: list):
+    write_entry(tmp_path, "old.bin", 10, 1_000)
+    write_entry(tmp_path, "new.bin", 10, 2_000)
+    write_entry(tmp_path, "newer.bin", 10, 3_000)
+    write_entry(tmp_path, "other.feather", 100, 0)
+
+    evict_lru(str(tmp_path), ".bin", max_bytes)
+    assert sorted(os.listdir(tmp_path)) == sorted(kept + ["other.feather"]), \
+        "Wrong entries were evicted"
+
+def test_evict_lru_missing(tmp_path):
+    evict_lru(str(tmp_path / "missing"), ".bin", 0)
@@ -0,0 +1,13 @@
+import pytest
+
+from src.utils.formatting import format_duration
+
+@pytest.mark.parametrize("seconds, expected", [
+    (0, "0:00:00"),
+    (59.9, "0:00:59"),
+    (61, "0:01:01"),
+    (3723, "1:02:03"),
+    (90000, "25:00:00")]
+)
+def test_format_duration(seconds: float, expected: str):
+    assert format_duration(seconds) == expected
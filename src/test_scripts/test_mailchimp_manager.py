@@ -0,0 +1,259 @@
+import hashlib
+import json
+
+import pytest
+from requests import ConnectionError as RequestsConnectionError, HTTPError
+
+import src.mailchimp.mailchimp_manager as mailchimp_manager
+from src.mailchimp.mailchimp_manager import MailchimpManager
+from src.mailchimp.rate_limiter import RateLimiter
+
+class FakeResponse:
+    """Stands in for ``requests.Response``."""
+
+    def __init__(self, status_code: int = 200, body: dict = None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.request = None
+        self._body = body or {}
+
+    def json(self) -> dict:
+        return self._body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise HTTPError(f"HTTP {self.status_code}")
+
+class StubAttendee:
+    """Stands in for ``Attendee``, holding attributes in a dict."""
+
+    def __init__(self, **attributes):
+        self._attributes = attributes
+
+    def get_attribute(self, attribute: str):
+        return self._attributes[attribute]
+
+    def has_attribute(self, attribute: str) -> bool:
+        return attribute in self._attributes
+
+class FakeAudience:
+    """
+    Stands in for ``MailchimpManager._request`` against one audience.
+
+    Bulk upserts fail outright with ``bulk_status`` if it is set, and
+    members in ``errors`` are rejected by them with that error code.
+    """
+
+    def __init__(self, members: dict, bulk_status: int = None, errors: dict = None):
+        self.members = dict(members)
+        self.bulk_status = bulk_status
+        self.errors = errors or {}
+        self.calls = []
+
+    def request(self, method: str, path: str, **kwargs) -> FakeResponse:
+        self.calls.append((method, path, kwargs))
+
+        if method == "GET" and path == "/lists/list1/members":
+            params = kwargs["params"]
+            emails = sorted(self.members)[params["offset"]:
+                                          params["offset"] + params["count"]]
+            return FakeResponse(200, {"total_items": len(self.members), "members": [
+                {"email_address": email, "merge_fields": {"CERT_URL": self.members[email]}}
+                for email in emails]})
+
+        if method == "POST" and path == "/lists/list1":
+            if self.bulk_status is not None:
+                return FakeResponse(self.bulk_status)
+            errors = [{"email_address": member["email_address"], "error": "rejected",
+                       "error_code": self.errors[member["email_address"]]}
+                      for member in kwargs["json"]["members"]
+                      if member["email_address"] in self.errors]
+            return FakeResponse(200, {"error_count": len(errors), "errors": errors})
+
+        if method == "POST" and path == "/batches":
+            return FakeResponse(200, {"id": "batch1"})
+
+        return FakeResponse(404)
+
+    def upserted(self) -> list:
+        """Get the members sent in each bulk upsert."""
+        return [[member["email_address"] for member in kwargs["json"]["members"]]
+                for method, path, kwargs in self.calls
+                if (method, path) == ("POST", "/lists/list1")]
+
+    def fetches(self) -> int:
+        return sum(method == "GET" for method, _, _ in self.calls)
+
+class FakePoller:
+    """Stands in for ``BatchPoller``, finishing every batch straight away."""
+
+    def __init__(self):
+        self.waited = []
+
+    def wait(self, batch_ids, status_func=None, successful=0, failed=0) -> dict:
+        self.waited.extend(batch_ids)
+        return {batch_id: {"response_body_url": f"https://example.com/{batch_id}.tar.gz"}
+                for batch_id in batch_ids}
+
+@pytest.fixture
+def manager() -> MailchimpManager:
+    manager = MailchimpManager()
+    manager._base_url = "https://us1.api.mailchimp.com/3.0"
+    # Fast enough that tests don't wait on the token bucket
+    manager._limiter = RateLimiter(rate=1000, max_rate=1000)
+    return manager
+
+@pytest.fixture
+def audience(manager: MailchimpManager) -> FakeAudience:
+    audience = FakeAudience({"a@example.com": "https://example.com/a.pdf",
+                             "b@example.com": "https://example.com/old.pdf",
+                             "c@example.com": None})
+    manager._request = audience.request
+    manager._poller = FakePoller()
+    manager.set_list("list1")
+    return audience
+
+def attendees(*urls: tuple) -> list:
+    return [StubAttendee(email=email, file_url=url) for email, url in urls]
+
+def test_request_unauthorised():
+    with pytest.raises(RuntimeError):
+        MailchimpManager().ping()
+
+def test_request_releases_slot(manager: MailchimpManager):
+    manager._session.request = lambda method, url, **kwargs: FakeResponse(200)
+
+    assert manager.ping().status_code == 200
+    assert manager.rate_limiter.in_flight == 0
+
+@pytest.mark.parametrize("err", [
+    RequestsConnectionError("Connection refused"),
+    TypeError("Object of type set is not JSON serializable"),
+    KeyboardInterrupt()]
+)
+def test_request_error_releases_slot(manager: MailchimpManager,
+                                     err: BaseException):
+    def fail(method, url, **kwargs):
+        raise err
+    manager._session.request = fail
+
+    # More failures than the limit would block forever if slots leaked
+    for _ in range(manager.rate_limiter.max_limit + 1):
+        with pytest.raises(type(err)):
+            manager.ping()
+
+    assert manager.rate_limiter.in_flight == 0, "Failed requests kept their slots"
+
+def test_throttled_request_retried(manager: MailchimpManager):
+    statuses = iter([429, 429, 200])
+    manager._session.request = \
+        lambda method, url, **kwargs: FakeResponse(next(statuses))
+
+    assert manager.ping().status_code == 200
+    assert manager.rate_limiter.in_flight == 0
+
+def test_update_without_list(manager: MailchimpManager):
+    with pytest.raises(RuntimeError):
+        manager.update_contact_files([])
+
+def test_update_skips_unchanged(manager: MailchimpManager, audience: FakeAudience):
+    statuses = []
+    people = attendees(("a@example.com", "https://example.com/a.pdf"),
+                       ("B@Example.com", "https://example.com/b.pdf"),
+                       ("c@example.com", None)) + [StubAttendee(email="d@example.com")]
+
+    assert manager.update_contact_files(
+        people, lambda *status: statuses.append(status)) == ([], None)
+    assert audience.upserted() == [["B@Example.com"]], \
+        "Unchanged contacts or contacts without URLs were sent"
+    assert statuses[-1] == ("finished", 1, 0)
+
+    # The upserted URL is remembered, so nothing is sent again
+    assert manager.update_contact_files(people) == ([], None)
+    assert audience.upserted() == [["B@Example.com"]]
+    assert audience.fetches() == 1, "Audience was fetched more than once"
+
+def test_update_chunks(monkeypatch, manager: MailchimpManager, audience: FakeAudience):
+    monkeypatch.setattr(mailchimp_manager, "BULK_MEMBER_LIMIT", 2)
+    monkeypatch.setattr(mailchimp_manager, "MEMBER_PAGE_SIZE", 2)
+    audience.members.update({f"{name}@example.com": None for name in "defg"})
+
+    manager.update_contact_files(attendees(
+        *((f"{name}@example.com", f"https://example.com/{name}.pdf") for name in "bcdef")))
+    assert audience.upserted() == [["b@example.com", "c@example.com"],
+                                   ["d@example.com", "e@example.com"],
+                                   ["f@example.com"]]
+    assert audience.fetches() == 4, "Audience was not fetched a page at a time"
+
+def test_update_not_a_member(manager: MailchimpManager, audience: FakeAudience):
+    rejected, url = manager.update_contact_files(
+        attendees(("new@example.com", "https://example.com/new.pdf")))
+
+    assert url is None
+    assert rejected == [{"email_address": "new@example.com",
+                         "error": "not a member of the audience",
+                         "error_code": "NOT_A_MEMBER"}]
+    assert audience.upserted() == [], "Non-member was added to the audience"
+
+def test_update_new_member_status(manager: MailchimpManager, audience: FakeAudience):
+    manager.set_list("list1", new_member_status="transactional")
+    assert manager.update_contact_files(
+        attendees(("new@example.com", "https://example.com/new.pdf"))) == ([], None)
+
+    (_, _, kwargs), = [call for call in audience.calls if call[0] == "POST"]
+    assert kwargs["json"]["members"] == [{
+        "email_address": "new@example.com",
+        "merge_fields": {"CERT_URL": "https://example.com/new.pdf"},
+        "status_if_new": "transactional"}]
+
+def test_update_rejected(manager: MailchimpManager, audience: FakeAudience):
+    audience.errors = {"b@example.com": "ERROR_GENERIC"}
+    statuses = []
+    people = attendees(("b@example.com", "https://example.com/b.pdf"),
+                       ("c@example.com", "https://example.com/c.pdf"))
+
+    rejected, url = manager.update_contact_files(
+        people, lambda *status: statuses.append(status))
+    assert url is None
+    assert [(entry["email_address"], entry["error_code"]) for entry in rejected] == \
+        [("b@example.com", "ERROR_GENERIC")]
+    assert statuses[-1] == ("finished", 1, 1)
+
+    # Only the rejected contact is sent again
+    manager.update_contact_files(people)
+    assert audience.upserted()[-1] == ["b@example.com"]
+
+def test_update_batch_fallback(manager: MailchimpManager, audience: FakeAudience):
+    audience.bulk_status = 500
+    people = attendees(("b@example.com", "https://example.com/b.pdf"))
+
+    rejected, url = manager.update_contact_files(people)
+    assert rejected == []
+    assert url == "https://example.com/batch1.tar.gz"
+    assert manager._poller.waited == ["batch1"], "Batch was not waited on"
+
+    (_, _, kwargs), = [call for call in audience.calls if call[1] == "/batches"]
+    operation, = kwargs["json"]["operations"]
+    assert operation["method"] == "PUT"
+    assert operation["path"] == \
+        "/lists/list1/members/" + hashlib.md5(b"b@example.com").hexdigest()
+    assert operation["operation_id"] == "b@example.com"
+    assert json.loads(operation["body"])["merge_fields"] == \
+        {"CERT_URL": "https://example.com/b.pdf"}
+
+    # Batch results are per operation, so the audience is fetched again
+    manager.update_contact_files(people)
+    assert audience.fetches() == 2
+
+def test_update_batch_rejected(manager: MailchimpManager, audience: FakeAudience):
+    audience.bulk_status = 500
+
+    def reject_batches(method, path, **kwargs):
+        if path == "/batches":
+            return FakeResponse(400)
+        return FakeAudience.request(audience, method, path, **kwargs)
+    manager._request = reject_batches
+
+    with pytest.raises(HTTPError):
+        manager.update_contact_files(
+            attendees(("b@example.com", "https://example.com/b.pdf")))
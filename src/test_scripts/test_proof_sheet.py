@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import src.certificate_creator.proof_sheet as proof_sheet
+from src.certificate_creator.proof_sheet import createProofSheet, sample_attendees
+
+@pytest.fixture
+def attendees() -> pd.DataFrame:
+    return pd.DataFrame({
+        "fname": ["Al", "Bartholomew", "Zoë", "Cat", "Dan", "Eve", "Flo", None],
+        "lname": ["Li", "Montgomery-Smythe", "Bjørnsdóttir", "Roe", "Ray", "Lee",
+                  "Kay", "Wu"],
+        "email": [f"person{i}@example.com" for i in range(8)]})
+
+def test_sample(attendees: pd.DataFrame):
+    sample = sample_attendees(attendees, per_group=1, random_count=2)
+    picked = list(sample.index)
+
+    assert picked[:3] == [1, 2, 7], "Longest, non-ASCII, then shortest names were not picked"
+    assert len(picked) == 5 and len(set(picked)) == 5, "An attendee was picked twice"
+    assert picked == list(sample_attendees(attendees, per_group=1, random_count=2).index), \
+        "Same seed gave a different sample"
+
+def test_sample_small_record(attendees: pd.DataFrame):
+    sample = sample_attendees(attendees.head(2))
+    assert sorted(sample.index) == [0, 1]
+
+@pytest.mark.parametrize("record", [
+    pd.DataFrame(columns=["fname", "lname", "email"]),
+    pd.DataFrame({"fname": ["Al"], "lname": ["Li"], "email": ["a@example.com"]}).iloc[:0]]
+)
+def test_sample_empty(record: pd.DataFrame):
+    sample = sample_attendees(record)
+    assert sample.empty
+    assert list(sample.columns) == ["fname", "lname", "email"]
+
+def test_sample_missing_column(attendees: pd.DataFrame):
+    with pytest.raises(KeyError):
+        sample_attendees(attendees.drop(columns="lname"))
+
+    with pytest.raises(KeyError):
+        sample_attendees(pd.DataFrame(columns=["fname", "email"]))
+
+@pytest.mark.parametrize("kwargs", [{"per_group": -1}, {"random_count": -1}])
+def test_sample_invalid(attendees: pd.DataFrame, kwargs: dict):
+    with pytest.raises(ValueError):
+        sample_attendees(attendees, **kwargs)
+
+def test_proof_sheet_empty(monkeypatch, tmp_path):
+    def render(*args):
+        raise AssertionError("Empty record was rendered")
+    monkeypatch.setattr(proof_sheet, "createCertificate", render)
+
+    with pytest.raises(ValueError):
+        createProofSheet("template.docx", str(tmp_path / "proof.pdf"),
+                         pd.DataFrame(columns=["fname", "lname", "email"]))
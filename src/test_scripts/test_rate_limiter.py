@@ -0,0 +1,86 @@
+import pytest
+
+from src.mailchimp.rate_limiter import RateLimiter
+
+@pytest.fixture
+def statuses() -> list:
+    return []
+
+@pytest.fixture
+def limiter(statuses: list) -> RateLimiter:
+    return RateLimiter(rate=20.0, limit=4, max_rate=50.0, target_latency=1.0,
+                       increase=1.0, decrease=0.5,
+                       status_func=lambda rate, limit: statuses.append((rate, limit)))
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+    with pytest.raises(ValueError):
+        RateLimiter(min_rate=10, max_rate=5)
+
+    with pytest.raises(ValueError):
+        RateLimiter(decrease=1)
+
+def test_acquire_release(limiter: RateLimiter):
+    limiter.acquire()
+    assert limiter.in_flight == 1
+    limiter.release(200)
+    assert limiter.in_flight == 0
+
+def test_additive_increase(limiter: RateLimiter, statuses: list):
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(200, latency=0.1)
+
+    assert limiter.rate == 24.0, "Rate did not grow by increase per good request"
+    assert limiter.limit == 5, "Limit did not grow after a limit's worth of requests"
+    assert statuses[-1] == (24.0, 5)
+
+def test_rate_capped(limiter: RateLimiter):
+    for _ in range(100):
+        limiter.release(200)
+
+    assert limiter.rate == limiter.max_rate
+    assert limiter.limit == limiter.max_limit
+
+@pytest.mark.parametrize("status_code, latency", [
+    (429, 0.1),
+    (200, 5.0)]
+)
+def test_multiplicative_decrease(limiter: RateLimiter, status_code: int,
+                                 latency: float):
+    limiter.acquire()
+    limiter.release(status_code, latency=latency)
+
+    assert limiter.rate == 10.0, "Rate was not halved on congestion"
+    assert limiter.limit == 2, "Limit was not halved on congestion"
+
+def test_one_decrease_per_window(limiter: RateLimiter):
+    # Requests in flight together all see the same congestion
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release(429, latency=0.5)
+
+    assert limiter.rate == 10.0, "Concurrent 429s cut the rate more than once"
+    assert limiter.limit == 2
+
+    # A request sent after the cut may cut again
+    limiter.release(429, latency=0.0)
+    assert limiter.rate == 5.0
+
+def test_large_body_latency_ignored(limiter: RateLimiter):
+    limiter.release(200, latency=5.0, size=limiter.large_body + 1)
+    assert limiter.rate == 21.0, "Slow large upload counted as congestion"
+
+    limiter.release(429, latency=5.0, size=limiter.large_body + 1)
+    assert limiter.rate == 10.5, "429 on a large upload was not backed off"
+
+def test_failed_request_unchanged(limiter: RateLimiter, statuses: list):
+    limiter.release(None)
+    limiter.release(503)
+
+    assert limiter.rate == 20.0
+    assert limiter.limit == 4
+    assert statuses == [], "Status reported without a change"
@@ -0,0 +1,127 @@
+import json
+import smtplib
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from src.batch.retry_queue import classify, RetryQueue, PERMANENT, TRANSIENT
+
+@pytest.mark.parametrize("status_code, kind", [
+    (429, TRANSIENT),
+    (500, TRANSIENT),
+    (503, TRANSIENT),
+    (400, PERMANENT),
+    (404, PERMANENT)]
+)
+def test_classify_status_code(status_code: int, kind: str):
+    assert classify(status_code=status_code) == kind, \
+        f"HTTP {status_code} was not {kind}"
+
+@pytest.mark.parametrize("err, kind", [
+    (smtplib.SMTPDataError(451, b"Try again later"), TRANSIENT),
+    (smtplib.SMTPDataError(554, b"Rejected"), PERMANENT),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"Greylisted")}), TRANSIENT),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")}), PERMANENT),
+    (smtplib.SMTPServerDisconnected("Connection lost"), TRANSIENT),
+    (ConnectionError("Reset by peer"), TRANSIENT),
+    (TimeoutError(), TRANSIENT),
+    (BrokenProcessPool(), TRANSIENT),
+    (KeyError("fname"), PERMANENT)]
+)
+def test_classify_error(err: Exception, kind: str):
+    assert classify(err) == kind, f"{err!r} was not {kind}"
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        RetryQueue(max_attempts=0)
+
+    with pytest.raises(ValueError):
+        RetryQueue(base_delay=-1)
+
+def test_transient_is_queued():
+    retries = RetryQueue(base_delay=0, seed=1)
+    assert retries.add("chunk", "event", ["a@example.com"], "upload",
+                       status_code=503), "Transient failure was not queued"
+    assert len(retries) == 1
+    assert retries.pop_due() == [("chunk", 2)], "Due item or attempt is wrong"
+    assert len(retries) == 0
+    assert retries.time_until_next() is None
+    assert retries.failures == [], "Queued failure was logged"
+
+def test_backoff_waits():
+    retries = RetryQueue(base_delay=100, max_delay=100, seed=1)
+    retries.add("chunk", "event", ["a@example.com"], "upload", status_code=429)
+
+    assert retries.pop_due() == [], "Item was due before its backoff passed"
+    assert 0 <= retries.time_until_next() <= 100, "Backoff exceeded max_delay"
+
+def test_permanent_is_logged():
+    retries = RetryQueue()
+    assert not retries.add("chunk", "event", ["a@example.com"], "render",
+                           err=KeyError("fname")), "Permanent failure was queued"
+    assert len(retries) == 0
+
+    failure, = retries.failures
+    assert failure.attendee_id == "a@example.com"
+    assert failure.stage == "render"
+    assert failure.kind == PERMANENT
+    assert failure.reason.startswith("KeyError")
+
+def test_max_attempts():
+    retries = RetryQueue(max_attempts=3, base_delay=0)
+    assert retries.add("chunk", "event", ["a@example.com"], "upload",
+                       status_code=503, attempts=2)
+    assert not retries.add("chunk", "event", ["a@example.com"], "upload",
+                           status_code=503, attempts=3), \
+        "Work was queued after its last attempt"
+
+    failure, = retries.failures
+    assert failure.kind == TRANSIENT
+    assert failure.attempts == 3
+
+def test_add_batch_responses():
+    retries = RetryQueue()
+    responses = [json.dumps({"operation_id": "a@example.com", "status_code": 200}),
+                 json.dumps({"operation_id": "b@example.com", "status_code": 429}),
+                 json.dumps({"operation_id": "c@example.com", "status_code": 400})]
+
+    transient, permanent = retries.add_batch_responses("event", responses)
+    assert transient == ["b@example.com"]
+    assert permanent == ["c@example.com"]
+    assert [f.attendee_id for f in retries.failures] == ["c@example.com"], \
+        "Only permanent failures should be logged"
+
+def test_report():
+    attendees = pd.DataFrame({"fname": ["Ann", "Bob", "Cat"],
+                              "email": ["Ann@Example.com", "bob@example.com",
+                                        "cat@example.com"]})
+    retries = RetryQueue()
+    retries.log("event", ["ann@example.com"], "upload", status_code=400)
+    retries.log("event", ["zed@example.com"], "mailchimp", status_code=404)
+    retries.log("other", ["bob@example.com"], "upload", status_code=400)
+
+    report = retries.report(attendees, "event")
+    assert list(report["email"]) == ["Ann@Example.com", "zed@example.com"], \
+        "Report should match IDs ignoring case and keep unmatched IDs"
+    assert report.iloc[0]["fname"] == "Ann"
+    assert pd.isna(report.iloc[1]["fname"])
+    assert list(report["failure_stage"]) == ["upload", "mailchimp"]
+    assert list(report["failure_reason"]) == ["HTTP 400", "HTTP 404"]
+
+def test_report_empty():
+    attendees = pd.DataFrame({"email": ["a@example.com"]})
+    assert RetryQueue().report(attendees, "event").empty
+
+def test_failure_func():
+    failures = []
+    queue = RetryQueue(max_attempts=2, failureFunc=failures.append)
+
+    assert queue.add("item", "day1", ["a@example.com"], "upload", TimeoutError())
+    assert failures == [], "Work queued for a retry was reported as a failure"
+
+    queue.add("item", "day1", ["a@example.com"], "upload", TimeoutError(), attempts=2)
+    queue.log("day1", ["b@example.com", "c@example.com"], "render", KeyError("fname"))
+    assert failures == queue.failures
+    assert [failure.attendee_id for failure in failures] == \
+        ["a@example.com", "b@example.com", "c@example.com"]
@@ -0,0 +1,171 @@
+import math
+import os
+
+import pandas as pd
+import pytest
+
+import src.batch.run_estimator as run_estimator
+from src.attendees.attendee_journal import journal_path
+from src.batch.batch_runner import EventJob
+from src.batch.run_estimator import (estimate_run, format_estimate,
+                                     pending_count, scan_record)
+
+CERT_BYTES = 3000
+
+class StubAttendee:
+    """Stands in for ``Attendee``, holding attributes in a dict."""
+
+    def __init__(self, attributes: dict):
+        self._attributes = dict(attributes)
+
+    def get_attribute(self, attribute: str):
+        return self._attributes[attribute]
+
+    def has_attribute(self, attribute: str) -> bool:
+        return attribute in self._attributes
+
+    def set_attribute(self, attribute: str, value):
+        self._attributes[attribute] = value
+
+def fake_create_certificate(in_path, out_dir, attendees, *args):
+    for attendee in attendees:
+        path = os.path.join(out_dir, attendee.get_attribute("email") + ".pdf")
+        with open(path, "wb") as file:
+            file.write(b"%" * CERT_BYTES)
+        attendee.set_attribute("cert_path", path)
+    return attendees
+
+@pytest.fixture
+def stub_renderer(monkeypatch):
+    monkeypatch.setattr(run_estimator, "pandas2manager",
+                        lambda df: [StubAttendee(row) for row in df.to_dict("records")])
+    monkeypatch.setattr(run_estimator, "createCertificate", fake_create_certificate)
+
+def write_record(path: str, count: int) -> str:
+    pd.DataFrame({"fname": [f"Name{i}" for i in range(count)],
+                  "lname": ["Lee"] * count,
+                  "email": [f"person{i}@example.com" for i in range(count)]}
+                 ).to_csv(path, index=False)
+    return str(path)
+
+def write_journal(record: str, statuses: dict):
+    pd.DataFrame({"id": list(statuses), "cert_path": None, "file_url": None,
+                  "status": list(statuses.values())}
+                 ).to_csv(journal_path(record), index=False)
+
+@pytest.mark.parametrize("contents, rows", [
+    (b"fname,lname,email\r\nAnn,Lee,a@example.com\r\nBob,Ray,b@example.com\r\n", 2),
+    (b"fname,lname,email\nAnn,Lee,a@example.com\nBob,Ray,b@example.com", 2),
+    (b"fname,lname,email\n", 0),
+    (b"fname,lname,email", 0)]
+)
+def test_scan_record(tmp_path, contents: bytes, rows: int):
+    path = tmp_path / "record.csv"
+    path.write_bytes(contents)
+    assert scan_record(str(path)) == (["fname", "lname", "email"], rows)
+
+def test_scan_record_bom(tmp_path):
+    path = tmp_path / "record.csv"
+    path.write_bytes(b"\xef\xbb\xbffname,\"last name\",email\nAnn,Lee,a@example.com\n")
+    assert scan_record(str(path)) == (["fname", "last name", "email"], 1), \
+        "Byte order mark was read as part of the first column"
+
+def test_scan_record_empty(tmp_path):
+    path = tmp_path / "record.csv"
+    path.write_bytes(b"")
+    assert scan_record(str(path)) == ([], 0)
+
+def test_scan_record_missing(tmp_path):
+    with pytest.raises(OSError):
+        scan_record(str(tmp_path / "missing.csv"))
+
+def test_pending_count_without_journal(tmp_path):
+    record = write_record(tmp_path / "record.csv", 5)
+    assert pending_count(record, 5) == 5
+
+def test_pending_count_skips_completed(tmp_path):
+    record = write_record(tmp_path / "record.csv", 5)
+    # Later rows override earlier ones, as when a failure is retried
+    write_journal(record, {"person0@example.com": "ok",
+                           "person1@example.com": "failed"})
+    with open(journal_path(record), "a") as file:
+        file.write("person1@example.com,,,ok\nperson2@example.com,,,failed\n")
+
+    assert pending_count(record, 5) == 3
+
+def test_pending_count_empty_journal(tmp_path):
+    record = write_record(tmp_path / "record.csv", 5)
+    open(journal_path(record), "w").close()
+    assert pending_count(record, 5) == 5
+
+def test_estimate_run(tmp_path, stub_renderer):
+    template = str(tmp_path / "template.docx")
+    jobs = [EventJob(write_record(tmp_path / "big.csv", 250), template, "big",
+                     str(tmp_path / "big")),
+            EventJob(write_record(tmp_path / "small.csv", 30), template,
+                     "small", str(tmp_path / "small"))]
+    write_journal(jobs[1].attendees, {"person0@example.com": "ok"})
+
+    estimate = estimate_run(jobs, workers=2, chunk_size=100)
+    assert estimate.events == 2
+    assert estimate.attendees == 280
+    assert estimate.pending == 279, "Journalled attendees were not skipped"
+    assert estimate.cert_bytes == CERT_BYTES
+    assert estimate.upload_bytes == math.ceil(279 * CERT_BYTES * 4 / 3)
+    assert estimate.batches == 4, "Expected 3 chunks for big and 1 for small"
+    # Ping, one page of members, two folders, then four requests per batch
+    assert estimate.api_calls == 1 + 1 + 2 + 4 * 4
+    assert estimate.emails == 0
+    assert estimate.workers == 2
+    assert 1 <= estimate.best_workers <= 4
+    assert estimate.wall_seconds > 0
+
+    lines = format_estimate(estimate)
+    assert "279 to process" in lines
+    assert "batches         4" in lines
+
+def test_estimate_run_smtp(tmp_path, stub_renderer):
+    job = EventJob(write_record(tmp_path / "record.csv", 40),
+                   str(tmp_path / "template.docx"), "record", str(tmp_path))
+    estimate = estimate_run([job], smtp=True)
+
+    assert estimate.emails == 40
+    assert estimate.api_calls == estimate.batches == 0
+    assert "emails          40" in format_estimate(estimate)
+
+def test_estimate_run_shard(tmp_path, stub_renderer):
+    job = EventJob(write_record(tmp_path / "record.csv", 50),
+                   str(tmp_path / "template.docx"), "record", str(tmp_path))
+    # The journal is ignored when sharded
+    write_journal(job.attendees, {"person0@example.com": "ok"})
+
+    assert estimate_run([job], shard=(1, 4)).pending == 13
+
+def test_estimate_run_nothing_pending(tmp_path, stub_renderer):
+    job = EventJob(write_record(tmp_path / "record.csv", 2),
+                   str(tmp_path / "template.docx"), "record", str(tmp_path))
+    write_journal(job.attendees, {"person0@example.com": "ok",
+                                  "person1@example.com": "ok"})
+
+    estimate = estimate_run([job])
+    assert estimate.pending == 0
+    assert estimate.cert_seconds == estimate.cert_bytes == 0, \
+        "Certificates were rendered with nothing to process"
+
+def test_estimate_run_missing_column(tmp_path, stub_renderer):
+    path = tmp_path / "record.csv"
+    pd.DataFrame({"fname": ["Ann"], "lname": ["Lee"]}).to_csv(path, index=False)
+    job = EventJob(str(path), str(tmp_path / "template.docx"), "record",
+                   str(tmp_path))
+
+    with pytest.raises(KeyError):
+        estimate_run([job])
+
+@pytest.mark.parametrize("kwargs", [
+    {"samples": 0},
+    {"chunk_size": 0},
+    {"workers": 0}]
+)
+def test_estimate_run_invalid(kwargs: dict):
+    with pytest.raises(ValueError):
+        estimate_run([], **kwargs)
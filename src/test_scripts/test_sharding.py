@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+import src.batch.sharding as sharding
+from src.batch.sharding import (merge_partials, parse_shard, partial_path,
+                                save_partial, select_shard, shard_of)
+
+@pytest.fixture
+def attendees() -> pd.DataFrame:
+    return pd.DataFrame({"fname": [f"Name{i}" for i in range(50)],
+                         "email": [f"person{i}@example.com" for i in range(50)]})
+
+@pytest.mark.parametrize("spec, expected", [
+    ("1/1", (1, 1)),
+    ("2/4", (2, 4))]
+)
+def test_parse_shard(spec: str, expected: tuple):
+    assert parse_shard(spec) == expected
+
+@pytest.mark.parametrize("spec", ["2", "0/4", "5/4", "a/b"])
+def test_parse_shard_invalid(spec: str):
+    with pytest.raises(ValueError):
+        parse_shard(spec)
+
+def test_shard_of_ignores_case():
+    assert shard_of("Person@Example.com ", 7) == shard_of("person@example.com", 7)
+
+def test_select_shard_partitions(attendees: pd.DataFrame):
+    shards = [select_shard(attendees, i, 3) for i in range(1, 4)]
+    combined = pd.concat(shards).sort_index()
+
+    assert combined.equals(attendees), "Shards did not cover everyone exactly once"
+    assert all(len(shard) for shard in shards), "A shard of 50 attendees was empty"
+
+def test_partial_path():
+    assert partial_path("events/record.csv", 2, 4) == "events/record.shard-2-of-4.csv"
+    assert partial_path("record", 1, 2) == "record.shard-1-of-2.csv"
+
+def test_merge_partials(monkeypatch, tmp_path, attendees: pd.DataFrame):
+    monkeypatch.setattr(sharding, "load_attendee_record",
+                        lambda path: pd.read_csv(path, dtype=str))
+    monkeypatch.setattr(sharding, "save_attendee_record",
+                        lambda path, df: df.to_csv(path, index=False))
+    path = str(tmp_path / "record.csv")
+    attendees.assign(file_url="old").to_csv(path, index=False)
+
+    for i in range(1, 3):
+        shard = select_shard(attendees, i, 2).copy()
+        shard["cert_path"] = shard["fname"] + ".pdf"
+        shard["file_url"] = "https://example.com/" + shard["fname"]
+        # One attendee failed in the first shard
+        if i == 1:
+            shard.loc[shard.index[0], "file_url"] = None
+            missed = shard.loc[shard.index[0], "email"]
+        save_partial(partial_path(path, i, 2), shard)
+
+    merged = merge_partials(path, 2)
+    assert merged.equals(pd.read_csv(path, dtype=str)), "Merged record was not saved"
+    assert list(merged["cert_path"]) == list(attendees["fname"] + ".pdf")
+
+    urls = merged.set_index("email")["file_url"]
+    assert urls[missed] == "old", "Missing result overwrote the record"
+    assert urls.drop(missed).str.startswith("https://").all()
+
+def test_merge_partials_missing(monkeypatch, tmp_path, attendees: pd.DataFrame):
+    monkeypatch.setattr(sharding, "load_attendee_record",
+                        lambda path: pd.read_csv(path, dtype=str))
+    path = str(tmp_path / "record.csv")
+    attendees.to_csv(path, index=False)
+    save_partial(partial_path(path, 1, 2), select_shard(attendees, 1, 2))
+
+    with pytest.raises(FileNotFoundError):
+        merge_partials(path, 2)
@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+import src.certificate_creator.shared_roster as shared_roster
+from src.certificate_creator.shared_roster import SharedRoster, render_rows, render_shared
+
+class StubAttendee:
+    """Stands in for ``Attendee``, holding attributes in a dict."""
+
+    def __init__(self, fname: str, lname: str, email: str, **attributes):
+        self.attributes = dict(fname=fname, lname=lname, email=email, **attributes)
+
+    def get_attribute(self, attribute: str):
+        return self.attributes[attribute]
+
+    def has_attribute(self, attribute: str) -> bool:
+        return attribute in self.attributes
+
+    def set_attribute(self, attribute: str, value):
+        self.attributes[attribute] = value
+
+class StubManager(dict):
+    """Stands in for ``AttendeeManager``."""
+
+    def add_attendee(self, attendee: StubAttendee, attendee_id):
+        self[attendee_id] = attendee
+
+    def get_attendee(self, attendee_id) -> StubAttendee:
+        return self[attendee_id]
+
+    def __iter__(self):
+        return iter(list(self.values()))
+
+def fake_create_certificate(in_path, out_dir, attendees, namingFunc=None,
+                            statusFunc=None):
+    """Name each certificate without rendering it, failing attendees with no email."""
+    for attendee in attendees:
+        if not attendee.get_attribute("email"):
+            statusFunc(attendee, ValueError("no email"))
+            continue
+
+        attendee.set_attribute("cert_path", os.path.join(
+            out_dir, f"{attendee.get_attribute('fname')} {os.getpid()}.pdf"))
+        statusFunc(attendee, None)
+    return attendees
+
+@pytest.fixture
+def stub_renderer(monkeypatch):
+    # Worker processes are forked, so they see these too
+    monkeypatch.setattr(shared_roster, "createCertificate", fake_create_certificate)
+    monkeypatch.setattr(shared_roster, "AttendeeManager", StubManager)
+    monkeypatch.setattr(shared_roster, "Attendee", StubAttendee)
+
+@pytest.fixture
+def attendees() -> pd.DataFrame:
+    return pd.DataFrame({"fname": ["Zoë", "Bob", None],
+                         "lname": ["Ødegård", None, "Lee"],
+                         "email": ["z@example.com", "b@example.com", ""],
+                         "age": [30, 41, 25]})
+
+def test_round_trip(attendees: pd.DataFrame):
+    roster = SharedRoster.publish(attendees)
+    try:
+        with SharedRoster.attach(roster.spec) as worker:
+            assert len(worker) == 3
+            assert worker.row(0) == {"fname": "Zoë", "lname": "Ødegård",
+                                     "email": "z@example.com", "age": "30"}
+            assert worker.row(1)["lname"] is None, "Missing value was not None"
+            assert worker.row(2)["fname"] is None
+            assert worker.row(2)["email"] == "", "Empty string read as missing"
+    finally:
+        roster.close()
+        roster.unlink()
+
+    with pytest.raises(FileNotFoundError):
+        SharedRoster.attach(roster.spec)
+
+def test_publish_columns(attendees: pd.DataFrame):
+    with SharedRoster.publish(attendees, ["email", "fname"]) as roster:
+        assert roster.spec.columns == ("email", "fname")
+        assert roster.row(1) == {"email": "b@example.com", "fname": "Bob"}
+        roster.unlink()
+
+def test_publish_missing_column(attendees: pd.DataFrame):
+    with pytest.raises(KeyError):
+        SharedRoster.publish(attendees, ["cert_name"])
+
+def test_empty_roster():
+    with SharedRoster.publish(pd.DataFrame({"fname": []})) as roster:
+        assert len(roster) == 0
+        with pytest.raises(IndexError):
+            roster.row(0)
+        roster.unlink()
+
+@pytest.mark.parametrize("index", [-1, 3])
+def test_row_out_of_range(attendees: pd.DataFrame, index: int):
+    with SharedRoster.publish(attendees) as roster:
+        with pytest.raises(IndexError):
+            roster.row(index)
+        roster.unlink()
+
+def test_render_rows(stub_renderer, attendees: pd.DataFrame):
+    with SharedRoster.publish(attendees) as roster:
+        try:
+            results = render_rows(roster.spec, "template.docx", "out", [2, 0])
+            assert render_rows(roster.spec, "template.docx", "out", [1])[0][0] == 1
+            assert list(shared_roster._worker_rosters) == [roster.spec.name], \
+                "Roster was attached more than once"
+        finally:
+            shared_roster._worker_rosters.pop(roster.spec.name).close()
+            roster.unlink()
+
+    (first, first_path, first_err), (second, second_path, second_err) = results
+    assert (first, second) == (2, 0), "Results were not in the order given"
+    assert first_path is None and isinstance(first_err, ValueError)
+    assert second_path == os.path.join("out", f"Zoë {os.getpid()}.pdf")
+    assert second_err is None
+
+def test_render_shared(stub_renderer, attendees: pd.DataFrame):
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("worker processes only see the stubs when forked")
+    attendees.index = [10, 20, 30]
+    statuses = []
+
+    paths = render_shared("template.docx", "out", attendees,
+                          statusFunc=lambda attendee, err: statuses.append(
+                              (attendee.get_attribute("fname"), err is None)),
+                          workers=2, chunk_size=1)
+
+    assert list(paths.index) == [10, 20, 30]
+    assert paths[30] is None, "Failed certificate has a path"
+    assert paths[10].startswith(os.path.join("out", "Zoë "))
+    assert not paths[10].endswith(f" {os.getpid()}.pdf"), "Rendered in the parent process"
+    assert sorted(statuses, key=str) == sorted(
+        [("Zoë", True), ("Bob", True), (None, False)], key=str)
+
+def test_render_shared_chunk_size(attendees: pd.DataFrame):
+    with pytest.raises(ValueError):
+        render_shared("template.docx", "out", attendees, chunk_size=0)
@@ -0,0 +1,193 @@
+import email
+import email.policy
+import smtplib
+import socketserver
+import threading
+
+import pytest
+
+from src.batch.retry_queue import classify, PERMANENT, TRANSIENT
+import src.smtp.smtp_manager as smtp_manager
+from src.smtp.smtp_manager import SMTPManager
+
+class StubAttendee:
+    """Stands in for ``Attendee``, holding attributes in a dict."""
+
+    def __init__(self, **attributes):
+        self._attributes = attributes
+
+    def get_attribute(self, attribute: str):
+        return self._attributes[attribute]
+
+    def has_attribute(self, attribute: str) -> bool:
+        return attribute in self._attributes
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP to accept mail, like a local ``aiosmtpd`` sink.
+
+    Recipients starting with "greylist" are refused with 450, and those
+    starting with "unknown" with 550.
+    """
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 sink ready")
+        recipients = []
+
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip("<> ")
+                if address.startswith("greylist"):
+                    self.reply("450 Try again later")
+                elif address.startswith("unknown"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with self.server.lock:
+                    self.server.messages.append((recipients, b"".join(data)))
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+@pytest.fixture
+def sink():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SinkHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.connections = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def certificate(tmp_path) -> str:
+    path = tmp_path / "Ann Lee.pdf"
+    path.write_bytes(b"%PDF-1.4 certificate")
+    return str(path)
+
+def make_manager(sink, pool_size: int = 2) -> SMTPManager:
+    return SMTPManager("127.0.0.1", "events@example.com", port=sink.server_address[1],
+                       use_tls=False, pool_size=pool_size, timeout=5,
+                       subject="Certificate for {fname} {lname}")
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        SMTPManager("localhost", "events@example.com", pool_size=0)
+
+    with pytest.raises(ValueError):
+        SMTPManager("localhost", "events@example.com", max_rate=0)
+
+def test_send_certificate(sink, certificate: str):
+    attendee = StubAttendee(fname="Ann", lname="Lee", email="ann@example.com",
+                            cert_path=certificate)
+    with make_manager(sink) as manager:
+        manager.send_certificate(attendee)
+
+    (recipients, data), = sink.messages
+    message = email.message_from_bytes(data, policy=email.policy.default)
+    attachment, = message.iter_attachments()
+    assert recipients == ["ann@example.com"]
+    assert message["Subject"] == "Certificate for Ann Lee"
+    assert message["From"] == "events@example.com"
+    assert attachment.get_filename() == "Ann Lee.pdf"
+    assert attachment.get_content_type() == "application/pdf"
+    assert attachment.get_payload(decode=True) == b"%PDF-1.4 certificate"
+
+def test_send_certificates(sink, certificate: str):
+    attendees = [StubAttendee(fname=f"Name{i}", lname="Lee",
+                              email=f"person{i}@example.com",
+                              cert_path=certificate) for i in range(10)]
+    attendees.append(StubAttendee(fname="No", lname="Cert", email="no@example.com"))
+    attendees.append(StubAttendee(fname="Grey", lname="List",
+                                  email="greylist@example.com",
+                                  cert_path=certificate))
+    attendees.append(StubAttendee(fname="Un", lname="Known",
+                                  email="unknown@example.com",
+                                  cert_path=certificate))
+    statuses = []
+
+    with make_manager(sink, pool_size=3) as manager:
+        failures = manager.send_certificates(
+            attendees, lambda *status: statuses.append(status))
+
+    assert len(sink.messages) == 10, "Not every certificate was sent"
+    assert sink.connections <= 3, "Connections were not reused"
+    assert statuses[-1] == ("finished", 10, 2)
+
+    failed = dict(failures)
+    assert set(failed) == {"greylist@example.com", "unknown@example.com"}
+    assert isinstance(failed["greylist@example.com"], smtplib.SMTPRecipientsRefused)
+    assert classify(failed["greylist@example.com"]) == TRANSIENT
+    assert classify(failed["unknown@example.com"]) == PERMANENT
+
+def test_refused_keeps_connection(sink, certificate: str):
+    with make_manager(sink, pool_size=1) as manager:
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            manager.send_certificate(StubAttendee(
+                fname="Un", lname="Known", email="unknown@example.com",
+                cert_path=certificate))
+        manager.send_certificate(StubAttendee(
+            fname="Ann", lname="Lee", email="ann@example.com",
+            cert_path=certificate))
+
+    assert len(sink.messages) == 1
+    assert sink.connections == 1, "Connection was dropped after a server reply"
+
+def test_timeout_discards_connection(monkeypatch, sink, certificate: str):
+    send_message = smtp_manager._Connection.send_message
+    calls = []
+
+    def time_out_once(conn, message):
+        calls.append(message)
+        if len(calls) == 1:
+            # As if the socket timed out part way through the message
+            raise TimeoutError("timed out")
+        send_message(conn, message)
+
+    monkeypatch.setattr(smtp_manager._Connection, "send_message", time_out_once)
+    attendee = StubAttendee(fname="Ann", lname="Lee", email="ann@example.com",
+                            cert_path=certificate)
+    with make_manager(sink, pool_size=1) as manager:
+        with pytest.raises(TimeoutError):
+            manager.send_certificate(attendee)
+        manager.send_certificate(attendee)
+
+    assert len(sink.messages) == 1
+    assert sink.connections == 2, "Connection was reused after a timeout"
+
+def test_missing_certificate(sink, tmp_path):
+    attendee = StubAttendee(fname="Ann", lname="Lee", email="ann@example.com",
+                            cert_path=str(tmp_path / "missing.pdf"))
+    with make_manager(sink) as manager:
+        with pytest.raises(OSError):
+            manager.send_certificate(attendee)
+
+    assert sink.messages == []
@@ -0,0 +1,80 @@
+"""
+Module for the on-disk caches' shared folder handling.
+
+The record cache and the asset cache each keep their entries as files in a
+folder under the user's cache directory, bounded in size by evicting the
+least recently used files. Reading an entry touches its modification time,
+so the modification time is when it was last used.
+
+TODO:
+    * Impement datalogging
+"""
+
+import os
+from typing import *
+
+def default_cache_dir(name: str = "records") -> str:
+    """
+    Get the default cache directory for attendee records, or another cache.
+
+    Args:
+        name (str): The cache's folder name, defaults to ``"records"``.
+
+    Returns:
+        str: ``$XDG_CACHE_HOME/certificate_automator/<name>``, where ``XDG_CACHE_HOME`` defaults to ``~/.cache``.
+    """
+    root = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "certificate_automator", name)
+
+def cache_entries(cache_dir: str, suffix: str) -> List[str]:
+    """
+    Get the paths of every entry in a cache folder.
+
+    Args:
+        cache_dir (str): The cache folder.
+        suffix (str): The file extension of the cache's entries, e.g. ``".bin"``.
+
+    Returns:
+        List[str]: The paths of the entries, empty if the folder doesn't exist.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+
+    return [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+            if name.endswith(suffix)]
+
+def evict_lru(cache_dir: str, suffix: str, max_bytes: int):
+    """
+    Remove least recently used entries until a cache fits in max_bytes.
+
+    Entries removed meanwhile, e.g. by another process evicting the same
+    cache, are skipped.
+
+    Args:
+        cache_dir (str): The cache folder.
+        suffix (str): The file extension of the cache's entries, e.g. ``".bin"``.
+        max_bytes (int): The most bytes the entries may take up.
+
+    Raises:
+        OSError: if an entry cannot be removed.
+    """
+    entries = []
+    for entry in cache_entries(cache_dir, suffix):
+        try:
+            stat = os.stat(entry)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+
+        try:
+            os.remove(entry)
+        except FileNotFoundError:
+            pass
+        total -= size
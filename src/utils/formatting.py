@@ -0,0 +1,23 @@
+"""
+Module for formatting values for people to read.
+
+Shared by the command line interface and the batch layer, so neither needs
+to import the other just to print a figure.
+
+TODO:
+    * Impement datalogging
+"""
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration for display.
+
+    Args:
+        seconds (float): The duration in seconds.
+
+    Returns:
+        str: The duration as ``h:mm:ss``, e.g. ``"1:02:03"``.
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"